@@ -47,11 +47,13 @@ const Metrics = () => {
     }, [dispatch]);
 
     // Prepare data for the latency over time chart ////
-    const prepareLatencyData = (data) => {
-        if (!data?.latency_over_time) return [];
-        return data.latency_over_time.map(item => ({
-            x: new Date(parseInt(item.timestamp)),
-            y: parseFloat(item.value)
+    // latency_over_time is columnar: timestamps plus one array per aggregate (avg, max, p95)
+    const prepareLatencyData = (data, column = 'avg') => {
+        const series = data?.latency_over_time;
+        if (!series?.timestamps) return [];
+        return series.timestamps.map((timestamp, i) => ({
+            x: new Date(timestamp),
+            y: series[column][i]
         }));
     };
 
@@ -422,9 +424,12 @@ const Metrics = () => {
                                 <ReactApexChart
                                     options={{
                                         ...latencyTimeSeriesOptions,
-                                        colors: [themeColors.primary.main],
+                                        colors: [themeColors.primary.main, themeColors.secondary.main],
                                     }}
-                                    series={[{ name: 'Latency', data: prepareLatencyData(metrics) }]}
+                                    series={[
+                                        { name: 'Avg latency', data: prepareLatencyData(metrics, 'avg') },
+                                        { name: 'p95 latency', data: prepareLatencyData(metrics, 'p95') }
+                                    ]}
                                     type="area"
                                     height={350}
                                 />
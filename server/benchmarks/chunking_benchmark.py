@@ -0,0 +1,191 @@
+"""
+Chunking benchmark: vector count, ingestion cost and retrieval hit rate per setting.
+
+Chunks the bundled PDFs ("Product Pricing and Plans.pdf" and "Release Notes
+Archive.pdf" in the repository root) with the old 100-character splitter and
+with `services.chunking` at several sizes, then reports for each setting:
+
+- vectors: number of chunks (= Pinecone vectors)
+- embed calls: embed_content requests at EMBED_BATCH_SIZE texts per call
+- ingest s: chunking time plus embed calls x --embed-latency (offline), or
+  the measured embed time with --live
+- hit@k: share of probe questions whose source sentence is fully contained
+  in one of the top-k retrieved chunks
+- ctx tokens: estimated prompt tokens the top-k chunks add
+
+Probe questions are built from sentences of the documents themselves: every
+other content word of a sentence, so no chunk matches the query verbatim.
+Offline retrieval uses BM25; --live embeds chunks and questions with the
+embedding model and ranks by cosine similarity (needs credentials).
+
+Usage (from the server directory):
+    python -m benchmarks.chunking_benchmark
+    python -m benchmarks.chunking_benchmark --top-k 10 --questions 200
+    python -m benchmarks.chunking_benchmark --live
+"""
+import argparse
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(SERVER_DIR)
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+from pypdf import PdfReader
+from services.chunking import chunk_pages, estimate_tokens
+from utils.config import EMBED_BATCH_SIZE
+
+DOCUMENTS = ["Product Pricing and Plans.pdf", "Release Notes Archive.pdf"]
+
+SETTINGS = [
+    ("legacy 100 chars", None),
+    ("128 tok / 16", {"chunk_tokens": 128, "overlap_tokens": 16, "dedupe_threshold": 0.9}),
+    ("300 tok / 40", {"chunk_tokens": 300, "overlap_tokens": 40, "dedupe_threshold": 0.9}),
+    ("300 tok / 40, no dedupe", {"chunk_tokens": 300, "overlap_tokens": 40, "dedupe_threshold": 0.0}),
+    ("512 tok / 64", {"chunk_tokens": 512, "overlap_tokens": 64, "dedupe_threshold": 0.9}),
+]
+
+STOPWORDS = set("""a an and are as at be by for from has have in is it its of on or that the this to was
+were will with you your we our can all any not""".split())
+
+
+def _words(text: str) -> list:
+    return re.findall(r"\w+", text.lower())
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_words(text))
+
+
+def load_pages(path: str) -> list:
+    reader = PdfReader(path)
+    return [{"page": i, "text": page.extract_text() or ""} for i, page in enumerate(reader.pages, start=1)]
+
+
+def legacy_split(text: str, chunk_size: int = 100, overlap: int = 20) -> list:
+    """Approximation of the old RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=20)."""
+    chunks, current = [], ""
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > chunk_size:
+            chunks.append(current)
+            tail = current[-overlap:]
+            current = tail[tail.find(" ") + 1:] if " " in tail else ""
+        current = f"{current} {word}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def make_questions(pages: list, count: int, seed: int = 0) -> list:
+    """(question, normalized source sentence) pairs from sentences of 8+ words."""
+    text = " ".join(page["text"].replace("\n", " ") for page in pages)
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", text) if len(_words(s)) >= 8]
+    random.Random(seed).shuffle(sentences)
+    questions = []
+    for sentence in sentences[:count]:
+        content = [w for w in _words(sentence) if w not in STOPWORDS]
+        questions.append((" ".join(content[::2]), _normalize(sentence)))
+    return questions
+
+
+class BM25:
+    def __init__(self, documents: list, k1: float = 1.5, b: float = 0.75):
+        self.k1, self.b = k1, b
+        self.docs = [Counter(_words(d)) for d in documents]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avg_length = sum(self.lengths) / max(len(self.lengths), 1)
+        df = Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def top_k(self, query: str, k: int) -> list:
+        terms = _words(query)
+        scores = []
+        for i, doc in enumerate(self.docs):
+            score = 0.0
+            for t in terms:
+                tf = doc.get(t)
+                if tf:
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+                    score += self.idf[t] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return sorted(range(len(scores)), key=lambda i: -scores[i])[:k]
+
+
+def embedding_top_k(chunks: list, questions: list, k: int) -> tuple:
+    import numpy as np
+    from models.embedding import get_embeddings
+
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(chunks), EMBED_BATCH_SIZE):
+        vectors.extend(get_embeddings(chunks[i:i + EMBED_BATCH_SIZE]))
+    embed_seconds = time.perf_counter() - start
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    query_vectors = np.asarray(get_embeddings([q for q, _ in questions]), dtype=np.float32)
+    query_vectors /= np.linalg.norm(query_vectors, axis=1, keepdims=True) + 1e-12
+    scores = query_vectors @ matrix.T
+    return [list(np.argsort(-row)[:k]) for row in scores], embed_seconds
+
+
+def run_setting(pages: list, settings, questions: list, top_k: int, embed_latency: float, live: bool) -> dict:
+    start = time.perf_counter()
+    if settings is None:
+        chunks = [c for page in pages for c in legacy_split(page["text"])]
+    else:
+        chunks = list(chunk_pages(pages, settings))
+    chunk_seconds = time.perf_counter() - start
+    embed_calls = math.ceil(len(chunks) / EMBED_BATCH_SIZE)
+
+    if live:
+        rankings, embed_seconds = embedding_top_k(chunks, questions, top_k)
+    else:
+        index = BM25(chunks)
+        rankings = [index.top_k(q, top_k) for q, _ in questions]
+        embed_seconds = embed_calls * embed_latency
+
+    normalized = [_normalize(c) for c in chunks]
+    hits = sum(1 for (_, source), ranked in zip(questions, rankings)
+               if any(source in normalized[i] for i in ranked))
+    context_tokens = sum(sum(estimate_tokens(chunks[i]) for i in ranked) for ranked in rankings)
+
+    return {
+        "vectors": len(chunks),
+        "embed_calls": embed_calls,
+        "ingest_seconds": chunk_seconds + embed_seconds,
+        "hit_rate": hits / len(questions) if questions else 0.0,
+        "context_tokens": context_tokens / len(questions) if questions else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=10, help="chunks retrieved per question (chat uses 10)")
+    parser.add_argument("--questions", type=int, default=100, help="probe questions per document")
+    parser.add_argument("--embed-latency", type=float, default=0.6,
+                        help="assumed seconds per embed_content call when offline")
+    parser.add_argument("--live", action="store_true", help="embed with the real model and rank by cosine")
+    args = parser.parse_args()
+
+    for name in DOCUMENTS:
+        pages = load_pages(os.path.join(REPO_DIR, name))
+        questions = make_questions(pages, args.questions)
+        print(f"\n{name}: {len(pages)} pages, {len(questions)} questions, top_k={args.top_k}")
+        print(f"{'setting':>24} {'vectors':>8} {'embed calls':>12} {'ingest s':>9} "
+              f"{'hit@k':>7} {'ctx tokens':>11}")
+        for label, settings in SETTINGS:
+            result = run_setting(pages, settings, questions, args.top_k, args.embed_latency, args.live)
+            print(f"{label:>24} {result['vectors']:>8} {result['embed_calls']:>12} "
+                  f"{result['ingest_seconds']:>9.2f} {result['hit_rate']:>7.1%} {result['context_tokens']:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
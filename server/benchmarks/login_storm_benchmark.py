@@ -0,0 +1,163 @@
+"""
+Login-storm benchmark: chat latency while many logins hash passwords.
+
+bcrypt takes ~100-300 ms per call. Run on the event loop, every login
+stalls every other request and WebSocket on that worker for that long.
+
+Offline (default) the storm runs in-process: --logins concurrent bcrypt
+verifies, once inline on the event loop (the old behavior) and once through
+services.passwords (bounded thread pool), while a probe task stands in for a
+chat turn by awaiting a 10 ms operation in a loop. Reported: probe latency
+p50 / p99 / max before and during the storm, and how long the storm took.
+
+With --base-url the storm is real: --logins concurrent POST /api/login with
+--email/--password against a running server, while the probe sends chat
+messages over the WebSocket (--user-id, --session-id; needs credentials on
+the server) or, without them, polls GET /health/live.
+
+Usage (from the server directory):
+    python -m benchmarks.login_storm_benchmark
+    python -m benchmarks.login_storm_benchmark --base-url http://localhost:8000 \\
+        --email test@example.com --password secret --user-id ... --session-id ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+PROBE_WORK_SECONDS = 0.01
+
+
+def _summary(latencies: list) -> str:
+    if not latencies:
+        return "no samples"
+    ordered = sorted(latencies)
+    p99 = ordered[int(0.99 * (len(ordered) - 1))]
+    return (f"p50 {1000 * statistics.median(ordered):7.1f} ms  p99 {1000 * p99:7.1f} ms  "
+            f"max {1000 * ordered[-1]:7.1f} ms  ({len(ordered)} samples)")
+
+
+async def _probe_loop(probe, stop: asyncio.Event, latencies: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await probe()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def measure(probe, storm, baseline_seconds: float) -> tuple:
+    """(baseline latencies, storm latencies, storm seconds) for one probe/storm pair."""
+    baseline, during = [], []
+    stop = asyncio.Event()
+    task = asyncio.create_task(_probe_loop(probe, stop, baseline))
+    await asyncio.sleep(baseline_seconds)
+    stop.set()
+    await task
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(_probe_loop(probe, stop, during))
+    start = time.perf_counter()
+    await storm()
+    storm_seconds = time.perf_counter() - start
+    stop.set()
+    await task
+    return baseline, during, storm_seconds
+
+
+def run_offline(logins: int, baseline_seconds: float) -> None:
+    from services.passwords import pwd_context, verify_password
+
+    hashed = pwd_context.hash("benchmark-password")
+
+    async def probe():
+        await asyncio.sleep(PROBE_WORK_SECONDS)
+
+    async def inline_storm():
+        async def login():
+            pwd_context.verify("benchmark-password", hashed)
+        await asyncio.gather(*(login() for _ in range(logins)))
+
+    async def pooled_storm():
+        await asyncio.gather(*(verify_password("benchmark-password", hashed) for _ in range(logins)))
+
+    for label, storm in (("bcrypt on event loop", inline_storm), ("bcrypt in pool", pooled_storm)):
+        baseline, during, seconds = asyncio.run(measure(probe, storm, baseline_seconds))
+        print(f"\n{label}: {logins} logins in {seconds:.1f}s")
+        print(f"  chat probe before: {_summary(baseline)}")
+        print(f"  chat probe during: {_summary(during)}")
+
+
+def run_live(args) -> None:
+    def post_login():
+        body = json.dumps({"email": args.email, "password": args.password}).encode()
+        request = urllib.request.Request(f"{args.base_url}/api/login", data=body,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    async def main():
+        statuses = []
+
+        async def storm():
+            statuses.extend(await asyncio.gather(*(asyncio.to_thread(post_login) for _ in range(args.logins))))
+
+        if args.user_id and args.session_id:
+            import websockets
+
+            url = args.base_url.replace("http", "ws", 1)
+            socket = await websockets.connect(
+                f"{url}/api/chat?session_id={args.session_id}&user_id={args.user_id}")
+
+            async def probe():
+                await socket.send("What plans do you offer?")
+                await socket.recv()
+        else:
+            def get_live():
+                with urllib.request.urlopen(f"{args.base_url}/health/live", timeout=30) as response:
+                    response.read()
+
+            async def probe():
+                await asyncio.to_thread(get_live)
+
+        baseline, during, seconds = await measure(probe, storm, args.baseline_seconds)
+        codes = {code: statuses.count(code) for code in set(statuses)}
+        print(f"{args.logins} logins in {seconds:.1f}s, status codes {codes}")
+        print(f"  probe before: {_summary(baseline)}")
+        print(f"  probe during: {_summary(during)}")
+
+    asyncio.run(main())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200, help="concurrent logins in the storm")
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    parser.add_argument("--base-url", help="run against a live server instead of in-process")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--user-id", help="chat probe over the WebSocket (with --session-id)")
+    parser.add_argument("--session-id")
+    args = parser.parse_args()
+
+    if args.base_url:
+        if not args.email or not args.password:
+            parser.error("--base-url needs --email and --password")
+        run_live(args)
+    else:
+        run_offline(args.logins, args.baseline_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Soak benchmark: request throughput of serve.py from 1 to N worker processes.
+
+For each worker count the production server is started on a free port and
+driven for --duration seconds by --clients client processes, each sending
+requests back to back over one keep-alive connection. Reported per worker
+count:
+
+- req/s: completed requests per second across all clients
+- p50 / p99 ms: request latency
+- scaling: req/s per worker relative to the first (smallest) worker count
+  (1.0 = linear)
+
+The default path, /health/live, measures the serving stack itself (HTTP
+parsing, event loop, middleware). Point --path at an authenticated endpoint
+with --token to include application work. Clients run on the same machine,
+so leave cores free for them: linear scaling holds while workers + clients
+fit the available CPUs.
+
+Usage (from the server directory):
+    python -m benchmarks.soak_benchmark
+    python -m benchmarks.soak_benchmark --workers 1 2 4 --clients 16 --duration 30
+    python -m benchmarks.soak_benchmark --path /api/metrics --token $JWT
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, port: int, timeout: float = 60.0) -> subprocess.Popen:
+    env = dict(os.environ, SERVER_WORKERS=str(workers), PORT=str(port), HOST="127.0.0.1")
+    process = subprocess.Popen([sys.executable, "serve.py"], cwd=SERVER_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline and process.poll() is None:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health/live")
+            if connection.getresponse().status == 200:
+                # Give the remaining workers time to finish importing
+                time.sleep(min(5.0, workers))
+                return process
+        except OSError:
+            pass
+        time.sleep(0.1)
+    stop_server(process)
+    raise RuntimeError(f"server with {workers} workers did not come up")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def client(args: tuple) -> tuple:
+    """One keep-alive connection sending requests until the deadline; returns (count, errors, latencies)."""
+    port, path, headers, deadline = args
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    count, errors, latencies = 0, 0, []
+    while time.time() < deadline:
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors += 1
+        except OSError:
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            continue
+        latencies.append(time.perf_counter() - start)
+        count += 1
+    connection.close()
+    return count, errors, latencies
+
+
+def run(workers: int, clients: int, duration: float, path: str, headers: dict) -> dict:
+    port = _free_port()
+    process = start_server(workers, port)
+    try:
+        deadline = time.time() + duration
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client, [(port, path, headers, deadline)] * clients)
+    finally:
+        stop_server(process)
+    latencies = sorted(l for _, _, ls in results for l in ls)
+    count = sum(c for c, _, _ in results)
+    return {
+        "rps": count / duration,
+        "errors": sum(e for _, e, _ in results),
+        "p50_ms": 1000 * statistics.median(latencies) if latencies else 0.0,
+        "p99_ms": 1000 * latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent client processes/connections")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load per worker count")
+    parser.add_argument("--path", default="/health/live")
+    parser.add_argument("--token", help="JWT sent as a Bearer token")
+    args = parser.parse_args()
+
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    print(f"{args.clients} clients, {args.duration:.0f}s per run, GET {args.path}, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'scaling':>8}")
+    baseline = None
+    for workers in args.workers:
+        result = run(workers, args.clients, args.duration, args.path, headers)
+        baseline = baseline or result["rps"] / workers
+        scaling = result["rps"] / (workers * baseline) if baseline else 0.0
+        print(f"{workers:>8} {result['rps']:>9.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['errors']:>7} {scaling:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
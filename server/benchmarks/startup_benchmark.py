@@ -0,0 +1,121 @@
+"""
+Startup benchmark: import time, time to first healthy response and time to ready.
+
+Each run starts a fresh interpreter so nothing is cached between runs:
+
+- import s: `import main` in a new process (module-level work only; with
+  lazy clients this involves no network calls)
+- live s: from launching uvicorn until GET /health/live first returns 200
+- ready s: from launching uvicorn until GET /health/ready first returns 200,
+  i.e. Redis, the vector indexes and the models are reachable and warm
+  (needs credentials; reported as "-" if not ready within --ready-timeout)
+
+Medians over --runs are printed. With --max-import-seconds the script exits
+non-zero when the median import time exceeds it, so it can guard against
+network calls or heavy imports creeping back into module import.
+
+Usage (from the server directory):
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --runs 5 --max-import-seconds 2
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def measure_import() -> float:
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=SERVER_DIR,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(url: str) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def measure_server(live_timeout: float, ready_timeout: float) -> tuple:
+    """(seconds to first /health/live 200, seconds to first /health/ready 200 or None)."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+                                "--log-level", "warning"], cwd=SERVER_DIR,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    live = ready = None
+    try:
+        while time.perf_counter() - start < live_timeout and process.poll() is None:
+            if _status(f"{base}/health/live") == 200:
+                live = time.perf_counter() - start
+                break
+            time.sleep(0.02)
+        while live is not None and time.perf_counter() - start < ready_timeout:
+            if _status(f"{base}/health/ready") == 200:
+                ready = time.perf_counter() - start
+                break
+            time.sleep(0.1)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return live, ready
+
+
+def _median(values: list):
+    values = [v for v in values if v is not None]
+    return statistics.median(values) if values else None
+
+
+def _fmt(value) -> str:
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--live-timeout", type=float, default=30.0)
+    parser.add_argument("--ready-timeout", type=float, default=60.0)
+    parser.add_argument("--import-only", action="store_true", help="skip launching the server")
+    parser.add_argument("--max-import-seconds", type=float, help="fail if the median import time is above this")
+    args = parser.parse_args()
+
+    imports, lives, readies = [], [], []
+    print(f"{'run':>4} {'import s':>9} {'live s':>8} {'ready s':>8}")
+    for run in range(1, args.runs + 1):
+        imports.append(measure_import())
+        live, ready = (None, None) if args.import_only else measure_server(args.live_timeout, args.ready_timeout)
+        lives.append(live)
+        readies.append(ready)
+        print(f"{run:>4} {_fmt(imports[-1]):>9} {_fmt(live):>8} {_fmt(ready):>8}")
+    print(f"{'p50':>4} {_fmt(_median(imports)):>9} {_fmt(_median(lives)):>8} {_fmt(_median(readies)):>8}")
+
+    if args.max_import_seconds is not None and _median(imports) > args.max_import_seconds:
+        print(f"Import time above {args.max_import_seconds}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
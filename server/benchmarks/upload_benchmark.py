@@ -0,0 +1,100 @@
+"""
+Upload ingestion benchmark: peak RSS and wall time per file size.
+
+Compares the old buffered path (read the whole upload into memory, write it
+to disk, upload to GCS from the file) with `services.upload.stream_upload`,
+which reads the upload once in fixed-size chunks and tees it into the spool
+file and GCS. Each case runs in a fresh subprocess so peak RSS is per case.
+
+Usage (from the server directory):
+    python -m benchmarks.upload_benchmark                 # spool only
+    python -m benchmarks.upload_benchmark --gcs           # also upload to GCS (needs credentials)
+    python -m benchmarks.upload_benchmark --sizes 1 50 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _make_file(directory: str, size_mb: int) -> str:
+    path = os.path.join(directory, f"sample-{size_mb}mb.pdf")
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(os.urandom(1024 * 1024))
+    return path
+
+
+async def _run_case(mode: str, path: str, gcs: bool) -> dict:
+    from fastapi import UploadFile
+    from services.upload import stream_upload, _upload_to_gcs
+
+    baseline_rss = _peak_rss_mb()
+    spool_path = path + ".spool"
+    start = time.perf_counter()
+
+    with open(path, "rb") as source:
+        upload = UploadFile(file=source, filename=os.path.basename(path))
+        if mode == "buffered":
+            content = await upload.read()
+            with open(spool_path, "wb") as spool:
+                spool.write(content)
+            if gcs:
+                await upload.seek(0)
+                await asyncio.to_thread(_upload_to_gcs, "benchmark", upload.filename, upload.file)
+        else:
+            await stream_upload("benchmark", upload, spool_path, upload_to_gcs=gcs)
+
+    elapsed = time.perf_counter() - start
+    os.remove(spool_path)
+    return {
+        "seconds": elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_growth_mb": _peak_rss_mb() - baseline_rss,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 50, 200], help="file sizes in MB")
+    parser.add_argument("--gcs", action="store_true", help="also upload to the documents bucket")
+    parser.add_argument("--case", nargs=3, metavar=("MODE", "PATH", "GCS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        mode, path, gcs = args.case
+        print(json.dumps(asyncio.run(_run_case(mode, path, gcs == "1"))))
+        return
+
+    print(f"{'size':>8} {'mode':>10} {'seconds':>9} {'peak RSS MB':>12} {'RSS growth MB':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in args.sizes:
+            path = _make_file(directory, size_mb)
+            for mode in ("buffered", "streaming"):
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.upload_benchmark",
+                     "--case", mode, path, "1" if args.gcs else "0"],
+                    cwd=SERVER_DIR, capture_output=True, text=True, check=True,
+                ).stdout.strip().splitlines()[-1]
+                result = json.loads(output)
+                print(f"{size_mb:>6}MB {mode:>10} {result['seconds']:>9.3f} "
+                      f"{result['peak_rss_mb']:>12.1f} {result['rss_growth_mb']:>14.1f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
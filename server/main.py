@@ -1,9 +1,23 @@
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from routes.routes import router as chat_router
 from fastapi.middleware.cors import CORSMiddleware
-from storage.redis import redis_client
+from storage.redis import async_redis_client
 from services.logger import configure_logging
+from middlewares.evaluation_worker import evaluation_worker
+from services.loop_monitor import loop_monitor
+from services.upload_jobs import upload_job_worker
+from storage.pinecone import flush_vector_indexes, pinecone_chat_index, pinecone_doc_index
+from models.llm import warm_up_models
+from models.embedding import warm_up_embedding_model
+from services.readiness import readiness
+from services.connections import connection_registry
+from middlewares.token_cache import token_cache
+from storage.namespace_events import namespace_invalidator
+from middlewares.quantiles import quantile_store
+from middlewares.metrics_writer import metrics_writer
+import asyncio
 import logging
 
 configure_logging()
@@ -32,23 +46,72 @@ app.add_middleware(
 
 app.include_router(chat_router, prefix="/api")
 
+# Connection checks and warm-up run after the server is listening; /health/ready reports them
+readiness.register("redis", lambda: async_redis_client.ping())
+readiness.register("vector_index:vahan-chat", lambda: asyncio.to_thread(pinecone_chat_index.resolve))
+readiness.register("vector_index:document-data", lambda: asyncio.to_thread(pinecone_doc_index.resolve))
+readiness.register("llm", lambda: asyncio.to_thread(warm_up_models))
+readiness.register("embedding", lambda: asyncio.to_thread(warm_up_embedding_model))
+
+@app.on_event("startup")
+async def start_background_workers():
+    """Start background tasks that run off the request path"""
+    evaluation_worker.start()
+    loop_monitor.start()
+    upload_job_worker.start()
+    connection_registry.start()
+    token_cache.start()
+    namespace_invalidator.start()
+    quantile_store.start()
+    metrics_writer.start()
+    # Not awaited: startup must not block on remote services being reachable
+    readiness.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    """Drain background tasks before the process exits"""
+    await readiness.stop()
+    await connection_registry.stop()
+    await token_cache.stop()
+    await namespace_invalidator.stop()
+    await evaluation_worker.stop()
+    # After the evaluation queue is drained, so its samples are merged too
+    await quantile_store.stop()
+    await metrics_writer.stop()
+    await loop_monitor.stop()
+    await upload_job_worker.stop()
+    await asyncio.to_thread(flush_vector_indexes)
+
 @app.get("/", tags=["Health"])
 async def health_check():
     """Health check endpoint for monitoring"""
     try:
         logger.info("Checking Redis connection")
-        redis_status = redis_client.ping()
+        redis_status = await async_redis_client.ping()
         
         return {
             "status": "healthy", 
             "services": {
                 "redis": "connected" if redis_status else "disconnected"
-            }
+            },
+            "ready": readiness.ready,
+            "event_loop": loop_monitor.stats()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return {"status": "unhealthy", "error": str(e)}
 
+@app.get("/health/live", tags=["Health"])
+async def liveness():
+    """Liveness: the process is up and the event loop is serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready", tags=["Health"])
+async def readiness_check():
+    """Readiness: every startup check (Redis, vector indexes, model warm-up) has passed"""
+    stats = readiness.stats()
+    return JSONResponse(status_code=200 if stats["ready"] else 503, content=stats)
+
 if __name__ == "__main__":
     logger.info("Starting Chat API server")
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
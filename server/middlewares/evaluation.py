@@ -1,19 +1,24 @@
 from typing import Dict, List, Any, Tuple
+import threading
 import time
 import numpy as np
-from models.embedding import get_embedding
-from storage.redis import redis_client
+from models.embedding import get_embeddings
+from middlewares.quantiles import quantile_store
+from middlewares.metrics_writer import metrics_writer
 import logging
-import json
 logger = logging.getLogger(__name__)
 
 class ResponseEvaluator:
     def __init__(self):
         self.metrics = {}
-        self.response_times = []
-        self.context_relevance_scores = []
+        # Fixed-size sketches instead of lists of every sample
+        self.response_times = quantile_store.series("latency_seconds")
+        self.context_relevance_scores = quantile_store.series("context_relevance")
+        self.first_token_times = quantile_store.series("time_to_first_token_seconds")
         self.total_requests = 0
         self.successful_requests = 0
+        # evaluate_batch runs in several worker threads at once
+        self._counter_lock = threading.Lock()
     
     def start_timer(self) -> float:
         """Start timing a request"""
@@ -22,79 +27,124 @@ class ResponseEvaluator:
     def record_latency(self, start_time: float) -> float:
         """Record the latency of a request"""
         latency = time.time() - start_time
-        self.response_times.append(latency)
+        self.response_times.add(latency)
         return latency
     
-    def evaluate_response(self, 
-                          user_query: str, 
-                          response: str, 
-                          context: str, 
-                          session_id: str, 
-                          start_time: float) -> Dict[str, Any]:
-        """Evaluate a single response against multiple metrics"""
-        self.total_requests += 1
-        
+    def record_first_token(self, start_time: float) -> float:
+        """Record the time to first streamed token of a request"""
+        ttft = time.time() - start_time
+        self.first_token_times.add(ttft)
+        return ttft
+    
+    def evaluate_batch(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Evaluate a batch of finished chat turns.
+
+        Latency is measured on the chat path and carried in each job. Jobs
+        with `score` set also get relevance scores; the embeddings for all of
+        them are requested in a single call. Metrics are queued for Redis.
+        """
+        with self._counter_lock:
+            self.total_requests += len(jobs)
+
         try:
-            # 1. Latency measurement
-            latency = self.record_latency(start_time)
-            
-            # 2. Response length analysis
-            response_length = len(response.split())
-            
-            # 3. Calculate semantic similarity between query and response
-            query_embedding = get_embedding(user_query)
-            response_embedding = get_embedding(response)
-            relevance_score = self._calculate_cosine_similarity(query_embedding, response_embedding)
-            
-            # 4. Calculate semantic similarity between context and response
-            if context and context != "No context found.":
-                context_embedding = get_embedding(context)
-                context_relevance = self._calculate_cosine_similarity(context_embedding, response_embedding)
-                self.context_relevance_scores.append(context_relevance)
-            else:
-                context_relevance = None
-            
-            # 5. Count tokens for cost estimation
-            token_count = len(user_query.split()) + len(response.split())
-            
-            # 6. Record successful completion
-            self.successful_requests += 1
-            
-            # Compile all metrics
-            response_metrics = {
-                "latency_seconds": latency,
-                "response_length_words": response_length,
-                "query_response_relevance": relevance_score,
-                "context_relevance": context_relevance,
-                "token_count": token_count,
-                "session_id": session_id,
-                "timestamp": time.time()
-            }
-            
-            # Store in Redis for analysis
-            self._store_metrics(session_id, response_metrics)
-            
-            return response_metrics
-            
+            # Collect every text that needs an embedding, once
+            texts = []
+            for job in jobs:
+                if job.get("score"):
+                    texts.extend([job["user_query"], job["response"]])
+                    if self._has_context(job.get("context")):
+                        texts.append(job["context"])
+            embeddings = dict(zip(texts, get_embeddings(list(dict.fromkeys(texts))))) if texts else {}
         except Exception as e:
-            logger.error(f"Error evaluating response: {e}")
-            return {"error": str(e)}
+            logger.error(f"Error embedding evaluation batch: {e}")
+            embeddings = {}
+
+        results = []
+        for job in jobs:
+            try:
+                results.append(self._evaluate_job(job, embeddings))
+            except Exception as e:
+                logger.error(f"Error evaluating response: {e}")
+                results.append({"error": str(e)})
+        return results
+
+    def _evaluate_job(self, job: Dict[str, Any], embeddings: Dict[str, List[float]]) -> Dict[str, Any]:
+        """Compute and store metrics for one chat turn"""
+        user_query = job["user_query"]
+        response = job["response"]
+        context = job.get("context")
+
+        relevance_score = None
+        context_relevance = None
+        if job.get("score") and response in embeddings and user_query in embeddings:
+            # Semantic similarity between query and response
+            response_embedding = embeddings[response]
+            relevance_score = self._calculate_cosine_similarity(embeddings[user_query], response_embedding)
+
+            # Semantic similarity between context and response
+            if self._has_context(context) and context in embeddings:
+                context_relevance = self._calculate_cosine_similarity(embeddings[context], response_embedding)
+                self.context_relevance_scores.add(float(context_relevance))
+
+        with self._counter_lock:
+            self.successful_requests += 1
+
+        # Compile all metrics
+        response_metrics = {
+            "latency_seconds": job["latency_seconds"],
+            "response_length_words": len(response.split()),
+            "query_response_relevance": relevance_score,
+            "context_relevance": context_relevance,
+            "token_count": len(user_query.split()) + len(response.split()),
+            "session_id": job["session_id"],
+            "timestamp": job.get("timestamp", time.time())
+        }
+        for stage, seconds in job.get("timings", {}).items():
+            response_metrics[stage] = seconds
+
+        # Store in Redis for analysis
+        self._store_metrics(job["session_id"], response_metrics)
+        self._store_time_metrics("latency_seconds", response_metrics["latency_seconds"])
+        if relevance_score is not None:
+            self._store_time_metrics("query_relevance", relevance_score)
+        if context_relevance is not None:
+            self._store_time_metrics("context_relevance", context_relevance)
+        if response_metrics.get("time_to_first_token_seconds") is not None:
+            self._store_time_metrics("time_to_first_token_seconds", response_metrics["time_to_first_token_seconds"])
+
+        return response_metrics
+
+    @staticmethod
+    def _has_context(context: str) -> bool:
+        return bool(context) and context != "No context found."
     
     def get_aggregate_metrics(self) -> Dict[str, Any]:
-        """Get aggregate metrics across all responses"""
-        if not self.response_times:
+        """Get aggregate metrics across all responses of this worker since it started"""
+        latency = self.response_times.lifetime.summary()
+        if not latency["count"]:
             return {"error": "No responses recorded yet"}
+        relevance = self.context_relevance_scores.lifetime.summary()
+        first_token = self.first_token_times.lifetime
         
         return {
             "total_requests": self.total_requests,
             "successful_requests": self.successful_requests,
             "success_rate": self.successful_requests / self.total_requests if self.total_requests > 0 else 0,
-            "avg_latency": np.mean(self.response_times),
-            "p50_latency": np.percentile(self.response_times, 50),
-            "p95_latency": np.percentile(self.response_times, 95),
-            "p99_latency": np.percentile(self.response_times, 99),
-            "avg_context_relevance": np.mean(self.context_relevance_scores) if self.context_relevance_scores else None
+            "avg_latency": latency["avg"],
+            "p50_latency": latency["p50"],
+            "p95_latency": latency["p95"],
+            "p99_latency": latency["p99"],
+            "avg_context_relevance": relevance["avg"],
+            "p50_time_to_first_token": first_token.quantile(0.50),
+            "p95_time_to_first_token": first_token.quantile(0.95)
         }
+
+    async def get_window_metrics(self) -> Dict[str, Any]:
+        """Fleet-wide count/avg/p50/p95/p99 over the last 1m, 5m and 1h, per metric"""
+        return await quantile_store.fleet_windows(
+            ["latency_seconds", "time_to_first_token_seconds", "context_relevance"]
+        )
     
     def _calculate_cosine_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
         """Calculate cosine similarity between two embeddings"""
@@ -104,49 +154,19 @@ class ResponseEvaluator:
         return dot_product / (norm1 * norm2)
     
     def _store_metrics(self, session_id: str, metrics: Dict[str, Any]) -> None:
-        """Store metrics in Redis using JSON format"""
-        try:
-            
-            # Convert numpy values to native Python types
-            serializable_metrics = {}
-            for k, v in metrics.items():
-                if hasattr(v, "item") and callable(getattr(v, "item")):
-                    serializable_metrics[k] = float(v.item())
-                else:
-                    serializable_metrics[k] = v
-                    
-            # Store as JSON string
-            redis_client.lpush(f"response_metrics:{session_id}", json.dumps(serializable_metrics))
-            
-            # Set expiry to prevent unlimited growth
-            redis_client.expire(f"response_metrics:{session_id}", 60*60*24*30)  # 30 days
-        except Exception as e:
-            logger.error(f"Error storing metrics in Redis: {e}")
+        """Queue per-turn metrics for Redis; the metrics writer stores them in batches"""
+        # Convert numpy values to native Python types
+        serializable_metrics = {}
+        for k, v in metrics.items():
+            if hasattr(v, "item") and callable(getattr(v, "item")):
+                serializable_metrics[k] = float(v.item())
+            else:
+                serializable_metrics[k] = v
+        metrics_writer.add_session_metrics(session_id, serializable_metrics)
 
     def _store_time_metrics(self, metric_name: str, value: float):
-        """Store time-based metrics using Redis Time Series"""
-        try:
-            print("metric_name: ",metric_name)
-            # Convert NumPy float to Python float
-            if hasattr(value, "item") and callable(getattr(value, "item")):
-                value = float(value.item())
-            
-            # Check if timeseries exists, create if not
-            try:
-                redis_client.execute_command("TS.INFO", f"metric:{metric_name}")
-            except:
-                # Create timeseries with retention of 30 days
-                redis_client.execute_command(
-                    "TS.CREATE", f"metric:{metric_name}", 
-                    "RETENTION", 60*60*24*30*1000  # 30 days in milliseconds
-                )
-            
-            # Add data point with current timestamp
-            timestamp = int(time.time() * 1000)  # Redis TS uses milliseconds
-            redis_client.execute_command("TS.ADD", f"metric:{metric_name}", timestamp, value)
-            
-        except Exception as e:
-            logger.error(f"Error storing time metrics: {e}")
+        """Queue a sample for the `metric:{name}` Redis time series"""
+        metrics_writer.add_point(metric_name, value)
 
 # Global evaluator instance
 evaluator = ResponseEvaluator()
\ No newline at end of file
@@ -0,0 +1,104 @@
+from typing import Dict, List, Any
+import asyncio
+import logging
+import random
+from middlewares.evaluation import evaluator
+from utils.config import (
+    EVALUATION_SAMPLE_RATE,
+    EVALUATION_WORKERS,
+    EVALUATION_BATCH_SIZE,
+    EVALUATION_QUEUE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationWorker:
+    """
+    Runs response evaluation off the chat hot path.
+
+    The chat path calls `submit` with the finished turn, which only puts the
+    job on a bounded queue. A small pool of background tasks drains the
+    queue in batches and hands each batch to `evaluator.evaluate_batch` in a
+    thread, so embedding calls and Redis writes never delay a reply. Only a
+    sampled share of turns is relevance-scored; the rest just record latency.
+    When the queue is full new jobs are dropped rather than slowing chat.
+    """
+
+    def __init__(self,
+                 sample_rate: float = EVALUATION_SAMPLE_RATE,
+                 num_workers: int = EVALUATION_WORKERS,
+                 batch_size: int = EVALUATION_BATCH_SIZE,
+                 queue_size: int = EVALUATION_QUEUE_SIZE):
+        self.sample_rate = sample_rate
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._queue: asyncio.Queue = None
+        self._tasks: List[asyncio.Task] = []
+        self.submitted = 0
+        self.sampled = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Start the background evaluation tasks on the running event loop."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.num_workers)]
+        logger.info(f"Started {self.num_workers} evaluation workers (sample rate {self.sample_rate})")
+
+    async def stop(self) -> None:
+        """Finish queued jobs, then stop the background tasks."""
+        if not self._tasks:
+            return
+        await self._queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job: Dict[str, Any]) -> bool:
+        """Queue a finished chat turn for evaluation without blocking."""
+        self.submitted += 1
+        job["score"] = random.random() < self.sample_rate
+        if job["score"]:
+            self.sampled += 1
+
+        if self._queue is None:
+            logger.warning("Evaluation worker not started; dropping evaluation job")
+            self.dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                await asyncio.to_thread(evaluator.evaluate_batch, batch)
+            except Exception as e:
+                logger.error(f"Error in evaluation worker: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "sampled": self.sampled,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "sample_rate": self.sample_rate,
+        }
+
+
+# Global evaluation worker instance
+evaluation_worker = EvaluationWorker()
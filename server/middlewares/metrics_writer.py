@@ -0,0 +1,209 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import threading
+import time
+from storage.redis import async_redis_client
+from utils.config import (
+    METRICS_FLUSH_SECONDS,
+    METRICS_BUFFER_SIZE,
+    METRICS_MADD_BATCH,
+    METRICS_MAX_TIMESTAMP_SHIFT_MS,
+    METRICS_RETENTION_MS,
+    METRICS_COMPACTIONS,
+    SESSION_METRICS_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Series written on every chat turn; created at startup so the first turn does not pay for it
+TIME_SERIES = ["latency_seconds", "query_relevance", "context_relevance", "time_to_first_token_seconds"]
+
+
+# Aggregations kept per compaction bucket; avg is derived as sum / count so it stays exact when re-bucketed
+COMPACTION_AGGREGATIONS = ("sum", "count", "max")
+
+
+def series_key(metric_name: str) -> str:
+    return f"metric:{metric_name}"
+
+
+def compaction_key(metric_name: str, aggregation: str, bucket_seconds: int) -> str:
+    return f"metric:{metric_name}:{aggregation}:{bucket_seconds}"
+
+
+async def _create_ignoring_existing(*command) -> None:
+    try:
+        await async_redis_client.execute_command(*command)
+    except Exception as e:
+        if "already" not in str(e):
+            raise
+
+
+class MetricsWriter:
+    """
+    Buffers evaluator metrics in memory and writes them to Redis in batches.
+
+    `add_point` and `add_session_metrics` only append to a bounded buffer, so
+    recording a metric costs no Redis round trip. A background task flushes
+    the buffer every METRICS_FLUSH_SECONDS: time-series points as TS.MADD
+    commands, per-session records as one LPUSH + EXPIRE per session, all in a
+    single pipeline. When the buffer is full (Redis slow or down) new entries
+    are dropped and counted instead of growing memory, as are samples that
+    would have to be moved more than METRICS_MAX_TIMESTAMP_SHIFT_MS ahead of
+    the clock to get a millisecond of their own.
+    """
+
+    def __init__(self, flush_seconds: float = METRICS_FLUSH_SECONDS, buffer_size: int = METRICS_BUFFER_SIZE):
+        self.flush_seconds = flush_seconds
+        self.buffer_size = buffer_size
+        self._points: List[Tuple[str, int, float]] = []
+        self._records: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self._created = set()
+        self._last_timestamp: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.points_written = 0
+        self.records_written = 0
+        self.dropped = 0
+        self.shift_dropped = 0
+        self.flushes = 0
+        self.errors = 0
+        self.last_flush_seconds = 0.0
+
+    def add_point(self, metric_name: str, value: float, timestamp_ms: Optional[int] = None) -> bool:
+        """Queue one time-series sample; False if it was dropped."""
+        if hasattr(value, "item") and callable(getattr(value, "item")):
+            value = float(value.item())
+        with self._lock:
+            if len(self._points) + len(self._records) >= self.buffer_size:
+                self.dropped += 1
+                return False
+            timestamp_ms = timestamp_ms or int(time.time() * 1000)
+            # Samples in the same millisecond are spread 1 ms apart so none is overwritten, but
+            # never more than METRICS_MAX_TIMESTAMP_SHIFT_MS ahead of the clock or the series drifts
+            shifted = max(timestamp_ms, self._last_timestamp.get(metric_name, 0) + 1)
+            if shifted - timestamp_ms > METRICS_MAX_TIMESTAMP_SHIFT_MS:
+                self.dropped += 1
+                self.shift_dropped += 1
+                return False
+            self._last_timestamp[metric_name] = shifted
+            timestamp_ms = shifted
+            self._points.append((metric_name, timestamp_ms, float(value)))
+        return True
+
+    def add_session_metrics(self, session_id: str, metrics: Dict[str, Any]) -> bool:
+        """Queue one turn's metrics for `response_metrics:{session_id}`; False if dropped."""
+        record = json.dumps(metrics)
+        with self._lock:
+            if len(self._points) + len(self._records) >= self.buffer_size:
+                self.dropped += 1
+                return False
+            self._records.append((session_id, record))
+        return True
+
+    async def ensure_series(self, metric_names: List[str] = TIME_SERIES) -> None:
+        """
+        Create the time series and their compaction rules once (idempotent
+        across workers and restarts). Compactions only cover samples written
+        after their rule was created.
+        """
+        for name in metric_names:
+            if name in self._created:
+                continue
+            try:
+                await async_redis_client.execute_command(
+                    "TS.CREATE", series_key(name),
+                    "RETENTION", METRICS_RETENTION_MS,
+                    # Workers can write the same millisecond; keep one point instead of failing the batch
+                    "DUPLICATE_POLICY", "LAST",
+                )
+            except Exception as e:
+                if "already exists" not in str(e):
+                    raise
+                await async_redis_client.execute_command("TS.ALTER", series_key(name), "DUPLICATE_POLICY", "LAST")
+            for bucket_seconds, retention_seconds in METRICS_COMPACTIONS.items():
+                for aggregation in COMPACTION_AGGREGATIONS:
+                    destination = compaction_key(name, aggregation, bucket_seconds)
+                    await _create_ignoring_existing("TS.CREATE", destination, "RETENTION", retention_seconds * 1000)
+                    await _create_ignoring_existing("TS.CREATERULE", series_key(name), destination,
+                                                    "AGGREGATION", aggregation, bucket_seconds * 1000)
+            self._created.add(name)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.flush()
+
+    async def _run(self) -> None:
+        try:
+            await self.ensure_series()
+        except Exception as e:
+            logger.error(f"Error creating metric time series: {e}")
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def flush(self) -> None:
+        with self._lock:
+            points, self._points = self._points, []
+            records, self._records = self._records, []
+        if not points and not records:
+            return
+
+        start = time.perf_counter()
+        try:
+            # Series for metrics outside TIME_SERIES are created here, off the request path
+            await self.ensure_series(sorted({name for name, _, _ in points} - self._created))
+
+            pipe = async_redis_client.pipeline(transaction=False)
+            for i in range(0, len(points), METRICS_MADD_BATCH):
+                args = []
+                for name, timestamp, value in points[i:i + METRICS_MADD_BATCH]:
+                    args.extend([series_key(name), timestamp, value])
+                pipe.execute_command("TS.MADD", *args)
+
+            by_session = defaultdict(list)
+            for session_id, record in records:
+                by_session[session_id].append(record)
+            for session_id, session_records in by_session.items():
+                pipe.lpush(f"response_metrics:{session_id}", *session_records)
+                pipe.expire(f"response_metrics:{session_id}", SESSION_METRICS_TTL_SECONDS)
+
+            for reply in await pipe.execute(raise_on_error=False):
+                if isinstance(reply, Exception):
+                    self.errors += 1
+                    logger.error(f"Error writing metrics batch: {reply}")
+            self.points_written += len(points)
+            self.records_written += len(records)
+        except Exception as e:
+            # Metrics are best effort: the batch is dropped rather than retried into a full buffer
+            self.errors += 1
+            self.dropped += len(points) + len(records)
+            logger.error(f"Error flushing metrics to Redis: {e}")
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - start
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._points) + len(self._records),
+            "points_written": self.points_written,
+            "records_written": self.records_written,
+            "dropped": self.dropped,
+            "shift_dropped": self.shift_dropped,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+
+# Global metrics writer instance
+metrics_writer = MetricsWriter()
@@ -0,0 +1,299 @@
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import math
+import threading
+import time
+from storage.redis import async_redis_client
+from utils.config import (
+    SKETCH_RELATIVE_ACCURACY,
+    SKETCH_MAX_BUCKETS,
+    SKETCH_SLOT_SECONDS,
+    SKETCH_SLOT_WIDTHS,
+    SKETCH_WINDOWS,
+    SKETCH_FLUSH_SECONDS,
+    METRICS_MAX_POINTS,
+    METRICS_MAX_WINDOW_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Values at or below this (including negative cosine scores) are counted in the zero bucket
+MIN_TRACKED_VALUE = 1e-9
+
+
+class LogHistogram:
+    """
+    Mergeable quantile sketch with fixed relative error (DDSketch-style).
+
+    A positive value x is counted in bucket ceil(log_gamma(x)), where
+    gamma = (1 + a) / (1 - a); any value reported from a bucket is within a
+    relative error `a` of the values counted in it. Merging adds bucket counts,
+    so sketches from different slots or workers combine exactly. When there
+    are more than `max_buckets` buckets, the lowest ones are collapsed, which
+    only coarsens the smallest quantiles.
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY, max_buckets: int = SKETCH_MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= MIN_TRACKED_VALUE:
+            self.zero_count += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.buckets[index] = self.buckets.get(index, 0) + count
+            if len(self.buckets) > self.max_buckets:
+                self._collapse()
+        self.count += count
+        self.sum += value * count
+
+    def merge(self, other: "LogHistogram") -> None:
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        while len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        lowest, second = sorted(self.buckets)[:2]
+        self.buckets[second] += self.buckets.pop(lowest)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                # Midpoint of the bucket (gamma^(i-1), gamma^i] in the relative-error sense
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+    def to_fields(self) -> Dict[str, float]:
+        """Redis hash fields; HINCRBY-ing them into an existing hash merges the sketches."""
+        fields = {f"b{index}": count for index, count in self.buckets.items()}
+        fields.update({"z": self.zero_count, "n": self.count})
+        return fields
+
+    @classmethod
+    def from_fields(cls, fields: Dict[bytes, bytes]) -> "LogHistogram":
+        sketch = cls()
+        for name, value in fields.items():
+            name = name.decode()
+            if name == "s":
+                sketch.sum = float(value)
+            elif name == "n":
+                sketch.count = int(value)
+            elif name == "z":
+                sketch.zero_count = int(value)
+            else:
+                sketch.buckets[int(name[1:])] = int(value)
+        while len(sketch.buckets) > sketch.max_buckets:
+            sketch._collapse()
+        return sketch
+
+
+class WindowedQuantiles:
+    """
+    One metric's samples in a ring of SKETCH_SLOT_SECONDS slots covering the
+    longest window, plus a lifetime sketch. Memory is bounded by the number of
+    slots times SKETCH_MAX_BUCKETS, however many samples arrive. Samples not
+    yet merged into Redis are kept per slot in `_pending`.
+    """
+
+    def __init__(self, name: str, slot_seconds: int = SKETCH_SLOT_SECONDS,
+                 horizon_seconds: int = max(SKETCH_WINDOWS.values())):
+        self.name = name
+        self.slot_seconds = slot_seconds
+        self._slots: List[Optional[Tuple[int, LogHistogram]]] = [None] * (horizon_seconds // slot_seconds + 1)
+        self._pending: Dict[int, LogHistogram] = {}
+        self.lifetime = LogHistogram()
+        self._lock = threading.Lock()
+
+    def add(self, value: float, now: Optional[float] = None) -> None:
+        slot = int((now or time.time()) // self.slot_seconds)
+        position = slot % len(self._slots)
+        with self._lock:
+            entry = self._slots[position]
+            if entry is None or entry[0] != slot:
+                entry = (slot, LogHistogram())
+                self._slots[position] = entry
+            entry[1].add(value)
+            self._pending.setdefault(slot, LogHistogram()).add(value)
+            self.lifetime.add(value)
+
+    def window(self, seconds: int, now: Optional[float] = None) -> LogHistogram:
+        """This worker's samples from the last `seconds` (rounded up to whole slots)."""
+        first = int((now or time.time()) // self.slot_seconds) - seconds // self.slot_seconds
+        merged = LogHistogram()
+        with self._lock:
+            for entry in self._slots:
+                if entry is not None and entry[0] >= first:
+                    merged.merge(entry[1])
+        return merged
+
+    def take_pending(self) -> Dict[int, LogHistogram]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+
+def _slot_key(metric: str, width: int, slot: int) -> str:
+    return f"sketch:{metric}:{width}:{slot}"
+
+
+def slot_ttl(width: int) -> int:
+    """Slots of a width are kept long enough to read METRICS_MAX_POINTS of them (capped at the longest window)."""
+    longest = max(METRICS_MAX_WINDOW_SECONDS, max(SKETCH_WINDOWS.values()))
+    return min(width * METRICS_MAX_POINTS, longest) + width
+
+
+def slot_width(window_seconds: int) -> int:
+    """The finest slot width that covers a window in at most METRICS_MAX_POINTS slots."""
+    for width in SKETCH_SLOT_WIDTHS:
+        if window_seconds / width <= METRICS_MAX_POINTS:
+            return width
+    return SKETCH_SLOT_WIDTHS[-1]
+
+
+class QuantileStore:
+    """
+    Windowed sketches for every evaluator metric, shared fleet-wide through Redis.
+
+    A background task merges each worker's new samples into per-slot Redis
+    hashes with HINCRBY, at every width in SKETCH_SLOT_WIDTHS, so the hashes
+    always hold the sum over all workers. A fleet read fetches at most
+    METRICS_MAX_POINTS slot hashes in one pipeline and merges them: its cost
+    depends on the window, not on how many samples were recorded.
+    """
+
+    def __init__(self, windows: Dict[str, int] = SKETCH_WINDOWS, flush_seconds: int = SKETCH_FLUSH_SECONDS):
+        self.windows = windows
+        self.flush_seconds = flush_seconds
+        self._series: Dict[str, WindowedQuantiles] = {}
+        self._series_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def series(self, name: str) -> WindowedQuantiles:
+        series = self._series.get(name)
+        if series is None:
+            with self._series_lock:
+                series = self._series.setdefault(name, WindowedQuantiles(name))
+        return series
+
+    def record(self, name: str, value: float) -> None:
+        self.series(name).add(float(value))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Merge samples recorded since the last flush into the Redis slot hashes."""
+        pipe = async_redis_client.pipeline(transaction=False)
+        batches = []
+        for series in list(self._series.values()):
+            pending = series.take_pending()
+            if pending:
+                batches.append((series, pending))
+            for slot, sketch in pending.items():
+                start = slot * series.slot_seconds
+                for width in SKETCH_SLOT_WIDTHS:
+                    key = _slot_key(series.name, width, start // width)
+                    for field, count in sketch.to_fields().items():
+                        pipe.hincrby(key, field, count)
+                    pipe.hincrbyfloat(key, "s", sketch.sum)
+                    pipe.expire(key, slot_ttl(width))
+        if not batches:
+            return
+        try:
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error merging quantile sketches into Redis: {e}")
+            # Keep the samples for the next attempt; their slots may have expired by then
+            for series, pending in batches:
+                with series._lock:
+                    for slot, sketch in pending.items():
+                        series._pending.setdefault(slot, LogHistogram()).merge(sketch)
+
+    def _window_keys(self, name: str, seconds: int, now: float) -> List[str]:
+        width = slot_width(seconds)
+        last = int(now // width)
+        return [_slot_key(name, width, slot) for slot in range(last - seconds // width, last + 1)]
+
+    async def bucket_quantiles(self, name: str, start: int, end: int, width: int, q: float = 0.95) -> Dict[int, float]:
+        """Fleet-wide quantile per `width`-second bucket in [start, end) (epoch seconds), keyed by bucket start in ms."""
+        slots = range(start // width, -(-end // width))
+        pipe = async_redis_client.pipeline(transaction=False)
+        for slot in slots:
+            pipe.hgetall(_slot_key(name, width, slot))
+        result = {}
+        for slot, fields in zip(slots, await pipe.execute()):
+            if fields:
+                result[slot * width * 1000] = LogHistogram.from_fields(fields).quantile(q)
+        return result
+
+    async def fleet_windows(self, names: List[str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """p50/p95/p99 per metric and window across all workers; this worker's view if Redis fails."""
+        now = time.time()
+        requests = [(name, label, self._window_keys(name, seconds, now))
+                    for name in names for label, seconds in self.windows.items()]
+        result: Dict[str, Dict[str, Dict[str, Any]]] = {name: {} for name in names}
+        try:
+            pipe = async_redis_client.pipeline(transaction=False)
+            for _, _, keys in requests:
+                for key in keys:
+                    pipe.hgetall(key)
+            replies = iter(await pipe.execute())
+            for name, label, keys in requests:
+                merged = LogHistogram()
+                for _ in keys:
+                    fields = next(replies)
+                    if fields:
+                        merged.merge(LogHistogram.from_fields(fields))
+                result[name][label] = merged.summary()
+        except Exception as e:
+            logger.warning(f"Falling back to local quantiles: {e}")
+            for name in names:
+                for label, seconds in self.windows.items():
+                    result[name][label] = self.series(name).window(seconds, now).summary()
+                    result[name][label]["local"] = True
+        return result
+
+
+# Global quantile store for this worker process
+quantile_store = QuantileStore()
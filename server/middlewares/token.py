@@ -3,8 +3,8 @@ from fastapi import HTTPException, Request, WebSocket, WebSocketDisconnect
 import os
 from datetime import datetime
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from storage.redis import get_redis_client
 from storage.redis import redis_client
+from middlewares.token_cache import token_cache
 security = HTTPBearer()
 
 def verify_jwt_token(request: Request = None, websocket: WebSocket = None):
@@ -25,7 +25,12 @@ def verify_jwt_token(request: Request = None, websocket: WebSocket = None):
     
     if not token:
         return None
-        
+
+    # Tokens verified recently skip the decode and the Redis round trip
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
     try:
         # Get JWT secret key from environment
         jwt_secret = os.getenv("JWT_SECRET")
@@ -50,16 +55,16 @@ def verify_jwt_token(request: Request = None, websocket: WebSocket = None):
             return None
             
         # Verify token exists in Redis
+        invalidations = token_cache.invalidations
         stored_token = redis_client.get(f"token:{user_id}")
         if not stored_token or stored_token.decode() != token:
             return None
-            
+
+        token_cache.put(token, user_id, decoded_token["exp"], invalidations)
         return user_id
         
     except jwt.ExpiredSignatureError:
-        # Clean up expired token from Redis if it exists
-        if 'user_id' in decoded_token:
-            redis_client.delete(f"token:{decoded_token['user_id']}")
+        # The Redis copy expires at the same time as the token
         return None
     except jwt.InvalidTokenError as e:
         print(f"Invalid token error: {str(e)}")
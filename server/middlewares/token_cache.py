@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+import asyncio
+import logging
+import threading
+import time
+from storage.redis import async_redis_client
+from utils.config import TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Published with the user id whenever a user's stored token is replaced
+TOKEN_REVOKED_CHANNEL = "token_revoked"
+
+
+async def publish_token_revoked(user_id: str) -> None:
+    """Tell every worker to drop cached tokens of a user."""
+    await async_redis_client.publish(TOKEN_REVOKED_CHANNEL, str(user_id))
+
+
+class TokenCache:
+    """
+    In-process cache of verified JWTs (token -> user_id).
+
+    An entry lives until the earlier of the token's `exp` and `ttl_seconds`,
+    so a cached token is re-checked against Redis at least that often. A
+    background task listens on TOKEN_REVOKED_CHANNEL and drops a user's
+    entries as soon as a new token is issued for them; if the subscription
+    drops, the whole cache is cleared since notifications may have been lost.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_SIZE, ttl_seconds: int = TOKEN_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._by_user: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(token)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(token)
+            self.misses += 1
+            return None
+
+    def put(self, token: str, user_id: str, exp: float, invalidations: Optional[int] = None) -> None:
+        """
+        Cache a verified token. Pass the `invalidations` count read before
+        checking Redis: if a revocation arrived in between, the check may have
+        seen the old token, so it is not cached.
+        """
+        expires_at = min(float(exp), time.time() + self.ttl_seconds)
+        with self._lock:
+            if invalidations is not None and invalidations != self.invalidations:
+                return
+            self._entries[token] = (user_id, expires_at)
+            self._entries.move_to_end(token)
+            self._by_user.setdefault(user_id, set()).add(token)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            for token in list(self._by_user.get(user_id, ())):
+                self._remove(token)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _remove(self, token: str) -> None:
+        user_id, _ = self._entries.pop(token)
+        tokens = self._by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[user_id]
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = async_redis_client.pubsub()
+            try:
+                await pubsub.subscribe(TOKEN_REVOKED_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self.invalidate_user(message["data"].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Token revocation subscription failed, resubscribing: {e}")
+                self.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# Global token cache instance
+token_cache = TokenCache()
@@ -1,23 +1,71 @@
-from google.cloud import aiplatform as vertexai
-from google.generativeai import GenerativeModel, embed_content
+import asyncio
 import os
-import random
-from utils.config import REGIONS
+import time
+from typing import List
+from storage.embedding_cache import embedding_cache
+
+TASK_TYPE = "retrieval_document"
+EMBEDDING_MODEL = "models/embedding-001"
+
+_initialized = False
+
+def warm_up_embedding_model() -> None:
+    """Initialize Vertex AI once at startup instead of on every embedding call."""
+    global _initialized
+    from google.cloud import aiplatform as vertexai
+
+    vertexai.init(project=os.getenv("PROJECT_ID"))  # Initialize Vertex AI
+    _initialized = True
 
 def get_text_embedding_model():
-    vertexai.init(project=os.getenv("PROJECT_ID"), location=REGIONS[random.randint(0, 25)])  # Initialize Vertex AI
+    if not _initialized:
+        warm_up_embedding_model()
     
-    model = "models/embedding-001"
-    
-    return model
+    return EMBEDDING_MODEL
 
 def get_embedding(text):
+    return get_embeddings([text])[0]
+
+def get_embeddings(texts: List[str]) -> List[List[float]]:
+    """
+    Embed several texts, serving repeats from the embedding cache and sending
+    only the unique misses to a single multi-content embed_content call.
+    """
+    if not texts:
+        return []
+
     model = get_text_embedding_model()
-    
-    result = embed_content(
-        model=model,
-        content=text,
-        task_type="retrieval_document"
-    )
-    
-    return result["embedding"]
+    keys = [embedding_cache.make_key(text, model, TASK_TYPE) for text in texts]
+    embeddings = embedding_cache.get_many(keys)
+
+    # Deduplicate misses so identical texts in one call are embedded once
+    missing = {}
+    for key, text, embedding in zip(keys, texts, embeddings):
+        if embedding is None and key not in missing:
+            missing[key] = text
+
+    if missing:
+        from google.generativeai import embed_content
+
+        start = time.perf_counter()
+        result = embed_content(
+            model=model,
+            content=list(missing.values()),
+            task_type=TASK_TYPE
+        )
+        fresh = dict(zip(missing.keys(), result["embedding"]))
+        embedding_cache.put_many(list(fresh.keys()), list(fresh.values()),
+                                 api_seconds=time.perf_counter() - start)
+
+        embeddings = [embedding if embedding is not None else fresh[key]
+                      for key, embedding in zip(keys, embeddings)]
+
+    return embeddings
+
+async def get_embedding_async(text):
+    """Non-blocking get_embedding for use inside async handlers."""
+    return await asyncio.to_thread(get_embedding, text)
+
+async def get_embeddings_async(texts: List[str]) -> List[List[float]]:
+    """Non-blocking get_embeddings for use inside async handlers."""
+    return await asyncio.to_thread(get_embeddings, texts)
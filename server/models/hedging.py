@@ -0,0 +1,92 @@
+from collections import deque
+from typing import Dict, Any
+import threading
+import time
+import numpy as np
+from utils.config import (
+    LLM_HEDGING_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_BUDGET_PER_MINUTE,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGE_DEFAULT_DELAY_SECONDS,
+)
+
+
+class HedgeController:
+    """
+    Decides when a generation call should be hedged to a second region.
+
+    The hedge delay is a percentile of recent call latencies, so only the
+    slow tail gets a duplicate request. Calls cancelled after losing a hedge
+    count with their elapsed time, so the percentile is not skewed towards
+    the fast calls. A per-minute budget caps the
+    number of duplicates sent, and counters track how often hedges are sent
+    and how often the hedge answers first.
+    """
+
+    MIN_SAMPLES = 20
+
+    def __init__(self,
+                 enabled: bool = LLM_HEDGING_ENABLED,
+                 percentile: float = LLM_HEDGE_PERCENTILE,
+                 budget_per_minute: int = LLM_HEDGE_BUDGET_PER_MINUTE,
+                 min_delay: float = LLM_HEDGE_MIN_DELAY_SECONDS,
+                 default_delay: float = LLM_HEDGE_DEFAULT_DELAY_SECONDS,
+                 window: int = 500):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.budget_per_minute = budget_per_minute
+        self.min_delay = min_delay
+        self.default_delay = default_delay
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._budget_minute = 0
+        self._budget_used = 0
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def record_latency(self, latency: float) -> None:
+        with self._lock:
+            self._latencies.append(latency)
+
+    def increment(self, counter: str) -> None:
+        """Bump one of the counters reported by `stats`."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary before sending a hedge."""
+        with self._lock:
+            if len(self._latencies) < self.MIN_SAMPLES:
+                return self.default_delay
+            delay = float(np.percentile(self._latencies, self.percentile))
+        return max(delay, self.min_delay)
+
+    def try_acquire(self) -> bool:
+        """Take one hedge from this minute's budget, if any is left."""
+        minute = int(time.time() // 60)
+        with self._lock:
+            if minute != self._budget_minute:
+                self._budget_minute = minute
+                self._budget_used = 0
+            if self._budget_used >= self.budget_per_minute:
+                self.budget_exhausted += 1
+                return False
+            self._budget_used += 1
+            self.hedges_sent += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "hedges_sent": self.hedges_sent,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": self.hedges_sent / self.requests if self.requests else 0.0,
+                "hedge_win_rate": self.hedge_wins / self.hedges_sent if self.hedges_sent else 0.0,
+                "budget_exhausted": self.budget_exhausted,
+                "budget_per_minute": self.budget_per_minute,
+            }
@@ -1,29 +1,140 @@
-import google.generativeai as genai
 from dotenv import load_dotenv
+import asyncio
 import os
-from google.cloud import aiplatform as vertexai
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Tuple
 from utils.config import REGIONS
-import random
-from google.generativeai import GenerativeModel
+from models.region_pool import RegionRouter
+from models.hedging import HedgeController
 load_dotenv()
 
+MODEL_NAME = "gemini-1.5-pro-001"
 
-def get_model(temperature=0.3, top_p=0.7, top_k=40, max_output_tokens=1024):
-    vertexai.init(project=os.getenv("PROJECT_ID"), location=REGIONS[random.randint(0, 25)])  # Initialize Vertex AI
-    
-    generation_config = {
+# Latency/health-aware routing across REGIONS for generation calls
+llm_router = RegionRouter(REGIONS)
+
+# Opt-in duplicate requests for slow-tail generation calls
+hedge_controller = HedgeController()
+
+# Long-lived models keyed by (region, generation config)
+_model_pool: Dict[Tuple[str, Tuple], Any] = {}
+_pool_lock = threading.Lock()
+
+
+def _generation_config(temperature=0.3, top_p=0.7, top_k=40, max_output_tokens=1024) -> Dict[str, Any]:
+    return {
         "temperature": temperature,
         "top_p": top_p,
         "top_k": top_k,
         "max_output_tokens": max_output_tokens,
     }
-    
-    model = GenerativeModel(
-        "gemini-1.5-pro-001",
-        generation_config=generation_config
-    ) 
+
+
+def _get_regional_model(region: str, generation_config: Dict[str, Any]) -> "GenerativeModel":
+    """Return the pooled model for a region, building it on first use."""
+    key = (region, tuple(sorted(generation_config.items())))
+    model = _model_pool.get(key)
+    if model is None:
+        with _pool_lock:
+            model = _model_pool.get(key)
+            if model is None:
+                # Deferred: the Vertex SDK takes seconds to import
+                from google.cloud import aiplatform as vertexai
+                from vertexai.generative_models import GenerativeModel
+
+                # Vertex models bind to the location configured when they are built
+                vertexai.init(project=os.getenv("PROJECT_ID"), location=region)  # Initialize Vertex AI
+                model = GenerativeModel(MODEL_NAME, generation_config=generation_config)
+                _model_pool[key] = model
     return model
 
 
+def warm_up_models() -> None:
+    """Build the default-config model for every region so requests never pay for client setup."""
+    config = _generation_config()
+    for region in llm_router.regions:
+        _get_regional_model(region, config)
+    print(f"Warmed {len(llm_router.regions)} regional Gemini clients")
+
+
+async def _generate_in_region(region: str, prompt: str, generation_config: Dict[str, Any]) -> str:
+    """Generate in one region, feeding the outcome back to the router."""
+    model = _get_regional_model(region, generation_config)
+    start = time.time()
+    try:
+        response = await model.generate_content_async(prompt)
+        text = response.text
+    except Exception:
+        llm_router.record_failure(region)
+        raise
+    latency = time.time() - start
+    llm_router.record_success(region, latency)
+    hedge_controller.record_latency(latency)
+    return text
+
+
+async def generate_content_async(prompt: str, **generation_kwargs):
+    """
+    Generate a full response in the routed region.
+
+    With hedging enabled, if the primary region has not answered within the
+    hedge delay and budget allows, the same request is sent to the next best
+    region; the first successful answer wins and the other call is cancelled.
+    """
+    generation_config = _generation_config(**generation_kwargs)
+    primary_region = llm_router.pick()
+    if not hedge_controller.enabled:
+        return await _generate_in_region(primary_region, prompt, generation_config)
+
+    hedge_controller.increment("requests")
+    primary_start = time.time()
+    primary = asyncio.create_task(_generate_in_region(primary_region, prompt, generation_config))
+    done, _ = await asyncio.wait({primary}, timeout=hedge_controller.hedge_delay())
+    if done or not hedge_controller.try_acquire():
+        return await primary
+
+    hedge_region = llm_router.pick(exclude=[primary_region])
+    hedge = asyncio.create_task(_generate_in_region(hedge_region, prompt, generation_config))
+    started = {primary: (primary_region, primary_start), hedge: (hedge_region, time.time())}
+    pending = {primary, hedge}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        hedge_controller.increment("hedge_wins")
+                    # The loser is cancelled below; its elapsed time is a lower bound on its latency
+                    for loser in pending:
+                        region, loser_start = started[loser]
+                        elapsed = time.time() - loser_start
+                        llm_router.record_censored(region, elapsed)
+                        hedge_controller.record_latency(elapsed)
+                    return task.result()
+        # Both calls failed; surface the primary's error
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
 
-        
\ No newline at end of file
+async def stream_content_async(prompt: str, **generation_kwargs) -> AsyncIterator[str]:
+    """Stream response text in the routed region, feeding the total latency back to the router."""
+    region = llm_router.pick()
+    model = _get_regional_model(region, _generation_config(**generation_kwargs))
+    start = time.time()
+    try:
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety or finish metadata)
+                continue
+            if text:
+                yield text
+    except Exception:
+        llm_router.record_failure(region)
+        raise
+    llm_router.record_success(region, time.time() - start)
@@ -0,0 +1,134 @@
+from typing import Dict, List, Any, Iterable, Optional
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RegionStats:
+    """Rolling health and latency figures for one region."""
+
+    def __init__(self):
+        self.ewma_latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.ejection_streak = 0
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "ewma_latency_seconds": self.ewma_latency,
+            "error_rate": self.error_rate,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": self.ejected_until > now,
+            "ejected_for_seconds": max(0.0, self.ejected_until - now),
+            "ejections": self.ejections,
+        }
+
+
+class RegionRouter:
+    """
+    Picks the fastest healthy region.
+
+    Each region keeps an EWMA of call latency and of its error rate. Regions
+    that fail repeatedly or whose error rate crosses the threshold are ejected
+    for a cool-down period, doubling on each consecutive ejection. A small
+    share of calls explores a random healthy region so latency estimates for
+    the others stay fresh.
+    """
+
+    def __init__(self,
+                 regions: Iterable[str],
+                 alpha: float = 0.2,
+                 explore_rate: float = 0.05,
+                 eject_error_rate: float = 0.5,
+                 eject_after_errors: int = 3,
+                 eject_seconds: float = 30.0,
+                 max_eject_seconds: float = 600.0):
+        self.regions = list(dict.fromkeys(regions))
+        self.alpha = alpha
+        self.explore_rate = explore_rate
+        self.eject_error_rate = eject_error_rate
+        self.eject_after_errors = eject_after_errors
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self._stats = {region: RegionStats() for region in self.regions}
+        self._lock = threading.Lock()
+
+    def _healthy(self, now: float, exclude: Iterable[str] = ()) -> List[str]:
+        excluded = set(exclude)
+        return [r for r in self.regions if r not in excluded and self._stats[r].ejected_until <= now]
+
+    def ranked(self, exclude: Iterable[str] = ()) -> List[str]:
+        """Healthy regions ordered fastest first; regions without samples go last in random order."""
+        now = time.time()
+        with self._lock:
+            healthy = self._healthy(now, exclude)
+            if not healthy:
+                # Everything is ejected: fall back to whichever comes back soonest
+                excluded = set(exclude)
+                candidates = [r for r in self.regions if r not in excluded] or self.regions
+                return sorted(candidates, key=lambda r: self._stats[r].ejected_until)
+
+            known = sorted((r for r in healthy if self._stats[r].ewma_latency is not None),
+                           key=lambda r: self._stats[r].ewma_latency)
+            unknown = [r for r in healthy if self._stats[r].ewma_latency is None]
+            random.shuffle(unknown)
+            return known + unknown
+
+    def pick(self, exclude: Iterable[str] = ()) -> str:
+        """Pick the region for the next call."""
+        ranked = self.ranked(exclude)
+        if len(ranked) > 1 and random.random() < self.explore_rate:
+            return random.choice(ranked[1:])
+        return ranked[0]
+
+    def record_success(self, region: str, latency: float) -> None:
+        with self._lock:
+            stats = self._stats[region]
+            stats.requests += 1
+            stats.consecutive_errors = 0
+            stats.ejection_streak = 0
+            stats.ewma_latency = latency if stats.ewma_latency is None else \
+                self.alpha * latency + (1 - self.alpha) * stats.ewma_latency
+            stats.error_rate = (1 - self.alpha) * stats.error_rate
+
+    def record_censored(self, region: str, elapsed: float) -> None:
+        """
+        Record a call abandoned after `elapsed` seconds (e.g. it lost a hedge).
+        Its latency is at least `elapsed`, so the estimate only moves up.
+        """
+        with self._lock:
+            stats = self._stats[region]
+            if stats.ewma_latency is None or elapsed > stats.ewma_latency:
+                stats.ewma_latency = elapsed if stats.ewma_latency is None else \
+                    self.alpha * elapsed + (1 - self.alpha) * stats.ewma_latency
+
+    def record_failure(self, region: str) -> None:
+        with self._lock:
+            stats = self._stats[region]
+            stats.requests += 1
+            stats.errors += 1
+            stats.consecutive_errors += 1
+            stats.error_rate = self.alpha + (1 - self.alpha) * stats.error_rate
+
+            if stats.consecutive_errors >= self.eject_after_errors or stats.error_rate >= self.eject_error_rate:
+                cooldown = min(self.eject_seconds * 2 ** stats.ejection_streak, self.max_eject_seconds)
+                stats.ejected_until = time.time() + cooldown
+                stats.ejections += 1
+                stats.ejection_streak += 1
+                stats.consecutive_errors = 0
+                # Start fresh when the region comes back
+                stats.error_rate = 0.0
+                logger.warning(f"Ejecting region {region} for {cooldown:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {region: self._stats[region].as_dict(now) for region in self.regions}
@@ -1,38 +1,63 @@
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, UploadFile, HTTPException, File, Depends
-from storage.pinecone import pinecone_chat_index
-from storage.redis import redis_client
+from storage.pinecone import pinecone_chat_index, upsert_index_async, chat_namespace, vector_index_stats
+from storage.redis import async_redis_client
 from middlewares.token import verify_jwt_token
-from google.cloud import firestore, storage
-from services.knowledge import update_knowledge_base
-from models.embedding import get_embedding
-from services.chat import get_chat_response
+from middlewares.token_cache import token_cache
+from models.embedding import get_embedding_async
+from storage.embedding_cache import embedding_cache
+from services.chat import get_chat_response, stream_chat_response
 from services.login import login_user
 from schema.user import UserLogin, UserSignup
+from schema.settings import ChunkingSettings
+from services.chunking import get_chunking_settings, save_chunking_settings
 from middlewares.evaluation import evaluator
+from middlewares.evaluation_worker import evaluation_worker
+from middlewares.metrics_writer import metrics_writer
+from services.loop_monitor import loop_monitor
+from services.connections import connection_registry
+from models.llm import llm_router, hedge_controller
+from services.semantic_cache import semantic_cache
 from services.signup import signup_user
 from services.getSessionId import generate_session_id
-from services.parser import parse_document 
-import time
+import asyncio
+import hashlib
 import logging
 import os
 from datetime import datetime
-from services.upload import upload_service
-import tempfile
+from services.upload import stream_upload
+from services.upload_jobs import create_job, enqueue_job, discard_job, get_job_status, source_path
+from services.knowledge import knowledge_stats, delete_user_knowledge, chat_sessions_key
+from services.passwords import password_hashing_stats
+from services.metrics_query import metric_series, choose_bucket, metrics_cache
+from storage.gcs import storage_client
+from utils.config import GCS_BUCKET_NAME, METRICS_DEFAULT_WINDOW_SECONDS, METRICS_MAX_WINDOW_SECONDS
+from typing import Optional
 import json
+import uuid
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-active_connections: dict = {}
-
 @router.get("/metrics")
-async def get_model_metrics(user_id: str = Depends(verify_jwt_token)):
-    """Get aggregated model performance metrics"""
+async def get_model_metrics(window: int = METRICS_DEFAULT_WINDOW_SECONDS, bucket: Optional[int] = None,
+                            user_id: str = Depends(verify_jwt_token)):
+    """
+    Get aggregated model performance metrics, with latency over the last
+    `window` seconds in buckets of at least `bucket` seconds
+    """
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    
+    if not 60 <= window <= METRICS_MAX_WINDOW_SECONDS:
+        raise HTTPException(status_code=400, detail=f"window must be between 60 and {METRICS_MAX_WINDOW_SECONDS} seconds")
+    if bucket is not None and bucket <= 0:
+        raise HTTPException(status_code=400, detail="bucket must be positive")
+
+    # Dashboards poll constantly: concurrent and repeated polls share one computation for a few seconds
+    return await metrics_cache.get((window, choose_bucket(window, bucket)), lambda: _collect_metrics(window, bucket))
+
+async def _collect_metrics(window: int, bucket: Optional[int]) -> dict:
     try:
         # Get real-time metrics from the evaluator instance
         metrics = evaluator.get_aggregate_metrics()
@@ -44,22 +69,25 @@ async def get_model_metrics(user_id: str = Depends(verify_jwt_token)):
                 serializable_metrics[k] = float(v.item())
             else:
                 serializable_metrics[k] = v
+
+        serializable_metrics["embedding_cache"] = embedding_cache.stats()
+        serializable_metrics["evaluation_worker"] = evaluation_worker.stats()
+        serializable_metrics["metrics_writer"] = metrics_writer.stats()
+        serializable_metrics["event_loop"] = loop_monitor.stats()
+        serializable_metrics["llm_regions"] = llm_router.stats()
+        serializable_metrics["llm_hedging"] = hedge_controller.stats()
+        serializable_metrics["semantic_cache"] = semantic_cache.stats()
+        serializable_metrics["vector_index"] = vector_index_stats()
+        serializable_metrics["connections"] = connection_registry.stats()
+        serializable_metrics["token_cache"] = token_cache.stats()
+        serializable_metrics["password_hashing"] = password_hashing_stats()
+        serializable_metrics["windows"] = await evaluator.get_window_metrics()
+        serializable_metrics["metrics_cache"] = metrics_cache.stats()
         
         # If Redis TS is used, get time-series metrics
         try:
-            # Get average latency over time (last 24 hours)
-            end_time = int(time.time() * 1000)
-            start_time = end_time - (24 * 60 * 60 * 1000)  # 24 hours back
-            
-            latency_data = redis_client.execute_command(
-                "TS.RANGE", "metric:latency_seconds", start_time, end_time
-            )
-            
-            if latency_data:
-                serializable_metrics["latency_over_time"] = [
-                    {"timestamp": point[0], "value": point[1]} 
-                    for point in latency_data
-                ]
+            # Bucketed server-side, so the size is bounded by METRICS_MAX_POINTS whatever the traffic
+            serializable_metrics["latency_over_time"] = await metric_series("latency_seconds", window, bucket)
         except Exception as e:
             logger.warning(f"Could not retrieve time-series metrics: {e}")
             
@@ -82,7 +110,7 @@ async def get_session_metrics(session_id: str, user_id: str = Depends(verify_jwt
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        metrics_list = redis_client.lrange(f"response_metrics:{session_id}", 0, -1)
+        metrics_list = await async_redis_client.lrange(f"response_metrics:{session_id}", 0, -1)
         if not metrics_list:
             raise HTTPException(status_code=404, detail="No metrics found for this session")
         
@@ -115,62 +143,87 @@ async def get_session_metrics(session_id: str, user_id: str = Depends(verify_jwt
 
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...), user_id: str = Depends(verify_jwt_token)):
+    """Store the file and queue it for processing; returns a job id to poll"""
     if not user_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
-        
-    with tempfile.TemporaryDirectory() as temp_dir:
-        local_file_path = os.path.join(temp_dir, file.filename)
 
-        try:
-            start_time = datetime.now()
-            print("start time: ", start_time)
-            # Save the uploaded file to the temporary path
-            with open(local_file_path, "wb") as local_file:
-                local_file.write(await file.read())
-
-            print(f"File saved at {local_file_path}")
-            file.file.seek(0)
-            # Pass email to upload_service
-            public_url = await upload_service(user_id, file)
-            print("File uploaded to GCS successfully public_url: ", public_url)
-            file_content = parse_document(local_file_path)
-            response = update_knowledge_base(user_id, file_content=file_content)
-            print("response from pinecone" ,response)
-            end_time = datetime.now()
-            print("end time: ", end_time)
-            print("time taken: ", end_time - start_time)
-            return {
-                "public_url": public_url,
-                "message": "File uploaded successfully!"
-            }
+    job_id = None
+    try:
+        job_id = await create_job(user_id, file.filename)
+        # Read the upload once, teeing it into the job's spool file and GCS
+        upload = await stream_upload(user_id, file, source_path(job_id, file.filename))
+        await enqueue_job(job_id, upload)
 
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error uploading file: {e}")
+        return {
+            "job_id": job_id,
+            "status": "queued",
+            "public_url": upload["public_url"],
+            "sha256": upload["sha256"],
+            "message": "File uploaded successfully! Processing has started."
+        }
+
+    except Exception as e:
+        if job_id is not None:
+            # Never queued: do not leave it "receiving" with its spool on disk
+            await discard_job(job_id, str(e))
+        raise HTTPException(status_code=500, detail=f"Error uploading file: {e}")
+
+@router.get("/upload/{job_id}")
+async def get_upload_status(job_id: str, user_id: str = Depends(verify_jwt_token)):
+    """Get the stage, embedding progress and timings of an upload job"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    status = await get_job_status(job_id)
+    if not status or status["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return status
+
+@router.get("/knowledge/stats")
+async def get_knowledge_stats(user_id: str = Depends(verify_jwt_token)):
+    """Get the number of document and chat vectors stored for the user"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        return await asyncio.to_thread(knowledge_stats, user_id)
+    except Exception as e:
+        logger.error(f"Error retrieving knowledge stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/knowledge")
+async def delete_knowledge(include_chat: bool = False, include_files: bool = False,
+                           user_id: str = Depends(verify_jwt_token)):
+    """Delete all of the user's document vectors, and optionally their chat history vectors and uploaded files"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        return await asyncio.to_thread(delete_user_knowledge, user_id, include_chat, include_files)
+    except Exception as e:
+        logger.error(f"Error deleting knowledge: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/settings/chunking")
+async def get_chunking(user_id: str = Depends(verify_jwt_token)):
+    """Get the chunk size, overlap and near-duplicate threshold used for the user's uploads"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return await asyncio.to_thread(get_chunking_settings, user_id)
+
+@router.put("/settings/chunking")
+async def update_chunking(settings: ChunkingSettings, user_id: str = Depends(verify_jwt_token)):
+    """Update the user's chunking settings; they apply to documents uploaded afterwards"""
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    try:
+        return await asyncio.to_thread(save_chunking_settings, user_id, settings.dict(exclude_none=True))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/documents")
 async def get_documents(user_id: str = Depends(verify_jwt_token)):
     """Get list of documents uploaded by a user."""
     try:
-        # Initialize GCS client
-        storage_client = storage.Client()
-        bucket = storage_client.bucket("documents-vahan")
-        
-        # List all blobs with user_id prefix
-        blobs = bucket.list_blobs(prefix=f"{user_id}/")
-        
-        documents = []
-        for blob in blobs:
-            # Get metadata
-            blob.reload()  # Ensure we have latest metadata
-            metadata = blob.metadata or {}
-            
-            documents.append({
-                "filename": metadata.get("filename", blob.name.split("/")[-1]),
-                "uploaded_by": metadata.get("uploaded_by", user_id),
-                "upload_date": metadata.get("upload_date"),
-                "url": blob.public_url,
-                "size": blob.size,
-            })
+        documents = await asyncio.to_thread(_list_documents, user_id)
             
         return {
             "documents": documents,
@@ -181,25 +234,126 @@ async def get_documents(user_id: str = Depends(verify_jwt_token)):
         logger.error(f"Error retrieving documents: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving documents: {str(e)}")
 
+def _list_documents(user_id: str) -> list:
+    """List a user's blobs with metadata; blocking GCS calls, run in a worker thread."""
+    bucket = storage_client.bucket(GCS_BUCKET_NAME)
+    
+    # List all blobs with user_id prefix
+    blobs = bucket.list_blobs(prefix=f"{user_id}/")
+    
+    documents = []
+    for blob in blobs:
+        # Get metadata
+        blob.reload()  # Ensure we have latest metadata
+        metadata = blob.metadata or {}
+        
+        documents.append({
+            "filename": metadata.get("filename", blob.name.split("/")[-1]),
+            "uploaded_by": metadata.get("uploaded_by", user_id),
+            "upload_date": metadata.get("upload_date"),
+            "url": blob.public_url,
+            "size": blob.size,
+        })
+    return documents
+
+
+async def _persist_turn(user_id: str, session_id: str, data: str, response: str) -> None:
+    """Save a finished chat turn to Redis history and the Pinecone chat index"""
+    # Save to Redis
+    try:
+        await async_redis_client.rpush(
+            f"chat_history:{user_id}:{session_id}",
+            f"User: {data}",
+            f"Chatbot: {response}"
+        )
+        # Lets /knowledge/stats find the session's chat namespace without listing namespaces
+        await async_redis_client.sadd(chat_sessions_key(user_id), session_id)
+    except Exception as e:
+        print(f"Error saving to Redis: {e}")
+    
+    # Save to Pinecone
+    try:
+        embedding = await get_embedding_async(data + response)
+        await upsert_index_async(
+            pinecone_chat_index,
+            vectors=[{
+                # Content hash, so the id is the same in every worker process
+                "id": hashlib.sha256(f"{session_id}\x00{data}\x00{response}".encode("utf-8")).hexdigest(),
+                "values": embedding,
+                "metadata": {"text": data + response, "session_id": session_id, "user_id": str(user_id)}
+            }],
+            namespace=chat_namespace(user_id, session_id)
+        )
+    except Exception as e:
+        print(f"Error upserting to Pinecone: {e}")
+
+# Turns still being persisted; holding the tasks keeps them from being garbage collected mid-write
+_persist_tasks = set()
+
+def _persist_in_background(user_id: str, session_id: str, data: str, response: str) -> None:
+    """Persist a turn after its answer is sent, so the user only waits for retrieval + generation"""
+    task = asyncio.create_task(_persist_turn(user_id, session_id, data, response))
+    _persist_tasks.add(task)
+    task.add_done_callback(_persist_tasks.discard)
+
+async def _stream_response(user_id: str, session_id: str, data: str) -> None:
+    """
+    Stream one answer as JSON frames sharing a message id:
+    start, then one delta per generated chunk, then end (or error).
+    History is persisted from the assembled text in the background once the
+    stream ends.
+    Frames go through the connection registry, so if the session reconnects
+    to another worker mid-answer the rest of the answer follows it there.
+    """
+    message_id = str(uuid.uuid4())
+
+    async def send(frame: dict) -> None:
+        await connection_registry.send(user_id, session_id, frame)
+
+    await send({"type": "start", "id": message_id})
+
+    parts = []
+    try:
+        async for delta in stream_chat_response(user_id, session_id, data):
+            parts.append(delta)
+            await send({"type": "delta", "id": message_id, "text": delta})
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        print(f"Error streaming chat response: {e}")
+        await send({
+            "type": "error",
+            "id": message_id,
+            "message": "I'm sorry, I encountered an error processing your request."
+        })
+        return
+
+    response = "".join(parts)
+    await send({"type": "end", "id": message_id, "text": response})
+    _persist_in_background(user_id, session_id, data, response)
 
 @router.websocket("/chat")
 async def websocket_endpoint(
     websocket: WebSocket, 
     session_id: str,
-    user_id: str
+    user_id: str,
+    stream: bool = False
 ):
     await websocket.accept()
     if user_id is None:
         await websocket.close(code=1008)
         return 
 
-    if user_id not in active_connections:
-        active_connections[user_id] = {}
-    active_connections[user_id][session_id] = websocket
+    # Routes messages for this session to this worker from any other worker
+    await connection_registry.register(user_id, session_id, websocket)
 
     try:
         while True:
             data = await websocket.receive_text()
+
+            if stream:
+                await _stream_response(user_id, session_id, data)
+                continue
             
             # Get response from model
             try:
@@ -208,37 +362,21 @@ async def websocket_endpoint(
                 print(f"Error getting chat response: {e}")
                 response = "I'm sorry, I encountered an error processing your request."
             
-            # Save to Redis
-            try:
-                redis_client.rpush(f"chat_history:{user_id}:{session_id}", f"User: {data}")
-                redis_client.rpush(f"chat_history:{user_id}:{session_id}", f"Chatbot: {response}")
-            except Exception as e:
-                print(f"Error saving to Redis: {e}")
-            
-            # Save to Pinecone
-            try:
-                embedding = get_embedding(data + response)
-                pinecone_chat_index.upsert(
-                    vectors=[{
-                        "id": str(hash(data + response + session_id)),
-                        "values": embedding,
-                        "metadata": {"text": data + response, "session_id": session_id}
-                    }]
-                )
-            except Exception as e:
-                print(f"Error upserting to Pinecone: {e}")
-            
-            # Send response
-            await websocket.send_text(response)
+            # Send response to wherever the session is connected now, which may be another worker
+            if not await connection_registry.send(user_id, session_id, response):
+                print(f"Dropped chat response for disconnected session {session_id}")
+            _persist_in_background(user_id, session_id, data, response)
 
     except WebSocketDisconnect:
-        if user_id in active_connections and session_id in active_connections[user_id]:
-            del active_connections[user_id][session_id]
-            if not active_connections[user_id]:
-                del active_connections[user_id]
+        pass
     except Exception as e:
         print(f"Unexpected error in WebSocket: {e}")
-        await websocket.close(code=1011)
+        try:
+            await websocket.close(code=1011)
+        except Exception:
+            pass  # already closed, e.g. replaced by a newer connection
+    finally:
+        await connection_registry.unregister(user_id, session_id, websocket)
 
 @router.post("/login")
 async def login(user_data: UserLogin):
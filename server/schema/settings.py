@@ -0,0 +1,7 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ChunkingSettings(BaseModel):
+    chunk_tokens: Optional[int] = Field(None, ge=32, le=2000)
+    overlap_tokens: Optional[int] = Field(None, ge=0)
+    dedupe_threshold: Optional[float] = Field(None, ge=0.0, le=1.0)
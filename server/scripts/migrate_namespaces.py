@@ -0,0 +1,111 @@
+"""
+Move vectors from the shared default namespace into tenant namespaces.
+
+Documents move from "" in the document index to the user's namespace
+(metadata `user_id`). Chat turns move from "" in the chat index to
+"{user_id}/{session_id}"; older turns only carry `session_id`, so the owner
+is looked up from the Redis `chat_history:{user_id}:{session_id}` keys,
+which also fill the `chat_sessions:{user_id}` sets /knowledge/stats reads.
+Vectors whose tenant cannot be determined are left where they are.
+
+Vectors keep their ids. Each batch is upserted into its namespace before it
+is deleted from the default namespace, so the script can be stopped and
+re-run at any point.
+
+Usage (from the server directory):
+    python -m scripts.migrate_namespaces --dry-run
+    python -m scripts.migrate_namespaces
+    python -m scripts.migrate_namespaces --index documents --keep-source
+"""
+import argparse
+import os
+import sys
+from collections import defaultdict
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+from storage.pinecone import pinecone_doc_index, pinecone_chat_index, doc_namespace, chat_namespace
+from storage.redis import redis_client
+from services.knowledge import chat_sessions_key
+
+BATCH_SIZE = 100
+
+
+def _field(obj, name, default=None):
+    return obj.get(name, default) if isinstance(obj, dict) else getattr(obj, name, default)
+
+
+def session_owners() -> dict:
+    """session_id -> user_id, from the Redis chat history keys."""
+    owners = {}
+    for key in redis_client.scan_iter(match="chat_history:*", count=1000):
+        _, user_id, session_id = key.decode().split(":", 2)
+        owners[session_id] = user_id
+    return owners
+
+
+def migrate(index, target_namespace, dry_run: bool, keep_source: bool) -> dict:
+    counts = {"moved": 0, "skipped": 0}
+    per_namespace = defaultdict(int)
+
+    # Collect ids first: deleting while paginating the listing could skip pages
+    ids = [vector_id for page in index.list(namespace="") for vector_id in page]
+    for i in range(0, len(ids), BATCH_SIZE):
+        fetched = _field(index.fetch(ids=ids[i:i + BATCH_SIZE], namespace=""), "vectors", {}) or {}
+        groups = defaultdict(list)
+        for vector_id, vector in fetched.items():
+            metadata = dict(_field(vector, "metadata", {}) or {})
+            namespace = target_namespace(metadata)
+            if namespace is None:
+                counts["skipped"] += 1
+                continue
+            groups[namespace].append({"id": vector_id, "values": list(_field(vector, "values")), "metadata": metadata})
+
+        for namespace, vectors in groups.items():
+            per_namespace[namespace] += len(vectors)
+            counts["moved"] += len(vectors)
+            if dry_run:
+                continue
+            index.upsert(vectors=vectors, namespace=namespace)
+            if not keep_source:
+                index.delete(ids=[v["id"] for v in vectors], namespace="")
+
+    counts["namespaces"] = len(per_namespace)
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", choices=["documents", "chat", "all"], default="all")
+    parser.add_argument("--dry-run", action="store_true", help="only count what would move")
+    parser.add_argument("--keep-source", action="store_true", help="copy instead of move")
+    args = parser.parse_args()
+
+    if args.index in ("documents", "all"):
+        def doc_target(metadata):
+            user_id = metadata.get("user_id")
+            return doc_namespace(user_id) if user_id else None
+
+        print("documents:", migrate(pinecone_doc_index, doc_target, args.dry_run, args.keep_source))
+
+    if args.index in ("chat", "all"):
+        owners = session_owners()
+        if not args.dry_run:
+            for session_id, user_id in owners.items():
+                redis_client.sadd(chat_sessions_key(user_id), session_id)
+
+        def chat_target(metadata):
+            session_id = metadata.get("session_id")
+            user_id = metadata.get("user_id") or owners.get(session_id)
+            if not session_id or not user_id:
+                return None
+            metadata["user_id"] = str(user_id)
+            return chat_namespace(user_id, session_id)
+
+        print("chat:", migrate(pinecone_chat_index, chat_target, args.dry_run, args.keep_source))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Bulk-load the Redis email -> user index from the Firestore `users` collection.
+
+Every user document is written to `user_email:{email}` (pipelined, in
+batches), overwriting stale entries. When the whole collection has been
+loaded, `user_email:warmed` is set: from then on signup trusts the index
+for its duplicate-email check and skips the Firestore query. Login falls
+back to Firestore on a miss either way.
+
+Emails that appear on more than one document (left over from signups that
+raced before the index existed) are reported; the last document read wins.
+
+Usage (from the server directory):
+    python -m scripts.warm_user_index --dry-run
+    python -m scripts.warm_user_index
+"""
+import argparse
+import os
+import sys
+import time
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+from storage.db import get_database
+from storage.redis import redis_client
+from services.user_index import INDEXED_FIELDS, WARMED_KEY, user_email_key, index_record
+
+BATCH_SIZE = 500
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only count users")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    users = get_database().collection("users").select(list(INDEXED_FIELDS)).stream()
+    seen = set()
+    counts = {"indexed": 0, "skipped": 0, "duplicate_emails": 0}
+    pipe = redis_client.pipeline(transaction=False)
+    for doc in users:
+        user_doc = doc.to_dict()
+        email = user_doc.get("email")
+        if not email or not user_doc.get("user_id"):
+            counts["skipped"] += 1
+            continue
+        if email in seen:
+            counts["duplicate_emails"] += 1
+            print(f"duplicate email: {email} (user {user_doc['user_id']})")
+        seen.add(email)
+        counts["indexed"] += 1
+        if args.dry_run:
+            continue
+        pipe.set(user_email_key(email), index_record(user_doc))
+        if len(pipe) >= BATCH_SIZE:
+            pipe.execute()
+    if not args.dry_run:
+        pipe.set(WARMED_KEY, int(time.time()))
+        pipe.execute()
+
+    print(f"{counts} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Production entry point: several uvicorn worker processes, uvloop and
+httptools, no reload, and a bounded graceful drain on shutdown.
+
+    python serve.py                      # SERVER_WORKERS workers (default: CPU count)
+    SERVER_WORKERS=4 PORT=8080 python serve.py
+
+`python main.py` remains the single-process development server with reload.
+WebSocket sessions may land on any worker; services/connections.py routes
+messages between workers through Redis.
+"""
+import importlib.util
+import logging
+import os
+import uvicorn
+from services.logger import configure_logging
+from utils.config import SERVER_WORKERS, SERVER_GRACEFUL_TIMEOUT_SECONDS, VECTOR_BACKEND
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main() -> None:
+    workers = max(1, SERVER_WORKERS)
+    if VECTOR_BACKEND == "local" and workers > 1:
+        # Each process would keep (and flush) its own copy of the local index files
+        logger.warning("VECTOR_BACKEND=local keeps the index in-process; running a single worker")
+        workers = 1
+
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    logger.info(f"Starting Chat API server with {workers} workers (loop={loop}, http={http})")
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        loop=loop,
+        http=http,
+        # Finish in-flight requests (and hand back running upload jobs) before exiting
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT_SECONDS,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
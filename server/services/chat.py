@@ -1,92 +1,156 @@
-from storage.db import get_async_database
-from storage.redis import redis_client
-from models.embedding import get_embedding
-from models.llm import get_model
-from storage.pinecone import pinecone_chat_index , pinecone_doc_index
+from storage.redis import async_redis_client
+from models.embedding import get_embedding_async
+from models.llm import generate_content_async, stream_content_async
+from storage.pinecone import pinecone_chat_index , pinecone_doc_index, query_index_async, doc_namespace, chat_namespace
 from middlewares.evaluation import evaluator
-async def get_chat_response(user_id: str, session_id: str, data: str):
-    # try:
-    #     # db = get_async_database()
-    #     # db.collection("chat_history").document(user_id).collection("sessions").document(session_id).collection("messages").add({"role": "user", "content": data})
-    # except Exception as e:
-    #     print(f"Error adding message to database: {e}")
-    #     return "Error processing your request."
-    start_time = evaluator.start_timer()
-    # Initialize doc_context at the start
-    doc_context = ""
-    history_context = ""
+from middlewares.evaluation_worker import evaluation_worker
+from services.semantic_cache import semantic_cache, kb_version_key
+from utils.config import RETRIEVAL_TIMEOUTS
+from typing import AsyncIterator, Awaitable, Dict, Optional, Tuple
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Chat-history context when the session has no earlier turns; answers are only cached then
+NO_CHAT_HISTORY = "No chat history found."
 
+
+async def _timed_retrieval(source: str, coro: Awaitable[str], fallback: str) -> Tuple[str, float]:
+    """
+    Await one retrieval with its configured timeout. A slow or failing source
+    degrades to its fallback text instead of delaying or failing the answer.
+    """
+    start = time.time()
     try:
-        # Get embedding for user message
-        user_message_embedding = get_embedding(data)
-        print(f"Generated embedding with length: {len(user_message_embedding)}")
-
-        # Query document index with error handling and logging
-        try:
-            print("User ID:", user_id)
-            print("Session ID:", session_id)
-            print(f"Querying Pinecone document index for user_id: {user_id}")
-            retrieved_documents = pinecone_doc_index.query(
-                vector=user_message_embedding,
-                top_k=10,
-                include_metadata=True,
-                filter={
-                    "user_id": str(user_id)  # Ensure user_id is string
-                }
-            )
-            print(f"Pinecone document query response: {retrieved_documents}")
-            
-            if retrieved_documents and "matches" in retrieved_documents:
-                doc_chunks = []
-                for match in retrieved_documents["matches"]:
-                    if match.get("metadata") and match["metadata"].get("text"):
-                        doc_chunks.append(match["metadata"]["text"])
-                doc_context = " ".join(doc_chunks) if doc_chunks else "No relevant documents found."
-                print("Document context:", doc_context)
-            else:
-                doc_context = "No matching documents found."
-                
-        except Exception as e:
-            print(f"Error querying document index: {str(e)}")
-            doc_context = "Error retrieving document context."
-
-        # Query chat history index
-        try:
-            print(f"Querying Pinecone chat index for session_id: {session_id}")
-            chat_results = pinecone_chat_index.query(
-                vector=user_message_embedding,
-                top_k=5,
-                include_metadata=True,
-                filter={
-                    "session_id": str(session_id)  # Ensure session_id is string
-                }
-            )
-            print(f"Pinecone chat query response: {chat_results}")
-            
-            if chat_results and "matches" in chat_results:
-                history_chunks = []
-                for match in chat_results["matches"]:
-                    if match.get("metadata") and match["metadata"].get("text"):
-                        history_chunks.append(match["metadata"]["text"])
-                history_context = " ".join(history_chunks) if history_chunks else "No chat history found."
-            else:
-                history_context = "No relevant chat history found."
-                
-        except Exception as e:
-            print(f"Error querying chat index: {str(e)}")
-            history_context = "Error retrieving chat history."
-
-        # Get recent history from Redis
-        try:
-            recent_history = redis_client.lrange(f"chat_history:{user_id}:{session_id}", 0, 10)
-            recent_history = [message.decode('utf-8') for message in recent_history]
-            history_string = "\n".join(recent_history) if recent_history else "No recent history."
-        except Exception as e:
-            print(f"Error retrieving Redis history: {str(e)}")
-            history_string = "Error retrieving recent history."
-
-        # Construct prompt with all contexts
-        prompt = f"""
+        result = await asyncio.wait_for(coro, timeout=RETRIEVAL_TIMEOUTS[source])
+    except asyncio.TimeoutError:
+        logger.warning(f"Retrieval from {source} timed out after {RETRIEVAL_TIMEOUTS[source]}s")
+        result = fallback
+    except Exception as e:
+        logger.error(f"Error retrieving {source}: {str(e)}")
+        result = fallback
+    return result, time.time() - start
+
+
+async def _retrieve_documents(user_id: str, embedding) -> str:
+    """Query the user's document namespace for the most relevant chunks"""
+    logger.debug(f"Querying Pinecone document index for user_id: {user_id}")
+    retrieved_documents = await query_index_async(
+        pinecone_doc_index,
+        vector=embedding,
+        top_k=10,
+        include_metadata=True,
+        namespace=doc_namespace(user_id)
+    )
+
+    if retrieved_documents and "matches" in retrieved_documents:
+        doc_chunks = []
+        for match in retrieved_documents["matches"]:
+            if match.get("metadata") and match["metadata"].get("text"):
+                doc_chunks.append(match["metadata"]["text"])
+        return " ".join(doc_chunks) if doc_chunks else "No relevant documents found."
+    return "No matching documents found."
+
+
+async def _retrieve_chat_history(user_id: str, session_id: str, embedding) -> str:
+    """Query the session's chat namespace for semantically similar turns"""
+    logger.debug(f"Querying Pinecone chat index for session_id: {session_id}")
+    chat_results = await query_index_async(
+        pinecone_chat_index,
+        vector=embedding,
+        top_k=5,
+        include_metadata=True,
+        namespace=chat_namespace(user_id, session_id)
+    )
+
+    if chat_results and "matches" in chat_results:
+        history_chunks = []
+        for match in chat_results["matches"]:
+            if match.get("metadata") and match["metadata"].get("text"):
+                history_chunks.append(match["metadata"]["text"])
+        return " ".join(history_chunks) if history_chunks else NO_CHAT_HISTORY
+    return NO_CHAT_HISTORY
+
+
+async def _retrieve_recent_history(user_id: str, session_id: str) -> str:
+    """Get recent history from Redis"""
+    recent_history = await async_redis_client.lrange(f"chat_history:{user_id}:{session_id}", 0, 10)
+    recent_history = [message.decode('utf-8') for message in recent_history]
+    return "\n".join(recent_history) if recent_history else "No recent history."
+
+
+async def _get_kb_version(user_id: str) -> Optional[int]:
+    """Current knowledge-base version for a user, or None if it cannot be read"""
+    try:
+        version = await async_redis_client.get(kb_version_key(user_id))
+        return int(version) if version else 0
+    except Exception as e:
+        logger.error(f"Error reading knowledge base version: {str(e)}")
+        return None
+
+
+async def _session_has_history(user_id: str, session_id: str) -> bool:
+    """Whether the session already has turns; assumed so if it cannot be read"""
+    try:
+        return await async_redis_client.llen(f"chat_history:{user_id}:{session_id}") > 0
+    except Exception as e:
+        logger.error(f"Error reading chat history length: {str(e)}")
+        return True
+
+
+async def _embed_and_lookup(user_id: str, session_id: str,
+                            data: str) -> Tuple[list, Optional[int], Optional[str], Dict[str, float]]:
+    """
+    Embed the query and check the semantic answer cache. Only the first turn
+    of a session is cached: later answers depend on the conversation so far,
+    so they are neither looked up nor stored. Returns the knowledge-base
+    version to store the answer under, or None if it must not be cached.
+    """
+    start = time.time()
+    user_message_embedding, kb_version, has_history = await asyncio.gather(
+        get_embedding_async(data),
+        _get_kb_version(user_id),
+        _session_has_history(user_id, session_id),
+    )
+    timings = {"embedding_seconds": time.time() - start}
+    logger.debug(f"Generated embedding with length: {len(user_message_embedding)}")
+
+    if has_history:
+        kb_version = None
+    cached_answer = None
+    if kb_version is not None:
+        cached_answer = semantic_cache.lookup(user_id, kb_version, user_message_embedding)
+    return user_message_embedding, kb_version, cached_answer, timings
+
+
+async def build_prompt(user_id: str, session_id: str, data: str,
+                       user_message_embedding: list) -> Tuple[str, str, Dict[str, float]]:
+    """
+    Retrieve document context, semantic chat history and recent history
+    concurrently and assemble the generation prompt. Returns the prompt, the
+    chat-history context used for evaluation, and the per-source timings.
+    """
+    (doc_context, doc_seconds), (history_context, history_seconds), (history_string, recent_seconds) = \
+        await asyncio.gather(
+            _timed_retrieval("documents", _retrieve_documents(user_id, user_message_embedding),
+                             "Error retrieving document context."),
+            _timed_retrieval("chat_history", _retrieve_chat_history(user_id, session_id, user_message_embedding),
+                             "Error retrieving chat history."),
+            _timed_retrieval("recent_history", _retrieve_recent_history(user_id, session_id),
+                             "Error retrieving recent history."),
+        )
+    timings = {
+        "documents_seconds": doc_seconds,
+        "chat_history_seconds": history_seconds,
+        "recent_history_seconds": recent_seconds,
+    }
+    # Timings also reach the evaluation job via _submit_evaluation
+    logger.debug(f"Retrieval timings: {timings}")
+
+    # Construct prompt with all contexts
+    prompt = f"""
         # System Instructions
         You are a helpful, knowledgeable RAG-powered assistant that provides accurate and relevant information to users with a friendly and engaging tone.
         
@@ -118,30 +182,86 @@ async def get_chat_response(user_id: str, session_id: str, data: str):
         ## Response
         Assistant: """
 
+    return prompt, history_context, timings
+
+
+def _submit_evaluation(data: str, response_text: str, history_context: str, session_id: str,
+                       start_time: float, timings: Dict[str, float]) -> None:
+    """Hand evaluation to the background worker; the user only waits for retrieval + generation"""
+    latency = evaluator.record_latency(start_time)
+    evaluation_worker.submit({
+        "user_query": data,
+        "response": response_text,
+        "context": history_context,
+        "session_id": session_id,
+        "latency_seconds": latency,
+        "timestamp": time.time(),
+        "timings": timings,
+    })
+
+
+async def get_chat_response(user_id: str, session_id: str, data: str):
+    start_time = evaluator.start_timer()
+
+    try:
+        embedding, kb_version, cached_answer, timings = await _embed_and_lookup(user_id, session_id, data)
+        if cached_answer is not None:
+            _submit_evaluation(data, cached_answer, "", session_id, start_time, timings)
+            return cached_answer
+
+        prompt, history_context, retrieval_timings = await build_prompt(user_id, session_id, data, embedding)
+        timings.update(retrieval_timings)
+        timings["retrieval_seconds"] = time.time() - start_time
+
         # Generate response
-        response = await get_model().generate_content_async(prompt)
-        response_text = response.text
-
-        # Evaluate response
-        metrics = evaluator.evaluate_response(
-            user_query=data,
-            response=response_text,
-            context=history_context,
-            session_id=session_id,
-            start_time=start_time
-        )
-        
-        print("Response metrics:", metrics)
-        evaluator._store_time_metrics("latency_seconds", metrics["latency_seconds"])
+        generation_start = time.time()
+        response_text = await generate_content_async(prompt)
+        timings["generation_seconds"] = time.time() - generation_start
 
-        if metrics.get("query_response_relevance") is not None:
-            evaluator._store_time_metrics("query_relevance", metrics["query_response_relevance"])
-        
-        if metrics.get("context_relevance") is not None:
-            evaluator._store_time_metrics("context_relevance", metrics["context_relevance"])
+        if kb_version is not None and history_context == NO_CHAT_HISTORY:
+            # A hit skips everything after the embedding
+            semantic_cache.store(user_id, kb_version, embedding, response_text,
+                                 time.time() - start_time - timings["embedding_seconds"])
+        _submit_evaluation(data, response_text, history_context, session_id, start_time, timings)
 
         return response_text
 
     except Exception as e:
-        print(f"Error in get_chat_response: {str(e)}")
-        return "I apologize, but I encountered an error processing your request. Please try again."
\ No newline at end of file
+        logger.error(f"Error in get_chat_response: {str(e)}")
+        return "I apologize, but I encountered an error processing your request. Please try again."
+
+
+async def stream_chat_response(user_id: str, session_id: str, data: str) -> AsyncIterator[str]:
+    """
+    Like get_chat_response, but yields the answer in pieces as Gemini produces
+    them. Time to first token is recorded next to total latency, and the
+    assembled text is evaluated once the stream completes. Errors propagate
+    to the caller so it can report them to the client.
+    """
+    start_time = evaluator.start_timer()
+
+    embedding, kb_version, cached_answer, timings = await _embed_and_lookup(user_id, session_id, data)
+    if cached_answer is not None:
+        timings["time_to_first_token_seconds"] = evaluator.record_first_token(start_time)
+        yield cached_answer
+        _submit_evaluation(data, cached_answer, "", session_id, start_time, timings)
+        return
+
+    prompt, history_context, retrieval_timings = await build_prompt(user_id, session_id, data, embedding)
+    timings.update(retrieval_timings)
+    timings["retrieval_seconds"] = time.time() - start_time
+
+    generation_start = time.time()
+    parts = []
+    async for text in stream_content_async(prompt):
+        if not parts:
+            timings["time_to_first_token_seconds"] = evaluator.record_first_token(start_time)
+        parts.append(text)
+        yield text
+
+    timings["generation_seconds"] = time.time() - generation_start
+    response_text = "".join(parts)
+    if kb_version is not None and response_text and history_context == NO_CHAT_HISTORY:
+        semantic_cache.store(user_id, kb_version, embedding, response_text,
+                             time.time() - start_time - timings["embedding_seconds"])
+    _submit_evaluation(data, response_text, history_context, session_id, start_time, timings)
@@ -0,0 +1,313 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import logging
+import re
+import zlib
+from storage.redis import redis_client
+from utils.config import (
+    CHUNK_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_DEDUPE_THRESHOLD,
+    CHUNK_MIN_TOKENS,
+    CHUNK_MAX_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    "chunk_tokens": CHUNK_TOKENS,
+    "overlap_tokens": CHUNK_OVERLAP_TOKENS,
+    "dedupe_threshold": CHUNK_DEDUPE_THRESHOLD,
+}
+
+# Word and punctuation pieces; close to the sub-word token count for English text
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[\"'(\[A-Z0-9])")
+_NUMBERED_HEADING_RE = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+\S")
+_TABLE_ROW_RE = re.compile(r"\S(\t| {2,}|\s\|\s)\S")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count: one per word or punctuation mark, plus one per 8 extra characters of long words."""
+    return sum(1 + len(piece) // 8 for piece in _TOKEN_RE.findall(text))
+
+
+def settings_key(user_id: str) -> str:
+    return f"chunking_settings:{user_id}"
+
+
+def validate_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in defaults and check ranges; raises ValueError on bad settings."""
+    merged = {**DEFAULT_SETTINGS, **{k: v for k, v in settings.items() if v is not None}}
+    chunk_tokens = int(merged["chunk_tokens"])
+    overlap_tokens = int(merged["overlap_tokens"])
+    dedupe_threshold = float(merged["dedupe_threshold"])
+
+    if not CHUNK_MIN_TOKENS <= chunk_tokens <= CHUNK_MAX_TOKENS:
+        raise ValueError(f"chunk_tokens must be between {CHUNK_MIN_TOKENS} and {CHUNK_MAX_TOKENS}")
+    if not 0 <= overlap_tokens <= chunk_tokens // 2:
+        raise ValueError("overlap_tokens must be between 0 and half of chunk_tokens")
+    if not 0.0 <= dedupe_threshold <= 1.0:
+        raise ValueError("dedupe_threshold must be between 0 (off) and 1")
+
+    return {"chunk_tokens": chunk_tokens, "overlap_tokens": overlap_tokens, "dedupe_threshold": dedupe_threshold}
+
+
+def get_chunking_settings(user_id: str) -> Dict[str, Any]:
+    """The tenant's chunking settings, falling back to the defaults."""
+    try:
+        raw = redis_client.hgetall(settings_key(user_id))
+        if raw:
+            return validate_settings({k.decode(): v.decode() for k, v in raw.items()})
+    except Exception as e:
+        logger.error(f"Error loading chunking settings for {user_id}: {e}")
+    return dict(DEFAULT_SETTINGS)
+
+
+def save_chunking_settings(user_id: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate and store the tenant's chunking settings; they apply to the next upload."""
+    validated = validate_settings({**get_chunking_settings(user_id), **settings})
+    redis_client.hset(settings_key(user_id), mapping=validated)
+    return validated
+
+
+def _is_heading(line: str, next_line: Optional[str]) -> bool:
+    if line.startswith("#"):
+        return True
+    words = line.split()
+    if not words or len(words) > 12 or len(line) > 90 or line[-1] in ".,;:!?":
+        return False
+    if _NUMBERED_HEADING_RE.match(line):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    if letters and all(c.isupper() for c in letters) and len(letters) > 2:
+        return True
+    # Short title-case line followed by body text
+    capitalized = sum(1 for w in words if w[0].isupper() or not w[0].isalpha())
+    return next_line is not None and len(words) >= 2 and capitalized == len(words) and len(next_line.split()) > len(words)
+
+
+def text_blocks(text: str) -> List[Dict[str, Any]]:
+    """
+    Recover headings, paragraphs and tables from plain extracted text:
+    blank lines end paragraphs, short heading-like lines become headings, and
+    runs of lines with column gaps (tabs, wide spacing or " | ") become tables.
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    blocks: List[Dict[str, Any]] = []
+    paragraph: List[str] = []
+    table: List[List[str]] = []
+
+    def end_paragraph():
+        if paragraph:
+            blocks.append({"type": "paragraph", "text": " ".join(paragraph)})
+            paragraph.clear()
+
+    def end_table():
+        if len(table) >= 2:
+            blocks.append({"type": "table", "rows": [list(row) for row in table]})
+        elif table:
+            paragraph.append(" ".join(table[0]))
+        table.clear()
+
+    for i, line in enumerate(lines):
+        if not line:
+            end_table()
+            end_paragraph()
+            continue
+        next_line = next((l for l in lines[i + 1:] if l), None)
+        if _TABLE_ROW_RE.search(line):
+            end_paragraph()
+            table.append([cell.strip() for cell in re.split(r"\t| {2,}|\s\|\s", line) if cell.strip()])
+            continue
+        end_table()
+        if _is_heading(line, next_line):
+            end_paragraph()
+            blocks.append({"type": "heading", "text": line.lstrip("#").strip()})
+        else:
+            paragraph.append(line)
+
+    end_table()
+    end_paragraph()
+    return blocks
+
+
+def _units(blocks: List[Dict[str, Any]], chunk_tokens: int) -> Iterator[Dict[str, Any]]:
+    """
+    Break blocks into the pieces chunks are packed from: headings, table rows
+    and sentences. `sep` is how a unit joins the unit before it; pieces
+    longer than a whole chunk are split on word boundaries.
+    """
+    for block in blocks:
+        if block["type"] == "heading":
+            yield {"kind": "heading", "text": block["text"], "tokens": estimate_tokens(block["text"]), "sep": "\n\n"}
+        elif block["type"] == "table":
+            rows = [" | ".join(row) for row in block.get("rows", []) if any(row)]
+            header = rows[0] if rows else None
+            for i, row in enumerate(rows):
+                for piece in _split_long(row, chunk_tokens):
+                    yield {"kind": "row", "text": piece, "tokens": estimate_tokens(piece),
+                           "sep": "\n\n" if i == 0 else "\n", "header": header}
+        else:
+            sentences = _SENTENCE_RE.split(block["text"])
+            for i, sentence in enumerate(s for s in sentences if s.strip()):
+                for j, piece in enumerate(_split_long(sentence.strip(), chunk_tokens)):
+                    yield {"kind": "text", "text": piece, "tokens": estimate_tokens(piece),
+                           "sep": "\n\n" if i == 0 and j == 0 else " "}
+
+
+def _split_long(text: str, chunk_tokens: int) -> List[str]:
+    if estimate_tokens(text) <= chunk_tokens:
+        return [text]
+    pieces, current, tokens = [], [], 0
+    for word in text.split():
+        word_tokens = estimate_tokens(word)
+        if current and tokens + word_tokens > chunk_tokens:
+            pieces.append(" ".join(current))
+            current, tokens = [], 0
+        current.append(word)
+        tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+class NearDuplicateFilter:
+    """
+    Drops chunks that are (near) copies of one already kept, such as
+    repeated headers, footers and boilerplate paragraphs.
+
+    Chunks are compared by the Jaccard similarity of their word 3-gram
+    shingles. A bottom-k sketch of each kept chunk's shingle hashes is
+    indexed, so only chunks sharing a sketch value are compared in full.
+    """
+
+    SKETCH_SIZE = 8
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._exact = set()
+        self._shingles: List[set] = []
+        self._index: Dict[int, List[int]] = {}
+        self.dropped = 0
+
+    def is_duplicate(self, text: str) -> bool:
+        """True if `text` duplicates a kept chunk; otherwise it is kept and False is returned."""
+        words = re.findall(r"\w+", text.lower())
+        normalized = " ".join(words)
+        if normalized in self._exact:
+            self.dropped += 1
+            return True
+
+        shingles = {zlib.crc32(" ".join(words[i:i + 3]).encode("utf-8")) for i in range(max(len(words) - 2, 1))}
+        sketch = sorted(shingles)[:self.SKETCH_SIZE]
+        if self.threshold < 1.0:
+            candidates = {idx for h in sketch for idx in self._index.get(h, ())}
+            for idx in candidates:
+                other = self._shingles[idx]
+                if len(shingles & other) / len(shingles | other) >= self.threshold:
+                    self.dropped += 1
+                    return True
+
+        self._exact.add(normalized)
+        self._shingles.append(shingles)
+        for h in sketch:
+            self._index.setdefault(h, []).append(len(self._shingles) - 1)
+        return False
+
+
+def chunk_pages(pages: Iterable[Dict[str, Any]], settings: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Turn parsed pages into chunks of about `chunk_tokens` tokens.
+
+    Chunks are packed from whole sentences and table rows and always start
+    at a heading, so sections are not mixed; a chunk that continues a
+    section is prefixed with the section heading (and a continued table
+    with its header row). Consecutive chunks of the same section share up
+    to `overlap_tokens` of trailing sentences. Pages are boundaries too,
+    except that a short tail is carried into the next page instead of
+    becoming a tiny chunk. Chunks are yielded as soon as they are complete,
+    so pages can be streamed in while OCR is still running.
+    """
+    settings = validate_settings(settings or {})
+    chunk_tokens = settings["chunk_tokens"]
+    overlap_tokens = settings["overlap_tokens"]
+    dedupe = NearDuplicateFilter(settings["dedupe_threshold"]) if settings["dedupe_threshold"] > 0 else None
+
+    current: List[Dict[str, Any]] = []
+    current_tokens = 0
+    heading: Optional[Dict[str, Any]] = None
+
+    def render(units: List[Dict[str, Any]]) -> str:
+        return "".join(unit["sep"] + unit["text"] for unit in units).strip()
+
+    def emit(units: List[Dict[str, Any]]) -> Iterator[str]:
+        if not units or all(unit["kind"] == "heading" for unit in units):
+            return
+        text = render(units)
+        if dedupe is None or not dedupe.is_duplicate(text):
+            yield text
+
+    def start_continuation(previous: List[Dict[str, Any]], next_unit: Dict[str, Any]) -> tuple:
+        """
+        Context carried into the chunk that continues `previous`, and the unit
+        adjusted to follow it. The section heading and table header are always
+        kept; trailing sentences of `previous` fill what room is left.
+        """
+        prefix: List[Dict[str, Any]] = []
+        if heading is not None:
+            prefix.append(heading)
+        header = next_unit.get("header")
+        continues_table = next_unit["kind"] == "row" and header and next_unit["text"] != header
+        if continues_table:
+            prefix.append({"kind": "row", "text": header, "tokens": estimate_tokens(header), "sep": "\n\n"})
+            next_unit = {**next_unit, "sep": "\n"}
+
+        # Walking back from the end keeps the sentences closest to the new unit
+        room = min(overlap_tokens, chunk_tokens - sum(u["tokens"] for u in prefix) - next_unit["tokens"])
+        carried: List[Dict[str, Any]] = []
+        tokens = 0
+        for unit in reversed(previous):
+            if unit["kind"] != "text" or tokens + unit["tokens"] > room:
+                break
+            carried.insert(0, unit)
+            tokens += unit["tokens"]
+
+        if prefix and carried:
+            carried[0] = {**carried[0], "sep": "\n\n"}
+        elif prefix and not continues_table:
+            next_unit = {**next_unit, "sep": "\n\n"}
+        return prefix + carried, next_unit
+
+    for page in pages:
+        blocks = page.get("blocks") or text_blocks(page.get("text") or "")
+        for unit in _units(blocks, chunk_tokens):
+            if unit["kind"] == "heading":
+                yield from emit(current)
+                heading = unit
+                current, current_tokens = [unit], unit["tokens"]
+                continue
+
+            if current and current_tokens + unit["tokens"] > chunk_tokens:
+                previous = current
+                yield from emit(previous)
+                current, unit = start_continuation(previous, unit)
+                current_tokens = sum(u["tokens"] for u in current)
+
+            current.append(unit)
+            current_tokens += unit["tokens"]
+
+        # Page boundary: finish the chunk unless it is only a short tail
+        if current_tokens >= chunk_tokens // 4:
+            yield from emit(current)
+            # The section continues on the next page under the same heading
+            current = [heading] if heading is not None else []
+            current_tokens = sum(u["tokens"] for u in current)
+
+    yield from emit(current)
+    if dedupe is not None and dedupe.dropped:
+        logger.info(f"Dropped {dedupe.dropped} near-duplicate chunks")
+
+
+def chunk_text(text: str, settings: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Chunk a single block of plain text."""
+    return list(chunk_pages([{"page": 1, "text": text}], settings))
@@ -0,0 +1,189 @@
+from typing import Any, Dict, Tuple
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from fastapi import WebSocket
+from storage.redis import async_redis_client
+from utils.config import WS_SESSION_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Close codes sent to clients; both tell the client to reconnect
+CLOSE_REPLACED = 4000          # the same session connected again (possibly on another worker)
+CLOSE_SERVICE_RESTART = 1012   # this worker is shutting down
+
+
+def session_route_key(user_id: str, session_id: str) -> str:
+    return f"ws_session:{user_id}:{session_id}"
+
+
+def worker_channel(worker_id: str) -> str:
+    return f"ws_worker:{worker_id}"
+
+
+class ConnectionRegistry:
+    """
+    WebSocket sessions across server worker processes.
+
+    Each worker keeps its own sockets in memory and records which worker
+    owns each session in Redis (`ws_session:{user_id}:{session_id}`, kept
+    alive with a TTL refreshed by the owner). Every worker subscribes to its
+    own pub/sub channel; `send` delivers straight to a local socket, or looks
+    up the owning worker and publishes the message on that worker's channel.
+    """
+
+    def __init__(self, ttl_seconds: int = WS_SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._connections: Dict[Tuple[str, str], WebSocket] = {}
+        self._tasks = []
+        self.messages_sent_local = 0
+        self.messages_relayed = 0
+        self.messages_received = 0
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._listen()), asyncio.create_task(self._refresh_loop())]
+        logger.info(f"Connection registry started for worker {self.worker_id}")
+
+    async def stop(self) -> None:
+        """Graceful drain: stop relaying, release routes and ask clients to reconnect elsewhere."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for (user_id, session_id), websocket in list(self._connections.items()):
+            await self.unregister(user_id, session_id, websocket)
+            try:
+                await websocket.close(code=CLOSE_SERVICE_RESTART)
+            except Exception:
+                pass
+
+    async def register(self, user_id: str, session_id: str, websocket: WebSocket) -> None:
+        """Take ownership of a session; an older connection for it is closed wherever it lives."""
+        key = (user_id, session_id)
+        previous = self._connections.get(key)
+        self._connections[key] = websocket
+        if previous is not None and previous is not websocket:
+            await self._close_local(previous)
+        try:
+            owner = await async_redis_client.set(session_route_key(user_id, session_id), self.worker_id,
+                                                 ex=self.ttl_seconds, get=True)
+            if owner is not None and owner.decode() != self.worker_id:
+                await self._publish(owner.decode(), {"kind": "close", "user_id": user_id,
+                                                     "session_id": session_id})
+        except Exception as e:
+            # Local delivery still works; only cross-worker routing to this session is lost
+            logger.error(f"Error registering session route: {e}")
+
+    async def unregister(self, user_id: str, session_id: str, websocket: WebSocket) -> None:
+        key = (user_id, session_id)
+        if self._connections.get(key) is not websocket:
+            return  # already replaced by a newer connection
+        del self._connections[key]
+        try:
+            route = session_route_key(user_id, session_id)
+            if await async_redis_client.get(route) == self.worker_id.encode():
+                await async_redis_client.delete(route)
+        except Exception as e:
+            logger.error(f"Error removing session route: {e}")
+
+    async def send(self, user_id: str, session_id: str, message: Any) -> bool:
+        """
+        Deliver a text or JSON message to a session on any worker.
+        Returns False if the session is not connected anywhere.
+        """
+        websocket = self._connections.get((user_id, session_id))
+        if websocket is not None:
+            await self._send_local(websocket, message)
+            self.messages_sent_local += 1
+            return True
+        owner = await async_redis_client.get(session_route_key(user_id, session_id))
+        if owner is None:
+            return False
+        receivers = await self._publish(owner.decode(), {"kind": "send", "user_id": user_id,
+                                                         "session_id": session_id, "message": message})
+        self.messages_relayed += 1
+        return receivers > 0
+
+    async def _publish(self, worker_id: str, payload: Dict[str, Any]) -> int:
+        return await async_redis_client.publish(worker_channel(worker_id), json.dumps(payload))
+
+    async def _send_local(self, websocket: WebSocket, message: Any) -> None:
+        if isinstance(message, str):
+            await websocket.send_text(message)
+        else:
+            await websocket.send_json(message)
+
+    async def _close_local(self, websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=CLOSE_REPLACED)
+        except Exception:
+            pass
+
+    async def _listen(self) -> None:
+        """Deliver messages other workers published for sessions connected here."""
+        while True:
+            pubsub = async_redis_client.pubsub()
+            try:
+                await pubsub.subscribe(worker_channel(self.worker_id))
+                async for raw in pubsub.listen():
+                    if raw.get("type") != "message":
+                        continue
+                    await self._handle(json.loads(raw["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Connection registry subscription failed, resubscribing: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    async def _handle(self, payload: Dict[str, Any]) -> None:
+        key = (payload.get("user_id"), payload.get("session_id"))
+        websocket = self._connections.get(key)
+        if websocket is None:
+            return
+        self.messages_received += 1
+        try:
+            if payload.get("kind") == "close":
+                # The session was taken over by a connection on another worker
+                del self._connections[key]
+                await self._close_local(websocket)
+            else:
+                await self._send_local(websocket, payload.get("message"))
+        except Exception as e:
+            logger.error(f"Error delivering relayed message: {e}")
+
+    async def _refresh_loop(self) -> None:
+        """Keep this worker's session routes from expiring while their sockets are open."""
+        while True:
+            await asyncio.sleep(self.ttl_seconds / 3)
+            if not self._connections:
+                continue
+            try:
+                pipe = async_redis_client.pipeline(transaction=False)
+                for user_id, session_id in list(self._connections):
+                    pipe.set(session_route_key(user_id, session_id), self.worker_id, ex=self.ttl_seconds)
+                await pipe.execute()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error refreshing session routes: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "local_connections": len(self._connections),
+            "messages_sent_local": self.messages_sent_local,
+            "messages_relayed": self.messages_relayed,
+            "messages_received": self.messages_received,
+        }
+
+
+# Global connection registry for this worker process
+connection_registry = ConnectionRegistry()
@@ -1,61 +1,366 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from models.embedding import get_embedding
-from storage.pinecone import pinecone_doc_index
+from models.embedding import get_embeddings
+from storage.pinecone import (
+    pinecone_doc_index,
+    pinecone_chat_index,
+    doc_namespace,
+    chat_namespace,
+    namespace_vector_count,
+    delete_namespace,
+)
+from storage.redis import redis_client
+from storage.gcs import get_bucket
+from services.semantic_cache import semantic_cache, kb_version_key
+from services.chunking import chunk_text, get_chunking_settings
+from utils.config import EMBED_BATCH_SIZE, EMBED_MAX_CONCURRENCY, UPSERT_BATCH_SIZE, UPSERT_MAX_RETRIES, DELETE_BATCH_SIZE
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+import hashlib
+import logging
+import time
 import os
 
-def update_knowledge_base(user_id: str, file_content: str) -> dict:
+logger = logging.getLogger(__name__)
+
+
+def document_id(user_id: str, name: str) -> str:
+    """Stable id for one of a user's documents (e.g. by filename), the same in every process."""
+    return hashlib.sha256(f"{user_id}\x00{name}".encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_id(doc_id: str, chunk: str) -> str:
+    """Content-addressed vector id: re-indexing the same chunk overwrites its vector."""
+    return f"{doc_id}-{hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:32]}"
+
+
+def doc_chunks_key(user_id: str, doc_id: str) -> str:
+    """Redis set of the vector ids currently indexed for a document."""
+    return f"doc_chunks:{user_id}:{doc_id}"
+
+
+def chat_sessions_key(user_id: str) -> str:
+    """Set of the user's chat session ids, i.e. their chat namespaces."""
+    return f"chat_sessions:{user_id}"
+
+
+
+def _stream_batches(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group a (possibly lazy) stream of items into batches of at most `size` items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _embed_batch(batch: List[tuple]) -> tuple:
+    """Embed one batch of (vector id, chunk) pairs and return them with the elapsed time."""
+    start = time.perf_counter()
+    embeddings = get_embeddings([chunk for _, chunk in batch])
+    return batch, embeddings, time.perf_counter() - start
+
+
+def _upsert_with_retry(vectors: List[Dict[str, Any]], namespace: str) -> int:
+    """
+    Upsert a batch of vectors, retrying the batch when Pinecone fails or
+    reports fewer upserted vectors than were sent. Upserts are idempotent,
+    so resending the whole batch is safe.
+    """
+    last_error = None
+    for attempt in range(1, UPSERT_MAX_RETRIES + 1):
+        try:
+            response = pinecone_doc_index.upsert(vectors=vectors, namespace=namespace)
+            upserted = getattr(response, "upserted_count", None)
+            if upserted is None:
+                upserted = len(vectors)
+            if upserted >= len(vectors):
+                return upserted
+            last_error = f"partial upsert: {upserted}/{len(vectors)} vectors"
+        except Exception as e:
+            last_error = str(e)
+
+        logger.warning(f"Upsert attempt {attempt}/{UPSERT_MAX_RETRIES} failed: {last_error}")
+        if attempt < UPSERT_MAX_RETRIES:
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+    raise RuntimeError(f"Upsert failed after {UPSERT_MAX_RETRIES} attempts: {last_error}")
+
+
+def _delete_vectors(ids: List[str], namespace: str) -> int:
+    """Delete vectors by id in batches, retrying like upserts (deletes are idempotent)."""
+    deleted = 0
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        batch = ids[i:i + DELETE_BATCH_SIZE]
+        for attempt in range(1, UPSERT_MAX_RETRIES + 1):
+            try:
+                pinecone_doc_index.delete(ids=batch, namespace=namespace)
+                break
+            except Exception as e:
+                logger.warning(f"Delete attempt {attempt}/{UPSERT_MAX_RETRIES} failed: {e}")
+                if attempt == UPSERT_MAX_RETRIES:
+                    raise
+                time.sleep(0.5 * 2 ** (attempt - 1))
+        deleted += len(batch)
+    return deleted
+
+
+def _add_doc_chunks(user_id: str, doc_id: str, ids: List[str]) -> None:
+    """Record vector ids as indexed for a document, right after they are upserted."""
+    key = doc_chunks_key(user_id, doc_id)
+    pipe = redis_client.pipeline(transaction=False)
+    for i in range(0, len(ids), 1000):
+        pipe.sadd(key, *ids[i:i + 1000])
+    pipe.execute()
+
+
+def _remove_doc_chunks(user_id: str, doc_id: str, ids: List[str]) -> None:
+    """Forget vector ids that were deleted from a document."""
+    key = doc_chunks_key(user_id, doc_id)
+    pipe = redis_client.pipeline(transaction=False)
+    for i in range(0, len(ids), 1000):
+        pipe.srem(key, *ids[i:i + 1000])
+    pipe.execute()
+
+
+def invalidate_answers(user_id: str) -> None:
+    """Bump the user's knowledge-base version so every worker stops serving cached answers."""
+    try:
+        redis_client.incr(kb_version_key(user_id))
+    except Exception as e:
+        logger.error(f"Error bumping knowledge base version: {e}")
+    semantic_cache.invalidate(user_id)
+
+
+def split_text(file_content: str, settings: Optional[Dict[str, Any]] = None) -> List[str]:
+    """Split document text into chunks for embedding (see services.chunking)."""
+    return chunk_text(file_content, settings)
+
+
+def index_chunks(user_id: str, chunks: Iterable[str], doc_id: str,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 incremental: bool = True) -> dict:
+    """
+    Embed a document's chunks and upsert them into Pinecone.
+
+    `chunks` may be a list or a lazy stream (e.g. chunks produced while a
+    document is still being OCR'd); batches are embedded as soon as they
+    fill up, with a bounded number of batches in flight, and the resulting
+    vectors are upserted in bulk as soon as a full upsert batch is available.
+
+    Vectors go to the user's namespace. Vector ids are content hashes scoped
+    to `doc_id` (see `document_id`), and the ids indexed for each document
+    are recorded in Redis after every upserted batch, so an interrupted run
+    resumes where it stopped. In incremental mode chunks that are already
+    indexed for the document are skipped; in either mode vectors for chunks
+    that are no longer in the document are deleted.
+    `progress_callback(done, total)` is called after every embedding batch,
+    with `total` being the chunks seen so far (skipped chunks count as done).
+    Raises on failure.
+    """
+    total_start = time.perf_counter()
+    if not doc_id:
+        raise ValueError("doc_id is required: chunk records and stale-vector deletes are per document")
+    namespace = doc_namespace(user_id)
+
+    existing_ids = {raw.decode() for raw in redis_client.smembers(doc_chunks_key(user_id, doc_id))}
+    current_ids: Dict[str, None] = {}
+
+    embed_seconds = 0.0
+    upsert_seconds = 0.0
+    vectors_upserted = 0
+    embedded = 0
+    skipped = 0
+    pending_vectors: List[Dict[str, Any]] = []
+
+    def flush(vectors: List[Dict[str, Any]]) -> None:
+        nonlocal upsert_seconds, vectors_upserted
+        start = time.perf_counter()
+        vectors_upserted += _upsert_with_retry(vectors, namespace)
+        # Recorded per batch, so a run interrupted part way resumes after the last upsert
+        _add_doc_chunks(user_id, doc_id, [vector["id"] for vector in vectors])
+        upsert_seconds += time.perf_counter() - start
+
+    def collect(future) -> None:
+        nonlocal embed_seconds, embedded, pending_vectors
+        batch, embeddings, elapsed = future.result()
+        embed_seconds += elapsed
+
+        for (vector_id, chunk), embedding in zip(batch, embeddings):
+            pending_vectors.append({
+                "id": vector_id,
+                "values": embedding,
+                "metadata": {"text": chunk, "user_id": str(user_id), "doc_id": doc_id}
+            })
+
+        while len(pending_vectors) >= UPSERT_BATCH_SIZE:
+            flush(pending_vectors[:UPSERT_BATCH_SIZE])
+            pending_vectors = pending_vectors[UPSERT_BATCH_SIZE:]
+
+        embedded += len(batch)
+        if progress_callback:
+            progress_callback(embedded + skipped, len(current_ids))
+
+    def changed_chunks() -> Iterator[tuple]:
+        nonlocal skipped
+        for chunk in chunks:
+            # Skip empty chunks and repeats of a chunk already seen in this document
+            if not chunk.strip():
+                continue
+            vector_id = chunk_id(doc_id, chunk)
+            if vector_id in current_ids:
+                continue
+            current_ids[vector_id] = None
+            if incremental and vector_id in existing_ids:
+                skipped += 1
+                continue
+            yield vector_id, chunk
+
+    # Embed batches concurrently as they fill up and upsert as results come in
+    with ThreadPoolExecutor(max_workers=EMBED_MAX_CONCURRENCY) as executor:
+        in_flight = set()
+        for batch in _stream_batches(changed_chunks(), EMBED_BATCH_SIZE):
+            in_flight.add(executor.submit(_embed_batch, batch))
+            # Handle finished batches without waiting, unless the pool is saturated
+            timeout = None if len(in_flight) >= EMBED_MAX_CONCURRENCY else 0
+            done, in_flight = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(future)
+        for future in as_completed(in_flight):
+            collect(future)
+
+    if pending_vectors:
+        flush(pending_vectors)
+
+    # Chunks that disappeared from the document
+    delete_start = time.perf_counter()
+    removed_ids = [vector_id for vector_id in existing_ids if vector_id not in current_ids]
+    vectors_deleted = 0
+    if removed_ids:
+        vectors_deleted = _delete_vectors(removed_ids, namespace)
+        _remove_doc_chunks(user_id, doc_id, removed_ids)
+    delete_seconds = time.perf_counter() - delete_start
+
+    if progress_callback:
+        progress_callback(embedded + skipped, len(current_ids))
+
+    if vectors_upserted or vectors_deleted or set(current_ids) != existing_ids:
+        # The user's documents changed (possibly in an interrupted earlier run):
+        # cached answers for the old version are stale
+        invalidate_answers(user_id)
+
+    total_seconds = time.perf_counter() - total_start
+
+    return {
+        "doc_id": doc_id,
+        "chunks_total": len(current_ids),
+        "chunks_embedded": embedded,
+        "chunks_unchanged": skipped,
+        "vectors_upserted": vectors_upserted,
+        "vectors_deleted": vectors_deleted,
+        "timings": {
+            "embed_seconds": embed_seconds,
+            "upsert_seconds": upsert_seconds,
+            "delete_seconds": delete_seconds,
+            "total_seconds": total_seconds,
+        },
+        "chunks_per_second": embedded / total_seconds if total_seconds > 0 else 0.0,
+    }
+
+
+def knowledge_stats(user_id: str) -> dict:
+    """
+    Vector counts for one tenant: one describe call for the document
+    namespace and one per chat session, never a listing of all namespaces.
+    """
+    documents = namespace_vector_count(pinecone_doc_index, doc_namespace(user_id))
+    sessions = [session_id.decode() for session_id in redis_client.smembers(chat_sessions_key(user_id))]
+    chat_vectors = sum(namespace_vector_count(pinecone_chat_index, chat_namespace(user_id, session_id))
+                       for session_id in sessions)
+    return {
+        "document_vectors": documents,
+        "chat_vectors": chat_vectors,
+        "chat_sessions": len(sessions),
+    }
+
+
+def delete_user_knowledge(user_id: str, include_chat: bool = False, include_files: bool = False) -> dict:
+    """
+    Delete all of a tenant's document vectors (by dropping the namespace)
+    and per-document chunk records. With `include_chat`, their chat turn
+    vectors too; with `include_files`, the uploaded files in GCS as well.
+    Parse cache entries are shared by content hash across tenants and are
+    left to expire.
+    """
+    stats = knowledge_stats(user_id)
+    delete_namespace(pinecone_doc_index, doc_namespace(user_id))
+    for key in redis_client.scan_iter(match=f"{doc_chunks_key(user_id, '')}*", count=500):
+        redis_client.delete(key)
+
+    files_deleted = 0
+    if include_files:
+        for blob in get_bucket().list_blobs(prefix=f"{user_id}/"):
+            blob.delete()
+            files_deleted += 1
+
+    if include_chat:
+        for session_id in redis_client.smembers(chat_sessions_key(user_id)):
+            delete_namespace(pinecone_chat_index, chat_namespace(user_id, session_id.decode()))
+        redis_client.delete(chat_sessions_key(user_id))
+    invalidate_answers(user_id)
+    return {
+        "document_vectors_deleted": stats["document_vectors"],
+        "chat_vectors_deleted": stats["chat_vectors"] if include_chat else 0,
+        "files_deleted": files_deleted,
+    }
+
+
+def update_knowledge_base(user_id: str, file_content: str, name: Optional[str] = None,
+                          incremental: bool = True, settings: Optional[Dict[str, Any]] = None) -> dict:
     """
     Updates the knowledge base by splitting documents, creating embeddings, and storing in Pinecone.
     
     Args:
         user_id: The ID of the user uploading the document
         file_content: The content of the file to be processed
+        name: Document name (e.g. filename); re-indexing the same name replaces that document.
+              Defaults to a hash of the content.
+        incremental: Only embed chunks that are not already indexed for the document
+        settings: Chunking settings; defaults to the user's settings
     
     Returns:
-        dict: Status of the operation
+        dict: Status of the operation, per-stage timings and throughput
     """
     try:
         # Validate user_id
         if not user_id:
             raise ValueError("user_id cannot be null or empty")
 
-        # Initialize text splitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=100,
-            chunk_overlap=20,
-            length_function=len,
-        )
-        
+        total_start = time.perf_counter()
+
         # Split the document into chunks
-        chunks = text_splitter.split_text(file_content)
-        
-        # Process chunks and store in Pinecone
-        for i, chunk in enumerate(chunks):
-            # Skip empty chunks
-            if not chunk.strip():
-                continue
-                
-            embedding = get_embedding(chunk)
-            
-            # Create a unique ID for the vector
-            vector_id = f"{user_id}-{i}"
-            
-            # Create metadata with validation
-            metadata = {
-                "text": chunk if chunk else "",  # Ensure text is never null
-                "user_id": str(user_id)  # Convert user_id to string to ensure it's never null
-            }
-            
-            # Store in Pinecone
-            pinecone_doc_index.upsert(
-                    vectors=[{
-                        "id": str(hash(vector_id)),
-                        "values": embedding,
-                        "metadata": {"text": metadata["text"], "user_id": metadata["user_id"], "user_id": user_id}
-                    }]
-                )
-        
-        return {"status": "success", "chunks_processed": len(chunks)}
+        chunks = split_text(file_content, settings or get_chunking_settings(user_id))
+        split_seconds = time.perf_counter() - total_start
+
+        if name is None:
+            name = hashlib.sha256(file_content.encode("utf-8")).hexdigest()
+        result = index_chunks(user_id, chunks, doc_id=document_id(user_id, name), incremental=incremental)
+        total_seconds = time.perf_counter() - total_start
+
+        return {
+            "status": "success",
+            "chunks_processed": len(chunks),
+            "chunks_unchanged": result["chunks_unchanged"],
+            "vectors_upserted": result["vectors_upserted"],
+            "vectors_deleted": result["vectors_deleted"],
+            "timings": {
+                "split_seconds": split_seconds,
+                **result["timings"],
+                "total_seconds": total_seconds,
+            },
+            "chunks_per_second": result["chunks_embedded"] / total_seconds if total_seconds > 0 else 0.0,
+        }
         
     except Exception as e:
-        return {"status": "error", "message": str(e)}
\ No newline at end of file
+        return {"status": "error", "message": str(e)}
@@ -1,8 +1,10 @@
 from fastapi import HTTPException
 from storage.db import get_async_database
-from storage.redis import redis_client
+from storage.redis import async_redis_client
+from middlewares.token_cache import publish_token_revoked
 from schema.user import UserLogin
-from passlib.context import CryptContext
+from services.passwords import verify_password
+from services.user_index import get_indexed_user, cache_user
 from datetime import datetime, timedelta
 import os
 import secrets
@@ -10,10 +12,6 @@ import jwt
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 1440
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-async def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
 async def create_access_token(data: dict):
     to_encode = data.copy()
     # Use datetime objects for expiration
@@ -30,28 +28,43 @@ async def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, secret_key, algorithm="HS256")
     
     # Store in Redis with the same expiration
-    redis_client.set(
+    await async_redis_client.set(
         f"token:{data['user_id']}", 
         encoded_jwt, 
         ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60
     )
+    # The previous token is no longer valid; drop it from every worker's token cache
+    await publish_token_revoked(data['user_id'])
     
     return encoded_jwt
 
-async def login_user(user_data: UserLogin):
+async def _find_users_by_email(email: str):
     db = get_async_database()
     users_ref = db.collection("users")
-    query = users_ref.where("email", "==", user_data.email).limit(1)
-    results = list(query.stream())
-    
+    query = users_ref.where("email", "==", email).limit(1)
+    return [doc async for doc in query.stream()]
+
+async def find_user_by_email(email: str):
+    """The user's record from the Redis email index, falling back to Firestore on a miss."""
+    user_doc = await get_indexed_user(email)
+    if user_doc is not None:
+        return user_doc
+    results = await _find_users_by_email(email)
     if not results:
+        return None
+    user_doc = results[0].to_dict()
+    await cache_user(user_doc)
+    return user_doc
+
+async def login_user(user_data: UserLogin):
+    user_doc = await find_user_by_email(user_data.email)
+    
+    if not user_doc:
         raise HTTPException(
             status_code=401,
             detail="Incorrect email or password"
         )
     
-    user_doc = results[0].to_dict()
-    
     if not await verify_password(user_data.password, user_doc["password_hash"]):
         raise HTTPException(
             status_code=401,
@@ -68,7 +81,7 @@ async def login_user(user_data: UserLogin):
     
     access_token = await create_access_token({"user_id": user_id})
     
-    redis_client.set(access_token, user_id, ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60) 
+    await async_redis_client.set(access_token, user_id, ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60) 
     
     return {
         "access_token": access_token,
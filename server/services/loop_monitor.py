@@ -0,0 +1,79 @@
+from typing import Dict, Any, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Measures how long the event loop is blocked.
+
+    A background task sleeps for a short tick and compares the actual wake-up
+    time with the expected one; the difference is time the loop spent running
+    something else without yielding. The maximum lag is reported once per
+    interval and logged as a warning when it crosses the threshold.
+    """
+
+    def __init__(self, tick: float = 0.05, interval: float = 10.0, warn_threshold: float = 0.1):
+        self.tick = tick
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self._task: Optional[asyncio.Task] = None
+        self.last_interval_max_lag = 0.0
+        self.last_interval_avg_lag = 0.0
+        self.max_lag_seen = 0.0
+        self.intervals_over_threshold = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        interval_start = time.perf_counter()
+        interval_max = 0.0
+        lag_total = 0.0
+        samples = 0
+
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            lag = max(0.0, time.perf_counter() - before - self.tick)
+
+            interval_max = max(interval_max, lag)
+            lag_total += lag
+            samples += 1
+
+            if time.perf_counter() - interval_start >= self.interval:
+                self.last_interval_max_lag = interval_max
+                self.last_interval_avg_lag = lag_total / samples
+                self.max_lag_seen = max(self.max_lag_seen, interval_max)
+                if interval_max >= self.warn_threshold:
+                    self.intervals_over_threshold += 1
+                    logger.warning(f"Event loop blocked for up to {interval_max * 1000:.1f} ms "
+                                   f"in the last {self.interval:.0f}s")
+
+                interval_start = time.perf_counter()
+                interval_max = 0.0
+                lag_total = 0.0
+                samples = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "max_lag_ms": self.last_interval_max_lag * 1000,
+            "avg_lag_ms": self.last_interval_avg_lag * 1000,
+            "max_lag_ever_ms": self.max_lag_seen * 1000,
+            "intervals_over_threshold": self.intervals_over_threshold,
+        }
+
+
+# Global loop monitor instance
+loop_monitor = LoopLagMonitor()
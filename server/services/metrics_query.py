@@ -0,0 +1,143 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import time
+from storage.redis import async_redis_client
+from middlewares.metrics_writer import series_key, compaction_key
+from middlewares.quantiles import quantile_store
+from utils.config import (
+    SKETCH_SLOT_WIDTHS,
+    METRICS_MAX_POINTS,
+    METRICS_COMPACTIONS,
+    METRICS_CACHE_SECONDS,
+)
+
+
+def choose_bucket(window_seconds: int, bucket_seconds: Optional[int] = None) -> int:
+    """
+    The bucket width for a window: at least `bucket_seconds`, wide enough for
+    at most METRICS_MAX_POINTS buckets, snapped up to a width the sketches
+    are kept at (SKETCH_SLOT_WIDTHS).
+    """
+    wanted = max(bucket_seconds or 0, -(-window_seconds // METRICS_MAX_POINTS))
+    for width in SKETCH_SLOT_WIDTHS:
+        if width >= wanted:
+            return width
+    return SKETCH_SLOT_WIDTHS[-1]
+
+
+def _source(metric: str, bucket_seconds: int) -> Tuple[str, list]:
+    """(source name, [(key, aggregator)] for count, sum and max) for the coarsest usable series."""
+    for compaction in sorted(METRICS_COMPACTIONS, reverse=True):
+        if bucket_seconds % compaction == 0:
+            return f"compaction_{compaction}s", [
+                (compaction_key(metric, "count", compaction), "sum"),
+                (compaction_key(metric, "sum", compaction), "sum"),
+                (compaction_key(metric, "max", compaction), "max"),
+            ]
+    return "raw", _raw_ranges(metric)
+
+
+def _raw_ranges(metric: str) -> list:
+    return [(series_key(metric), "count"), (series_key(metric), "sum"), (series_key(metric), "max")]
+
+
+async def _aggregate(ranges: list, start_ms: int, end_ms: int, bucket_ms: int) -> list:
+    """Run TS.RANGE ... AGGREGATION for each (key, aggregator) in one pipeline; {timestamp: value} each."""
+    pipe = async_redis_client.pipeline(transaction=False)
+    for key, aggregator in ranges:
+        pipe.execute_command("TS.RANGE", key, start_ms, end_ms, "AGGREGATION", aggregator, bucket_ms)
+    return [{int(ts): float(value) for ts, value in reply} for reply in await pipe.execute()]
+
+
+async def metric_series(metric: str, window_seconds: int, bucket_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """
+    A metric over the last `window_seconds` as columnar arrays, one entry per
+    non-empty bucket: bucket start (ms), sample count, avg, max and p95.
+
+    avg and max are aggregated by Redis from the coarsest compaction that
+    divides the bucket (raw samples for 10 s buckets, and for the part of the
+    window before the compaction has data); p95 comes from the
+    fleet-wide sketch kept for each bucket. The number of buckets is at most
+    METRICS_MAX_POINTS, so the response does not grow with traffic.
+    """
+    bucket = choose_bucket(window_seconds, bucket_seconds)
+    end = int(time.time())
+    start = (end - window_seconds) // bucket * bucket
+    start_ms, end_ms, bucket_ms = start * 1000, end * 1000, bucket * 1000
+
+    source, ranges = _source(metric, bucket)
+    counts, sums, maxima = await _aggregate(ranges, start_ms, end_ms, bucket_ms)
+    if source != "raw":
+        # Compactions only hold samples written after their rule was created. Buckets up to and
+        # including the first compacted one (which may be partial) are read from the raw series
+        compacted = [ts for ts, count in counts.items() if count]
+        raw_end_ms = min(min(compacted) + bucket_ms - 1, end_ms) if compacted else end_ms
+        raw_counts, raw_sums, raw_maxima = await _aggregate(_raw_ranges(metric), start_ms, raw_end_ms, bucket_ms)
+        if any(raw_counts.values()):
+            source = f"{source}+raw" if compacted else "raw"
+            for ts, count in raw_counts.items():
+                counts[ts], sums[ts], maxima[ts] = count, raw_sums.get(ts, 0.0), raw_maxima.get(ts)
+    quantiles = await quantile_store.bucket_quantiles(metric, start, end + 1, bucket)
+
+    timestamps = sorted(ts for ts, count in counts.items() if count)
+    return {
+        "metric": metric,
+        "window_seconds": window_seconds,
+        "bucket_seconds": bucket,
+        "source": source,
+        "timestamps": timestamps,
+        "count": [int(counts[ts]) for ts in timestamps],
+        "avg": [sums.get(ts, 0.0) / counts[ts] for ts in timestamps],
+        "max": [maxima.get(ts) for ts in timestamps],
+        "p95": [quantiles.get(ts) for ts in timestamps],
+    }
+
+
+class SingleFlightCache:
+    """
+    Caches results for `ttl_seconds`; callers asking for a key that is being
+    computed await the same task instead of starting another one.
+    """
+
+    def __init__(self, ttl_seconds: float = METRICS_CACHE_SECONDS, max_entries: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # Shielded so one poller disconnecting does not cancel the others' result
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if len(self._results) >= self.max_entries:
+            now = time.monotonic()
+            self._results = {k: v for k, v in self._results.items() if v[0] > now}
+            if len(self._results) >= self.max_entries:
+                self._results.pop(next(iter(self._results)))
+        self._results[key] = (time.monotonic() + self.ttl_seconds, task.result())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "shared": self.shared, "misses": self.misses, "ttl_seconds": self.ttl_seconds}
+
+
+# Shared by all /metrics pollers of this worker
+metrics_cache = SingleFlightCache()
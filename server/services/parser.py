@@ -1,8 +1,25 @@
-from utils.config import DOCAI_LOCATIONS
-from google.cloud import documentai_v1 as documentai
-from google.api_core import client_options
+from utils.config import (
+    DOCAI_LOCATIONS,
+    PDF_MIN_TEXT_CHARS,
+    DOCAI_SHARD_PAGES,
+    DOCAI_MAX_CONCURRENCY,
+    DOCAI_SHARD_RETRIES,
+    PARSE_CACHE_TTL_SECONDS,
+)
+from storage.redis import redis_client
 from fastapi import HTTPException, File, UploadFile
+from typing import Callable, Dict, List, Any, Iterable, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor, Future
+from xml.etree import ElementTree
+from pypdf import PdfReader, PdfWriter
+import hashlib
+import io
+import json
 import os
+import threading
+import time
+import zipfile
+import zlib
 import mimetypes
 
 
@@ -19,8 +36,12 @@ def get_mime_type(file_path: str) -> str:
     }
     return mime_types.get(extension, 'application/octet-stream')
 
-def initialize_document_ai_client(project_id: str, location: str = "us") -> documentai.DocumentProcessorServiceClient:
+def initialize_document_ai_client(project_id: str, location: str = "us") -> "documentai.DocumentProcessorServiceClient":
     """Initialize Document AI client with specified configuration."""
+    # Deferred so importing the parser does not load the gRPC/protobuf stack
+    from google.cloud import documentai_v1 as documentai
+    from google.api_core import client_options
+
     if location not in DOCAI_LOCATIONS:
         raise ValueError(f"Invalid location. Available locations: {', '.join(DOCAI_LOCATIONS.keys())}")
 
@@ -29,78 +50,396 @@ def initialize_document_ai_client(project_id: str, location: str = "us") -> docu
     )
     return documentai.DocumentProcessorServiceClient(client_options=opts)
 
-def parse_document(temp_file_path: str):
+
+# One client per location, shared by all shard threads (the gRPC client is thread-safe)
+_docai_clients: Dict[str, Any] = {}
+_docai_clients_lock = threading.Lock()
+
+def get_document_ai_client(project_id: str, location: str) -> "documentai.DocumentProcessorServiceClient":
+    """Return the shared Document AI client for a location, creating it on first use."""
+    client = _docai_clients.get(location)
+    if client is None:
+        with _docai_clients_lock:
+            client = _docai_clients.get(location)
+            if client is None:
+                client = initialize_document_ai_client(project_id=project_id, location=location)
+                _docai_clients[location] = client
+    return client
+
+
+# Parsers by MIME type. Each takes a file path and returns (or yields, in page order) one dict per page:
+# {"page": int, "text": str, "method": "local" | "document_ai", "seconds": float}
+# plus, where the source has real structure, "blocks": [{"type": "heading" | "paragraph", "text": str}
+# or {"type": "table", "rows": [[cell, ...], ...]}] in reading order (see services.chunking).
+PARSERS: Dict[str, Callable[[str], Iterable[Dict[str, Any]]]] = {}
+
+def register_parser(*mime_types: str):
+    """Register a parser function for one or more MIME types."""
+    def decorator(func):
+        for mime_type in mime_types:
+            PARSERS[mime_type] = func
+        return func
+    return decorator
+
+
+def _layout_text(document, layout) -> str:
+    """Text covered by a Document AI layout element."""
+    return "".join(
+        document.text[int(segment.start_index):int(segment.end_index)]
+        for segment in layout.text_anchor.text_segments
+    )
+
+def _page_blocks(document, page) -> List[Dict[str, Any]]:
+    """Paragraph and table blocks of a Document AI page, in reading order."""
+    def start_of(layout) -> int:
+        segments = layout.text_anchor.text_segments
+        return int(segments[0].start_index) if segments else 0
+
+    def end_of(layout) -> int:
+        segments = layout.text_anchor.text_segments
+        return int(segments[-1].end_index) if segments else 0
+
+    positioned = []
+    table_spans = []
+    for table in page.tables:
+        rows = [
+            [_layout_text(document, cell.layout).strip() for cell in row.cells]
+            for row in list(table.header_rows) + list(table.body_rows)
+        ]
+        positioned.append((start_of(table.layout), {"type": "table", "rows": rows}))
+        table_spans.append((start_of(table.layout), end_of(table.layout)))
+
+    for paragraph in page.paragraphs:
+        start = start_of(paragraph.layout)
+        # Table cells are also reported as paragraphs; keep them only in the table
+        if any(begin <= start < end for begin, end in table_spans):
+            continue
+        text = _layout_text(document, paragraph.layout).strip()
+        if text:
+            positioned.append((start, {"type": "paragraph", "text": text}))
+
+    return [block for _, block in sorted(positioned, key=lambda item: item[0])]
+
+
+def process_with_document_ai(file_content: bytes, mime_type: str) -> List[Dict[str, Any]]:
     """
-    Parse a document using Document AI OCR processor.
-    Returns the extracted text.
+    Send content to the Document AI OCR processor.
+    Returns, for each page, its text and its paragraph/table blocks.
     """
+    # Retrieve environment variables
+    project_id = os.getenv("PROJECT_ID")
+    location = os.getenv("DOCAI_LOCATION", "us")  # Default to "us" if not set
+    processor_id = os.getenv("DOCUMENTAI_PROCESSOR")
+
+    if not project_id or not processor_id:
+        raise ValueError("Missing required environment variables: PROJECT_ID or DOCAI_PROCESSOR_ID")
+
+    from google.cloud import documentai_v1 as documentai
+
+    # Reuse the Document AI client for this location
+    client = get_document_ai_client(project_id=project_id, location=location)
+
+    # Format the processor name
+    name = f"projects/{project_id}/locations/{location}/processors/{processor_id}"
+
+    raw_document = documentai.RawDocument(content=file_content, mime_type=mime_type)
+    # Create the process request
     try:
-        # Retrieve environment variables
-        project_id = os.getenv("PROJECT_ID")
-        location = os.getenv("DOCAI_LOCATION", "us")  # Default to "us" if not set
-        processor_id = os.getenv("DOCUMENTAI_PROCESSOR")
+        request = documentai.ProcessRequest(
+        name=name,
+        raw_document=raw_document,
+        # Enable advanced OCR features
+        process_options=documentai.ProcessOptions(
+            ocr_config=documentai.OcrConfig(
+                enable_native_pdf_parsing=True,
+                enable_image_quality_scores=True
+            )
+        )
+    )
+    except Exception as e:
+        print(f"Error creating process request: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create process request: {str(e)}")
 
-        if not project_id or not processor_id:
-            raise ValueError("Missing required environment variables: PROJECT_ID or DOCAI_PROCESSOR_ID")
-        
-        # Initialize Document AI client
-        client = initialize_document_ai_client(project_id=project_id, location=location)
+    # Process the document
+    try:
+        result = client.process_document(request=request)
+        document = result.document
+    except Exception as e:
+        print(f"Error processing document: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Document processing failed: {str(e)}")
 
-        # Format the processor name
-        name = f"projects/{project_id}/locations/{location}/processors/{processor_id}"
+    # Extract text from the document
+    try:
+        if not document.pages:
+            return [{"text": document.text, "blocks": []}]
+        return [
+            {"text": _layout_text(document, page.layout), "blocks": _page_blocks(document, page)}
+            for page in document.pages
+        ]
+    except Exception as e:
+        print(f"Error extracting text from document: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to extract text: {str(e)}")
 
-        # Read the file content
-        with open(temp_file_path, "rb") as file:
-            file_content = file.read()
 
-        
+@register_parser('text/plain')
+def parse_text(file_path: str) -> List[Dict[str, Any]]:
+    """Plain text needs no OCR."""
+    start = time.perf_counter()
+    with open(file_path, "r", encoding="utf-8", errors="replace") as file:
+        text = file.read()
+    return [{"page": 1, "text": text, "method": "local", "seconds": time.perf_counter() - start}]
 
-        # Determine the MIME type based on the file extension
-        # mime_type= mimetypes.guess_file_type(temp_file_path)
-        # if mime_type is None:
-        #     raise ValueError("Unsupported input file format. Could not determine MIME type.")
 
-        print(f"Type of file_content: {type(file_content)}")
-        print(f"Type of name: {type(name)}")
+@register_parser('application/vnd.openxmlformats-officedocument.wordprocessingml.document')
+def parse_docx(file_path: str) -> List[Dict[str, Any]]:
+    """Extract headings, paragraphs and tables straight from the DOCX XML."""
+    start = time.perf_counter()
+    namespace = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+    with zipfile.ZipFile(file_path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
 
-        raw_document = documentai.RawDocument(content=file_content, mime_type="application/pdf")
-        # Create the process request
-        try:
-            request = documentai.ProcessRequest(
-            name=name,
-            raw_document=raw_document,
-            # Enable advanced OCR features
-            process_options=documentai.ProcessOptions(
-                ocr_config=documentai.OcrConfig(
-                    enable_native_pdf_parsing=True,
-                    enable_image_quality_scores=True
-                )
-            )
-        )
-        except Exception as e:
-            print(f"Error creating process request: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Failed to create process request: {str(e)}")
+    def node_text(node) -> str:
+        return "".join(t.text or "" for t in node.iter(f"{namespace}t"))
 
-        # Process the document
+    blocks = []
+    body = root.find(f"{namespace}body")
+    for element in (body if body is not None else []):
+        if element.tag == f"{namespace}p":
+            text = node_text(element)
+            if not text:
+                continue
+            style = element.find(f"{namespace}pPr/{namespace}pStyle")
+            style_name = style.get(f"{namespace}val", "") if style is not None else ""
+            is_heading = style_name.startswith("Heading") or style_name == "Title"
+            blocks.append({"type": "heading" if is_heading else "paragraph", "text": text})
+        elif element.tag == f"{namespace}tbl":
+            rows = [[node_text(cell).strip() for cell in row.iter(f"{namespace}tc")]
+                    for row in element.iter(f"{namespace}tr")]
+            blocks.append({"type": "table", "rows": rows})
+
+    text = "\n".join(
+        block["text"] if block["type"] != "table" else "\n".join(" | ".join(row) for row in block["rows"])
+        for block in blocks
+    )
+    return [{"page": 1, "text": text, "blocks": blocks, "method": "local", "seconds": time.perf_counter() - start}]
+
+
+def _ocr_shard(pdf_bytes: bytes, page_numbers: List[int]) -> List[Dict[str, Any]]:
+    """
+    OCR one shard (a PDF made of the given pages) with Document AI,
+    retrying the shard with backoff when the call fails.
+    """
+    for attempt in range(1, DOCAI_SHARD_RETRIES + 1):
+        start = time.perf_counter()
         try:
-            result = client.process_document(request=request)
-            document = result.document
-        except Exception as e:
-            print(f"Error processing document: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Document processing failed: {str(e)}")
+            results = process_with_document_ai(pdf_bytes, 'application/pdf')
+            break
+        except HTTPException as e:
+            if attempt == DOCAI_SHARD_RETRIES:
+                raise
+            print(f"Document AI shard for pages {page_numbers[0]}-{page_numbers[-1]} failed "
+                  f"(attempt {attempt}/{DOCAI_SHARD_RETRIES}): {e.detail}")
+            time.sleep(2 ** (attempt - 1))
+
+    per_page_seconds = (time.perf_counter() - start) / len(page_numbers)
+    return [{"page": number, "text": result["text"], "blocks": result["blocks"],
+             "method": "document_ai", "seconds": per_page_seconds}
+            for number, result in zip(page_numbers, results)]
+
+
+@register_parser('application/pdf')
+def parse_pdf(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Extract the native text layer page by page. Pages with (almost) no
+    text are scanned images; only those are sent to Document AI.
 
-        # Extract text from the document
+    Scanned pages are grouped into shards of at most DOCAI_SHARD_PAGES
+    (keeping every request under the online processing limits), and up to
+    DOCAI_MAX_CONCURRENCY shards are OCR'd at once. Pages are yielded in
+    page order as soon as they and every page before them are ready, so
+    callers can chunk and embed early pages while later shards are still
+    being processed.
+    """
+    reader = PdfReader(file_path)
+    pages = []
+    scanned = []
+    for number, page in enumerate(reader.pages, start=1):
+        start = time.perf_counter()
         try:
-            text = document.text
-            print(f"Extracted text length: {len(text)}")
-            return text
+            text = page.extract_text() or ""
         except Exception as e:
-            print(f"Error extracting text from document: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Failed to extract text: {str(e)}")
+            print(f"Error extracting text layer from page {number}: {str(e)}")
+            text = ""
+        if len(text.strip()) < PDF_MIN_TEXT_CHARS:
+            scanned.append(number)
+        pages.append({"page": number, "text": text, "method": "local", "seconds": time.perf_counter() - start})
+
+    if not scanned:
+        yield from pages
+        return
+
+    shards = [scanned[i:i + DOCAI_SHARD_PAGES] for i in range(0, len(scanned), DOCAI_SHARD_PAGES)]
+    shard_of_page = {number: index for index, shard in enumerate(shards) for number in shard}
+    futures: List[Future] = []
+    # Shards submitted ahead of the one being consumed; bounds the sub-PDFs held in memory
+    window = DOCAI_MAX_CONCURRENCY * 2
+
+    def submit_until(index: int) -> None:
+        # pypdf readers are not thread-safe, so sub-PDFs are built on this thread
+        while len(futures) <= min(index, len(shards) - 1):
+            writer = PdfWriter()
+            for number in shards[len(futures)]:
+                writer.add_page(reader.pages[number - 1])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            futures.append(executor.submit(_ocr_shard, buffer.getvalue(), shards[len(futures)]))
+
+    executor = ThreadPoolExecutor(max_workers=DOCAI_MAX_CONCURRENCY)
+    try:
+        submit_until(window - 1)
+        for page in pages:
+            index = shard_of_page.get(page["page"])
+            if index is None:
+                yield page
+                continue
+            submit_until(index + window - 1)
+            ocr_pages = futures[index].result()
+            if page["page"] == shards[index][0]:
+                # Whole shard is ready; the shard's other pages are yielded from here too
+                ocr_by_page = {p["page"]: p for p in ocr_pages}
+                for number in shards[index]:
+                    pages[number - 1].update(ocr_by_page.get(number, {"text": "", "method": "document_ai"}))
+            yield page
+    finally:
+        # Stop queued shards if the caller gave up early
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+@register_parser('image/png', 'image/jpeg')
+def parse_image(file_path: str) -> List[Dict[str, Any]]:
+    """Images always need OCR."""
+    start = time.perf_counter()
+    with open(file_path, "rb") as file:
+        results = process_with_document_ai(file.read(), get_mime_type(file_path))
+    seconds = (time.perf_counter() - start) / max(len(results), 1)
+    return [{"page": i, "text": result["text"], "blocks": result["blocks"], "method": "document_ai", "seconds": seconds}
+            for i, result in enumerate(results, start=1)]
+
+
+def _get_parser(file_path: str) -> Callable[[str], Iterable[Dict[str, Any]]]:
+    mime_type = get_mime_type(file_path)
+    parser = PARSERS.get(mime_type)
+    if parser is None:
+        raise HTTPException(status_code=400, detail=f"Document parsing failed: Unsupported input file format: {os.path.splitext(file_path)[1] or mime_type}")
+    return parser
+
+
+def count_pages(file_path: str) -> Optional[int]:
+    """Number of pages a document will be parsed into, if known up front."""
+    if get_mime_type(file_path) == 'application/pdf':
+        return len(PdfReader(file_path).pages)
+    return None
 
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 of a file's content, read in 1 MiB blocks."""
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def parse_cache_key(file_hash: str) -> str:
+    return f"parsed:{file_hash}"
+
+
+def _load_cached_pages(file_hash: str) -> Optional[List[Dict[str, Any]]]:
+    try:
+        raw = redis_client.get(parse_cache_key(file_hash))
+        if raw is not None:
+            return json.loads(zlib.decompress(raw))
+    except Exception as e:
+        print(f"Error reading parse cache: {str(e)}")
+    return None
+
+
+def _store_cached_pages(file_hash: str, pages: List[Dict[str, Any]]) -> None:
+    try:
+        payload = zlib.compress(json.dumps(pages).encode("utf-8"))
+        redis_client.set(parse_cache_key(file_hash), payload, ex=PARSE_CACHE_TTL_SECONDS)
+    except Exception as e:
+        print(f"Error writing parse cache: {str(e)}")
+
+
+def iter_document_pages(file_path: str, file_hash: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the parsed pages of a document in page order, as they become
+    available. Raises HTTPException like `parse_document_with_report`.
+
+    Parsed pages are cached in Redis (compressed) by the SHA-256 of the
+    file, so parsing identical content again, by any user, skips local
+    extraction and Document AI entirely. Cached pages report method "cache".
+    """
+    parser = _get_parser(file_path)
+    if file_hash is None:
+        file_hash = file_sha256(file_path)
+
+    cached = _load_cached_pages(file_hash)
+    if cached is not None:
+        for page in cached:
+            yield {"page": page["page"], "text": page["text"], "blocks": page.get("blocks"),
+                   "method": "cache", "seconds": 0.0}
+        return
+
+    pages = []
+    try:
+        for page in parser(file_path):
+            pages.append(page)
+            yield page
+    except HTTPException:
+        raise
     except ValueError as ve:
         print(f"ValueError in parsing: {str(ve)}")
         raise HTTPException(status_code=400, detail=f"Document parsing failed: {str(ve)}")
     except Exception as e:
         print(f"Error in parsing: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+    _store_cached_pages(file_hash, [
+        {"page": page["page"], "text": page["text"], "blocks": page.get("blocks")} for page in pages
+    ])
+
+
+def summarize_pages(mime_type: str, pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-page parse report (without the text): which path each page took and how long it took."""
+    return {
+        "mime_type": mime_type,
+        "pages": [{k: v for k, v in page.items() if k not in ("text", "blocks")} for page in pages],
+        "local_pages": sum(1 for page in pages if page["method"] == "local"),
+        "document_ai_pages": sum(1 for page in pages if page["method"] == "document_ai"),
+        "local_seconds": sum(page["seconds"] for page in pages if page["method"] == "local"),
+        "document_ai_seconds": sum(page["seconds"] for page in pages if page["method"] == "document_ai"),
+        "cached_pages": sum(1 for page in pages if page["method"] == "cache"),
+    }
+
+
+def parse_document_with_report(temp_file_path: str) -> Dict[str, Any]:
+    """
+    Parse a document with the parser registered for its MIME type.
+    Returns the extracted text plus, per page, which path it took
+    (local extraction, Document AI OCR or the parse cache) and how long it took.
+    """
+    pages = list(iter_document_pages(temp_file_path))
+    text = "\n\n".join(page["text"] for page in pages if page["text"])
+    print(f"Extracted text length: {len(text)}")
+    return {"text": text, **summarize_pages(get_mime_type(temp_file_path), pages)}
+
+
+def parse_document(temp_file_path: str):
+    """
+    Parse a document, extracting text locally where possible and with
+    Document AI OCR otherwise.
+    Returns the extracted text.
+    """
+    return parse_document_with_report(temp_file_path)["text"]
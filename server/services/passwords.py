@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+import asyncio
+import time
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from utils.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt releases the GIL, so a few threads hash in parallel without touching the event loop
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+_stats = {"hashed": 0, "verified": 0, "rejected": 0, "seconds": 0.0, "max_pending": 0}
+
+
+async def _run(fn, *args):
+    """Run one bcrypt call in the pool, refusing new work when too much is already queued."""
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Too many authentication requests, please retry",
+                            headers={"Retry-After": "1"})
+    _pending += 1
+    _stats["max_pending"] = max(_stats["max_pending"], _pending)
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, fn, *args)
+    finally:
+        _pending -= 1
+        _stats["seconds"] += time.perf_counter() - start
+
+
+async def hash_password(password: str) -> str:
+    result = await _run(pwd_context.hash, password)
+    _stats["hashed"] += 1
+    return result
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    result = await _run(pwd_context.verify, plain_password, hashed_password)
+    _stats["verified"] += 1
+    return result
+
+
+def password_hashing_stats() -> Dict[str, Any]:
+    calls = _stats["hashed"] + _stats["verified"]
+    return {
+        **_stats,
+        "pending": _pending,
+        "workers": PASSWORD_HASH_WORKERS,
+        "avg_seconds": _stats["seconds"] / calls if calls else 0.0,
+    }
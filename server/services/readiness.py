@@ -0,0 +1,81 @@
+from typing import Awaitable, Callable, Dict, Any, Optional
+import asyncio
+import logging
+import time
+from utils.config import STARTUP_CHECK_TIMEOUT_SECONDS, STARTUP_RETRY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Startup warm-up phase, tracked separately from liveness.
+
+    Checks (Redis ping, vector index connection, model warm-up, ...) are
+    registered as coroutines and run concurrently in a background task once
+    the server is listening, each attempt bounded by a timeout. Checks that
+    fail or time out are retried until they pass; the process is live the
+    whole time and becomes ready when every check has passed once.
+    """
+
+    def __init__(self, timeout: float = STARTUP_CHECK_TIMEOUT_SECONDS, retry_interval: float = STARTUP_RETRY_SECONDS):
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._checks: Dict[str, Callable[[], Awaitable[Any]]] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.started_at = time.time()
+        self.ready_at: Optional[float] = None
+
+    def register(self, name: str, check: Callable[[], Awaitable[Any]]) -> None:
+        self._checks[name] = check
+        self._status[name] = {"ok": False, "attempts": 0, "seconds": None, "error": None}
+
+    @property
+    def ready(self) -> bool:
+        return all(status["ok"] for status in self._status.values())
+
+    def start(self) -> None:
+        if self._task is None:
+            self.started_at = time.time()
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._run_check(name) for name in self._checks))
+        self.ready_at = time.time()
+        logger.info(f"Ready after {self.ready_at - self.started_at:.2f}s")
+
+    async def _run_check(self, name: str) -> None:
+        status = self._status[name]
+        while True:
+            status["attempts"] += 1
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._checks[name](), timeout=self.timeout)
+                status.update(ok=True, seconds=time.perf_counter() - start, error=None)
+                return
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                status["error"] = f"timed out after {self.timeout:g}s"
+            except Exception as e:
+                status["error"] = str(e)
+            logger.warning(f"Startup check '{name}' failed (attempt {status['attempts']}): {status['error']}")
+            await asyncio.sleep(self.retry_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "seconds_to_ready": self.ready_at - self.started_at if self.ready_at else None,
+            "checks": {name: dict(status) for name, status in self._status.items()},
+        }
+
+
+# Global readiness tracker
+readiness = Readiness()
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+import itertools
+import threading
+import time
+import numpy as np
+from utils.config import (
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MAX_PER_USER,
+    SEMANTIC_CACHE_TTL_SECONDS,
+)
+
+
+def kb_version_key(user_id: str) -> str:
+    """Redis key holding the version of a user's knowledge base, bumped on every document change."""
+    return f"kb_version:{user_id}"
+
+
+class SemanticCache:
+    """
+    Caches generated answers per user and knowledge-base version.
+
+    A query whose embedding is within the cosine threshold of a cached query
+    for the same user and knowledge-base version gets the cached answer.
+    Entries are evicted least-recently-used beyond the global and per-user
+    limits and expire after a TTL. Bumping the knowledge-base version (see
+    `kb_version_key`) makes every older entry for that user unreachable.
+    """
+
+    def __init__(self,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 max_per_user: int = SEMANTIC_CACHE_MAX_PER_USER,
+                 ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_per_user = max_per_user
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._by_user: Dict[str, "OrderedDict[int, None]"] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        user_entries = self._by_user.get(entry["user_id"])
+        if user_entries is not None:
+            user_entries.pop(entry_id, None)
+            if not user_entries:
+                del self._by_user[entry["user_id"]]
+
+    def lookup(self, user_id: str, kb_version: int, embedding: List[float]) -> Optional[str]:
+        """Return the cached answer for the closest matching query, if it is close enough."""
+        query = self._normalize(embedding)
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            candidates = []
+            for entry_id in list(self._by_user.get(user_id, ())):
+                entry = self._entries[entry_id]
+                if entry["expires_at"] <= now or entry["kb_version"] != kb_version:
+                    self._remove(entry_id)
+                    continue
+                candidates.append(entry_id)
+            if not candidates:
+                return None
+
+            matrix = np.stack([self._entries[entry_id]["embedding"] for entry_id in candidates])
+            scores = matrix @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            entry_id = candidates[best]
+            entry = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            self._by_user[user_id].move_to_end(entry_id)
+            self.hits += 1
+            self.seconds_saved += entry["answer_seconds"]
+            return entry["answer"]
+
+    def store(self, user_id: str, kb_version: int, embedding: List[float],
+              answer: str, answer_seconds: float) -> None:
+        """
+        Cache an answer for a query embedding. `answer_seconds` is the time
+        a hit saves (retrieval plus generation) and feeds `seconds_saved`.
+        """
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "user_id": user_id,
+                "kb_version": kb_version,
+                "embedding": self._normalize(embedding),
+                "answer": answer,
+                "answer_seconds": answer_seconds,
+                "expires_at": time.time() + self.ttl_seconds,
+            }
+            user_entries = self._by_user.setdefault(user_id, OrderedDict())
+            user_entries[entry_id] = None
+
+            while len(user_entries) > self.max_per_user:
+                self._remove(next(iter(user_entries)))
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop every cached answer for a user."""
+        with self._lock:
+            for entry_id in list(self._by_user.get(user_id, ())):
+                self._remove(entry_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "entries": len(self._entries),
+                "seconds_saved": self.seconds_saved,
+                "threshold": self.threshold,
+            }
+
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
@@ -1,29 +1,35 @@
 from fastapi import HTTPException
 from storage.db import get_async_database
-from storage.redis import get_redis_client
+from storage.redis import async_redis_client
 from schema.user import UserSignup
 import uuid
 from datetime import datetime
-from passlib.context import CryptContext
 from services.login import create_access_token
 from services.login import ACCESS_TOKEN_EXPIRE_MINUTES
-from services.login import pwd_context
+from services.passwords import hash_password
+from services.user_index import get_indexed_user, cache_user, claim_email, release_email, index_is_complete
 
-async def get_password_hash(password: str):
-    return pwd_context.hash(password)
+async def _find_user_doc(email: str):
+    db = get_async_database()
+    query = db.collection("users").where("email", "==", email).limit(1)
+    async for doc in query.stream():
+        return doc.to_dict()
+    return None
 
-async def signup_user(user_data: UserSignup):
-    # Check if user already exists
+async def _save_user(user_id: str, user_doc: dict) -> None:
     db = get_async_database()
-    users_ref = db.collection("users")
-    query = users_ref.where("email", "==", user_data.email).limit(1)
-    results = query.stream()
-    
-    if any(results):
-        raise HTTPException(
-            status_code=400,
-            detail="User with this email already exists"
-        )
+    await db.collection("users").document(user_id).set(user_doc)
+
+def _duplicate_email() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail="User with this email already exists"
+    )
+
+async def signup_user(user_data: UserSignup):
+    # Cheap check first, so a known email does not pay for a password hash
+    if await get_indexed_user(user_data.email) is not None:
+        raise _duplicate_email()
     
     # Create new user
     user_id = str(uuid.uuid4())
@@ -31,20 +37,34 @@ async def signup_user(user_data: UserSignup):
         "user_id": user_id,
         "email": user_data.email,
         "name": user_data.name,
-        "password_hash": await get_password_hash(user_data.password),
+        "password_hash": await hash_password(user_data.password),
         "documents_uploaded": 0,
         "created_at": datetime.utcnow()
     }
     
-    # Save user to Firestore
-    users_ref.document(user_id).set(user_doc)
+    # Reserve the email in the Redis index; concurrent signups for it get exactly one winner
+    if not await claim_email(user_doc):
+        raise _duplicate_email()
+
+    try:
+        # Until the index has been bulk-loaded, older users may only exist in Firestore
+        if not await index_is_complete():
+            existing = await _find_user_doc(user_data.email)
+            if existing:
+                await cache_user(existing)
+                raise _duplicate_email()
+
+        # Save user to Firestore
+        await _save_user(user_id, user_doc)
+    except Exception:
+        await release_email(user_data.email, user_id)
+        raise
     
     # Create access token
     access_token = await create_access_token({"user_id": user_id})
     
     # Store token in Redis for verification
-    redis_client = get_redis_client()
-    redis_client.set(access_token, user_id, ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60)  # Expire in Redis too
+    await async_redis_client.set(access_token, user_id, ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60)  # Expire in Redis too
     
     return {
         "access_token": access_token,
@@ -1,55 +1,200 @@
-from typing import Annotated
-from fastapi import UploadFile, HTTPException, File  
+from fastapi import UploadFile
+import asyncio
+import hashlib
 import os
 import time
 from dotenv import load_dotenv
 from pathlib import Path
-from google.cloud import storage
-from google.cloud import firestore
 from datetime import datetime
+from utils.config import UPLOAD_READ_CHUNK_BYTES, UPLOAD_QUEUE_CHUNKS, UPLOAD_GCS_CHUNK_BYTES, UPLOAD_GCS_TIMEOUT_SECONDS
+from storage.gcs import get_bucket
 env_path = Path(__file__).resolve().parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-async def upload_service(email: str, file: UploadFile):
-    """Uploads a file to the configured GCS bucket with metadata and generates a contract ID."""
+def upload_local_file(email: str, filename: str, local_path: str):
+    """Uploads a file from local disk to GCS; blocking, for use from worker threads."""
+    with open(local_path, "rb") as local_file:
+        return _upload_to_gcs(email, filename, local_file)
+
+def download_to_local_file(email: str, filename: str, local_path: str) -> None:
+    """Fetches a previously uploaded file from GCS to local disk; blocking, for use from worker threads."""
+    get_bucket().blob(f"{email}/{filename}").download_to_filename(local_path)
+
+def _new_blob(email: str, filename: str):
+    # Create a unique path for the user's file
+    destination_blob_name = f"{email}/{filename}"
+
+    blob = get_bucket().blob(destination_blob_name)
+
+    # Set metadata for the blob including the contract ID
+    blob.metadata = {
+        "uploaded_by": email,
+        "filename": filename,
+        "upload_date": datetime.now().isoformat(),
+    }
+    return blob
+
+def _upload_to_gcs(email: str, filename: str, file_obj):
+    blob = _new_blob(email, filename)
+    blob.upload_from_file(file_obj)
+
+    return {
+        "public_url": blob.public_url,
+        "message": "Document uploaded successfully!"
+    }
+
+async def _drain(queue: asyncio.Queue, write) -> None:
+    """Feed chunks from a queue to a blocking writer until the None sentinel arrives."""
+    while True:
+        chunk = await queue.get()
+        if chunk is None:
+            return
+        await asyncio.to_thread(write, chunk)
+
+async def _put(queue: asyncio.Queue, chunk, consumer: asyncio.Task) -> bool:
+    """Queue a chunk unless the consumer has died; never blocks on a dead consumer."""
+    put = asyncio.ensure_future(queue.put(chunk))
+    await asyncio.wait({put, consumer}, return_when=asyncio.FIRST_COMPLETED)
+    if not put.done():
+        put.cancel()
+        return False
+    return True
+
+class _ResumableGCSUpload:
+    """
+    One GCS resumable upload session, sent in `chunk_size` requests. Unlike
+    `Blob.open("wb")`, whose close() commits whatever was written, an
+    unfinished upload can be aborted: `abort` cancels the session, so a
+    partial object never replaces an existing file. Blocking; call from
+    worker threads.
+    """
+
+    def __init__(self, blob, chunk_size: int = UPLOAD_GCS_CHUNK_BYTES):
+        import requests
+
+        self.session_url = blob.create_resumable_upload_session()
+        self.chunk_size = chunk_size
+        # The session URL authorizes the upload by itself
+        self._http = requests.Session()
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        while len(self._buffer) >= self.chunk_size:
+            self._put(bytes(self._buffer[:self.chunk_size]), final=False)
+            del self._buffer[:self.chunk_size]
+
+    def close(self) -> None:
+        """Send what is left and finalize the object."""
+        try:
+            self._put(bytes(self._buffer), final=True)
+        finally:
+            self._http.close()
+
+    def abort(self) -> None:
+        """Cancel the session; GCS discards everything sent so far."""
+        try:
+            self._http.delete(self.session_url, timeout=UPLOAD_GCS_TIMEOUT_SECONDS)
+        finally:
+            self._http.close()
+
+    def _put(self, data: bytes, final: bool) -> None:
+        end = self._offset + len(data)
+        total = str(end) if final else "*"
+        content_range = f"bytes {self._offset}-{end - 1}/{total}" if data else f"bytes */{total}"
+        response = self._http.put(self.session_url, data=data, headers={"Content-Range": content_range},
+                                  timeout=UPLOAD_GCS_TIMEOUT_SECONDS)
+        if final:
+            if response.status_code not in (200, 201):
+                raise RuntimeError(f"GCS upload failed with HTTP {response.status_code}: {response.text[:200]}")
+        else:
+            # 308 with the persisted range; anything short of the whole chunk is a failure
+            persisted = response.headers.get("Range", "")
+            if response.status_code != 308 or not persisted.endswith(f"-{end - 1}"):
+                raise RuntimeError(f"GCS upload chunk failed with HTTP {response.status_code}: {response.text[:200]}")
+        self._offset = end
+
+async def stream_upload(email: str, file: UploadFile, spool_path: str, upload_to_gcs: bool = True) -> dict:
+    """
+    Read an upload once, in fixed-size chunks, and tee it concurrently into a
+    local spool file (for parsing) and a resumable GCS upload, hashing it on
+    the way. Only a few chunks are buffered between the reader and the two
+    writers, so memory use does not grow with the file size.
+
+    A GCS failure does not fail the upload: the spool is still written and
+    the error is returned so the caller can upload from the spool later.
+    """
+    start = time.perf_counter()
+    hasher = hashlib.sha256()
+    size = 0
+
+    spool_queue: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_CHUNKS)
+    gcs_queue: asyncio.Queue = asyncio.Queue(maxsize=UPLOAD_QUEUE_CHUNKS)
+
+    spool_file = await asyncio.to_thread(open, spool_path, "wb")
+    spool_task = asyncio.create_task(_drain(spool_queue, spool_file.write))
+
+    blob = None
+    gcs_writer = None
+    gcs_task = None
+    gcs_error = None
+    if upload_to_gcs:
+        try:
+            blob = await asyncio.to_thread(_new_blob, email, file.filename)
+            gcs_writer = await asyncio.to_thread(_ResumableGCSUpload, blob)
+            gcs_task = asyncio.create_task(_drain(gcs_queue, gcs_writer.write))
+        except Exception as e:
+            gcs_error = str(e)
+
+    public_url = None
+    gcs_done = False
     try:
-        BUCKET_NAME = "documents-vahan" 
-        print(f"Uploading file to bucket: {BUCKET_NAME}")
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(BUCKET_NAME)
-        
-     
-            
-        if not bucket.exists():
-            print(f"Creating bucket: {BUCKET_NAME}")  # Debug print
-            bucket = storage_client.create_bucket(BUCKET_NAME)
-            print(f"Bucket created: {BUCKET_NAME}")  # Debug print
-            time.sleep(2)  # Wait 2 seconds
-
-        print(f"Retrieving bucket: {BUCKET_NAME}")  # Debug print
-        bucket = storage_client.bucket(BUCKET_NAME)  # Retrieve the bucket
-        print(f"Bucket retrieved: {BUCKET_NAME}")  # Debug print
-
-        # Create a unique path for the user's file
-        destination_blob_name = f"{email}/{file.filename}"
-
-        blob = bucket.blob(destination_blob_name)
-
-        # Set metadata for the blob including the contract ID
-        blob.metadata = {
-            "uploaded_by": email,
-            "filename": file.filename,
-            "upload_date": datetime.now().isoformat(),
-        }
-        blob.upload_from_file(file.file)
-
-        # Store contract metadata in Firestore for easy access
-
-        return {
-            "public_url": blob.public_url,
-            "message": "Document uploaded successfully!"
-        }
-    except Exception as e:
-        print(f"Error in uploading document: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error uploading PDF: {e}")
+        while True:
+            chunk = await file.read(UPLOAD_READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+            if not await _put(spool_queue, chunk, spool_task):
+                break
+            if gcs_task is not None and not gcs_task.done():
+                await _put(gcs_queue, chunk, gcs_task)
+        await _put(spool_queue, None, spool_task)
+        if gcs_task is not None and not gcs_task.done():
+            await _put(gcs_queue, None, gcs_task)
+
+        # Raises if writing the spool failed
+        await spool_task
+
+        if gcs_task is not None:
+            try:
+                await gcs_task
+                await asyncio.to_thread(gcs_writer.close)
+                gcs_done = True
+                public_url = blob.public_url
+            except Exception as e:
+                gcs_error = str(e)
+    finally:
+        spool_task.cancel()
+        await asyncio.to_thread(spool_file.close)
+        # On any error path the GCS writer may still be waiting for chunks
+        if gcs_task is not None and not gcs_task.done():
+            gcs_task.cancel()
+            await asyncio.wait({gcs_task})
+        if gcs_writer is not None and not gcs_done:
+            try:
+                await asyncio.to_thread(gcs_writer.abort)
+            except Exception as e:
+                print(f"Error cancelling GCS upload session: {e}")
+
+    if gcs_error:
+        print(f"Error streaming document to GCS: {gcs_error}")
 
+    return {
+        "public_url": public_url,
+        "sha256": hasher.hexdigest(),
+        "size": size,
+        "seconds": time.perf_counter() - start,
+        "gcs_error": gcs_error,
+    }
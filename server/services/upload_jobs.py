@@ -0,0 +1,349 @@
+from typing import Dict, Any, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from storage.redis import redis_client, async_redis_client
+from services.upload import upload_local_file, download_to_local_file
+from services.parser import iter_document_pages, count_pages, summarize_pages, get_mime_type
+from services.knowledge import index_chunks, document_id
+from services.chunking import chunk_pages, get_chunking_settings
+from utils.config import (
+    UPLOAD_SPOOL_DIR,
+    UPLOAD_WORKERS,
+    UPLOAD_JOB_LEASE_SECONDS,
+    UPLOAD_JOB_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "upload_jobs:queue"
+PROCESSING_KEY = "upload_jobs:processing"
+
+# Stages run in this order; each one persists its output so a job can resume after it.
+# "ingest" pipelines parse -> chunk -> embed so early pages are embedded while later ones are OCR'd.
+STAGES = ["store", "ingest"]
+
+# Stages recorded by jobs queued before parse/chunk/embed were pipelined
+LEGACY_STAGES = {"parse": "store", "chunk": "store", "embed": "ingest"}
+
+
+def job_key(job_id: str) -> str:
+    return f"upload_job:{job_id}"
+
+
+def job_dir(job_id: str) -> str:
+    return os.path.join(UPLOAD_SPOOL_DIR, job_id)
+
+
+def _decode(raw: Dict[bytes, bytes]) -> Dict[str, str]:
+    return {k.decode(): v.decode() for k, v in raw.items()}
+
+
+async def create_job(user_id: str, filename: str) -> str:
+    """Register a new job and return its id; the caller writes the file to `source_path` and then calls `enqueue_job`."""
+    job_id = str(uuid.uuid4())
+    os.makedirs(job_dir(job_id), exist_ok=True)
+    await async_redis_client.hset(job_key(job_id), mapping={
+        "job_id": job_id,
+        "user_id": user_id,
+        "filename": filename,
+        "status": "receiving",
+        "stage": "receiving",
+        "completed_stage": "",
+        "pages_total": 0,
+        "pages_parsed": 0,
+        "chunks_total": 0,
+        "chunks_embedded": 0,
+        "timings": json.dumps({}),
+        "created_at": time.time(),
+        "heartbeat": time.time(),
+    })
+    await async_redis_client.expire(job_key(job_id), UPLOAD_JOB_TTL_SECONDS)
+    return job_id
+
+
+def source_path(job_id: str, filename: str) -> str:
+    """Where the uploaded file for a job is spooled; keeps the extension for MIME detection."""
+    return os.path.join(job_dir(job_id), "source" + os.path.splitext(filename)[1].lower())
+
+
+async def enqueue_job(job_id: str, upload: Optional[Dict[str, Any]] = None) -> None:
+    """Queue a job once its file is spooled; `upload` is the result of `stream_upload`."""
+    fields = {"status": "queued", "stage": "queued"}
+    if upload:
+        fields.update({
+            "sha256": upload["sha256"],
+            "size": upload["size"],
+            "timings": json.dumps({"receive_seconds": upload["seconds"]}),
+        })
+        if upload.get("public_url"):
+            # Already streamed to GCS while receiving
+            fields.update({"public_url": upload["public_url"], "completed_stage": "store"})
+    await async_redis_client.hset(job_key(job_id), mapping=fields)
+    await async_redis_client.lpush(QUEUE_KEY, job_id)
+
+
+async def discard_job(job_id: str, error: str) -> None:
+    """Mark a job that never made it onto the queue as failed and remove its spool directory."""
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    try:
+        await async_redis_client.hset(job_key(job_id), mapping={"status": "failed", "stage": "receiving", "error": error})
+    except Exception as e:
+        logger.error(f"Error marking upload job {job_id} as failed: {e}")
+
+
+async def get_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """Public view of a job: stage, progress and timings."""
+    raw = await async_redis_client.hgetall(job_key(job_id))
+    if not raw:
+        return None
+    job = _decode(raw)
+    chunks_total = int(job.get("chunks_total", 0))
+    chunks_embedded = int(job.get("chunks_embedded", 0))
+    return {
+        "job_id": job_id,
+        "user_id": job.get("user_id"),
+        "filename": job.get("filename"),
+        "status": job.get("status"),
+        "stage": job.get("stage"),
+        "pages_total": int(job.get("pages_total", 0)),
+        "pages_parsed": int(job.get("pages_parsed", 0)),
+        "chunks_total": chunks_total,
+        "chunks_embedded": chunks_embedded,
+        "chunks_unchanged": int(job.get("chunks_unchanged", 0)),
+        "vectors_deleted": int(job.get("vectors_deleted", 0)),
+        "percent_embedded": 100.0 * chunks_embedded / chunks_total if chunks_total else 0.0,
+        "public_url": job.get("public_url"),
+        "sha256": job.get("sha256"),
+        "parse_report": json.loads(job["parse_report"]) if job.get("parse_report") else None,
+        "size": int(job["size"]) if job.get("size") else None,
+        "timings": json.loads(job.get("timings", "{}")),
+        "error": job.get("error"),
+    }
+
+
+class UploadJobWorker:
+    """
+    Processes upload jobs from a Redis queue.
+
+    Each job runs the store (GCS) and ingest (parse -> chunk -> embed)
+    stages. Every stage writes its output to the GCS or the job hash and
+    records itself as `completed_stage`, so a job picked up again after a
+    restart skips straight to the first unfinished stage. Jobs move from the
+    queue to a processing list while running and keep a heartbeat; a
+    recovery task puts jobs with a stale heartbeat back on the queue. On
+    shutdown a job is handed back once its current stage's thread returns.
+    Within ingest, embedded chunks are recorded batch by batch, so a resumed
+    job only embeds the chunks that had not been upserted yet.
+    """
+
+    def __init__(self, num_workers: int = UPLOAD_WORKERS, lease_seconds: int = UPLOAD_JOB_LEASE_SECONDS):
+        self.num_workers = num_workers
+        self.lease_seconds = lease_seconds
+        self._tasks = []
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        os.makedirs(UPLOAD_SPOOL_DIR, exist_ok=True)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.num_workers)]
+        self._tasks.append(asyncio.create_task(self._recover_loop()))
+        logger.info(f"Started {self.num_workers} upload job workers")
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job_id = await async_redis_client.blmove(QUEUE_KEY, PROCESSING_KEY, 5, "RIGHT", "LEFT")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reading upload queue: {e}")
+                await asyncio.sleep(1)
+                continue
+            if job_id is None:
+                continue
+
+            job_id = job_id.decode()
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                await self._process(job_id)
+            except asyncio.CancelledError:
+                # Shutting down mid-job: hand it back so the next worker resumes it
+                await async_redis_client.lrem(PROCESSING_KEY, 0, job_id)
+                await async_redis_client.rpush(QUEUE_KEY, job_id)
+                raise
+            finally:
+                heartbeat.cancel()
+            await async_redis_client.lrem(PROCESSING_KEY, 0, job_id)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        # A missed beat must not end the loop, or the job is recovered while still running
+        while True:
+            try:
+                await async_redis_client.hset(job_key(job_id), "heartbeat", time.time())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error sending heartbeat for upload job {job_id}: {e}")
+            await asyncio.sleep(self.lease_seconds / 4)
+
+    async def _recover_loop(self) -> None:
+        """Requeue jobs whose worker stopped sending heartbeats (e.g. it was restarted)."""
+        while True:
+            try:
+                await self.recover_abandoned_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error recovering upload jobs: {e}")
+            await asyncio.sleep(self.lease_seconds / 2)
+
+    async def recover_abandoned_jobs(self) -> int:
+        recovered = 0
+        now = time.time()
+        for raw_id in await async_redis_client.lrange(PROCESSING_KEY, 0, -1):
+            job_id = raw_id.decode()
+            heartbeat = await async_redis_client.hget(job_key(job_id), "heartbeat")
+            if heartbeat is not None and now - float(heartbeat) < self.lease_seconds:
+                continue
+            # Only the worker that removes the entry requeues it
+            if await async_redis_client.lrem(PROCESSING_KEY, 1, job_id):
+                await async_redis_client.rpush(QUEUE_KEY, job_id)
+                recovered += 1
+                logger.warning(f"Requeued abandoned upload job {job_id}")
+        return recovered
+
+    async def _process(self, job_id: str) -> None:
+        raw = await async_redis_client.hgetall(job_key(job_id))
+        if not raw:
+            logger.warning(f"Upload job {job_id} has no state; skipping")
+            return
+        job = _decode(raw)
+        if job.get("status") in ("done", "failed"):
+            return
+
+        completed = LEGACY_STAGES.get(job.get("completed_stage", ""), job.get("completed_stage", ""))
+        start_index = STAGES.index(completed) + 1 if completed in STAGES else 0
+        timings = json.loads(job.get("timings", "{}"))
+
+        try:
+            for stage in STAGES[start_index:]:
+                await async_redis_client.hset(job_key(job_id), mapping={"status": "running", "stage": stage})
+                stage_start = time.time()
+                stage_task = asyncio.ensure_future(asyncio.to_thread(getattr(self, f"_stage_{stage}"), job_id, job))
+                try:
+                    await asyncio.shield(stage_task)
+                except asyncio.CancelledError:
+                    # The thread cannot be stopped: let the stage finish before the job is
+                    # handed back, so no other worker runs it at the same time
+                    await asyncio.wait({stage_task})
+                    if stage_task.exception() is None:
+                        await self._complete_stage(job_id, stage, timings, stage_start)
+                    raise
+                await self._complete_stage(job_id, stage, timings, stage_start)
+
+            timings["total_seconds"] = time.time() - float(job["created_at"])
+            await async_redis_client.hset(job_key(job_id), mapping={
+                "status": "done",
+                "stage": "done",
+                "timings": json.dumps(timings),
+            })
+            shutil.rmtree(job_dir(job_id), ignore_errors=True)
+        except Exception as e:
+            logger.error(f"Upload job {job_id} failed: {e}")
+            await async_redis_client.hset(job_key(job_id), mapping={
+                "status": "failed",
+                "error": str(getattr(e, "detail", e)),
+                "timings": json.dumps(timings),
+            })
+
+    async def _complete_stage(self, job_id: str, stage: str, timings: Dict[str, float], stage_start: float) -> None:
+        timings[f"{stage}_seconds"] = time.time() - stage_start
+        await async_redis_client.hset(job_key(job_id), mapping={
+            "completed_stage": stage,
+            "timings": json.dumps(timings),
+        })
+
+    # Stages run in worker threads; each persists its output before returning
+
+    def _stage_store(self, job_id: str, job: Dict[str, str]) -> None:
+        # Only runs when streaming to GCS during the upload request failed
+        path = source_path(job_id, job["filename"])
+        if not os.path.exists(path):
+            # There is no GCS copy yet, so only the receiving host can finish this job
+            raise RuntimeError("Source file is not on this host and was never stored in GCS; please upload it again")
+        result = upload_local_file(job["user_id"], job["filename"], path)
+        redis_client.hset(job_key(job_id), "public_url", result["public_url"])
+
+    def _fetch_source(self, job_id: str, job: Dict[str, str]) -> str:
+        """
+        Local path of the job's file. A recovered job may run on a host other
+        than the one that spooled it, so a missing spool is restored from GCS.
+        """
+        path = source_path(job_id, job["filename"])
+        if os.path.exists(path):
+            return path
+        logger.info(f"Spool for upload job {job_id} is not on this host; fetching it from GCS")
+        os.makedirs(job_dir(job_id), exist_ok=True)
+        download_to_local_file(job["user_id"], job["filename"], path)
+        if job.get("sha256"):
+            # The object is keyed by filename, so a later upload may have replaced it
+            hasher = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    hasher.update(block)
+            if hasher.hexdigest() != job["sha256"]:
+                os.remove(path)
+                raise RuntimeError("Stored copy of the file has changed since this upload; please upload it again")
+        return path
+
+    def _stage_ingest(self, job_id: str, job: Dict[str, str]) -> None:
+        path = self._fetch_source(job_id, job)
+        pages = []
+        redis_client.hset(job_key(job_id), mapping={
+            "pages_total": count_pages(path) or 1,
+            "pages_parsed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+        })
+
+        def page_stream():
+            # Pages arrive in order as parsing/OCR finishes and are chunked straight away
+            for page in iter_document_pages(path, file_hash=job.get("sha256")):
+                pages.append(page)
+                redis_client.hset(job_key(job_id), "pages_parsed", len(pages))
+                yield page
+
+        def progress(embedded: int, total: int) -> None:
+            redis_client.hset(job_key(job_id), mapping={
+                "chunks_embedded": embedded,
+                "chunks_total": total,
+                "heartbeat": time.time(),
+            })
+
+        # Re-uploading a file with the same name replaces that document; unchanged chunks are skipped
+        chunks = chunk_pages(page_stream(), get_chunking_settings(job["user_id"]))
+        result = index_chunks(job["user_id"], chunks, progress_callback=progress,
+                              doc_id=document_id(job["user_id"], job["filename"]), incremental=True)
+        redis_client.hset(job_key(job_id), mapping={
+            "chunks_total": result["chunks_total"],
+            "chunks_embedded": result["chunks_total"],
+            "chunks_unchanged": result["chunks_unchanged"],
+            "vectors_deleted": result["vectors_deleted"],
+            "parse_report": json.dumps(summarize_pages(get_mime_type(path), pages)),
+        })
+
+
+# Global upload job worker instance
+upload_job_worker = UploadJobWorker()
@@ -0,0 +1,48 @@
+from typing import Any, Dict, Optional
+import json
+from storage.redis import async_redis_client
+
+# Set by scripts/warm_user_index.py once every existing user is in the index
+WARMED_KEY = "user_email:warmed"
+
+# Only what login needs; the Firestore document stays the source of truth
+INDEXED_FIELDS = ("user_id", "email", "name", "password_hash")
+
+
+def user_email_key(email: str) -> str:
+    return f"user_email:{email}"
+
+
+def index_record(user_doc: Dict[str, Any]) -> str:
+    return json.dumps({field: user_doc.get(field) for field in INDEXED_FIELDS})
+
+
+async def get_indexed_user(email: str) -> Optional[Dict[str, Any]]:
+    """The indexed record for an email, or None on a miss."""
+    raw = await async_redis_client.get(user_email_key(email))
+    return json.loads(raw) if raw else None
+
+
+async def cache_user(user_doc: Dict[str, Any]) -> None:
+    """Write-through after a Firestore lookup or write."""
+    await async_redis_client.set(user_email_key(user_doc["email"]), index_record(user_doc))
+
+
+async def claim_email(user_doc: Dict[str, Any]) -> bool:
+    """
+    Atomically reserve an email for a new user (SET NX). Exactly one of any
+    number of concurrent signups for the same email gets True.
+    """
+    return bool(await async_redis_client.set(user_email_key(user_doc["email"]), index_record(user_doc), nx=True))
+
+
+async def release_email(email: str, user_id: str) -> None:
+    """Undo a claim whose signup failed, unless another user owns the entry by now."""
+    record = await get_indexed_user(email)
+    if record and record.get("user_id") == user_id:
+        await async_redis_client.delete(user_email_key(email))
+
+
+async def index_is_complete() -> bool:
+    """True once the index was bulk-loaded, so a miss means the email is not registered."""
+    return bool(await async_redis_client.exists(WARMED_KEY))
@@ -1,14 +1,28 @@
-from google.cloud import firestore
 import os
 from dotenv import load_dotenv
+from utils.lazy import LazyProxy
 
 load_dotenv()
 
-def get_async_database():
+def _build_async_client():
+    from google.cloud import firestore
     try:
-       db=firestore.Client.from_service_account_json(os.getenv("FIRESTORE_ACCOUNT_KEY_FILE"))
+       db = firestore.AsyncClient.from_service_account_json(os.getenv("FIRESTORE_ACCOUNT_KEY_FILE"))
        print("Connected to firestore database successfully")
        return db
     except Exception as e:
         print("Error connecting to database")
-        raise e
\ No newline at end of file
+        raise e
+
+def get_async_database():
+    """The process-wide Firestore AsyncClient; use it from the server's event loop."""
+    return async_db.resolve()
+
+def get_database():
+    """A blocking Firestore client, for scripts that run outside the server's event loop."""
+    from google.cloud import firestore
+    return firestore.Client.from_service_account_json(os.getenv("FIRESTORE_ACCOUNT_KEY_FILE"))
+
+
+# Built once, on first use, and shared by every request (its gRPC channel pools connections)
+async_db = LazyProxy(_build_async_client, "firestore")
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any
+import hashlib
+import logging
+import threading
+import time
+import numpy as np
+from storage.redis import redis_client
+from utils.config import (
+    EMBEDDING_CACHE_LOCAL_SIZE,
+    EMBEDDING_CACHE_TTL_SECONDS,
+    EMBEDDING_CACHE_REDIS_MAX_ENTRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for text embeddings.
+
+    Entries are keyed by a SHA-256 of the model, task type and text. The first
+    tier is a bounded in-process LRU; the second is Redis, where vectors are
+    stored as raw float32 bytes with a TTL. A sorted set tracks last access
+    time so the Redis tier can be trimmed to a fixed number of entries.
+    """
+
+    KEY_PREFIX = "emb:"
+    INDEX_KEY = "emb:index"
+
+    def __init__(self,
+                 local_size: int = EMBEDDING_CACHE_LOCAL_SIZE,
+                 ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS,
+                 redis_max_entries: int = EMBEDDING_CACHE_REDIS_MAX_ENTRIES):
+        self.local_size = local_size
+        self.ttl_seconds = ttl_seconds
+        self.redis_max_entries = redis_max_entries
+        self._local: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.api_seconds = 0.0
+
+    @staticmethod
+    def make_key(text: str, model: str, task_type: str) -> str:
+        """Build the content-hash key for a text."""
+        digest = hashlib.sha256(f"{model}\x00{task_type}\x00{text}".encode("utf-8")).hexdigest()
+        return digest
+
+    def _local_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            embedding = self._local.get(key)
+            if embedding is not None:
+                self._local.move_to_end(key)
+            return embedding
+
+    def _local_put(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._local[key] = embedding
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Look up keys in the local tier, then fetch the remainder from Redis in one round trip."""
+        results: List[Optional[List[float]]] = [self._local_get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(results) if embedding is None]
+        local_hits = len(keys) - len(missing)
+
+        redis_hits = 0
+        if missing:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.mget([self.KEY_PREFIX + keys[i] for i in missing])
+                # Refresh access time only for members that already exist
+                pipe.zadd(self.INDEX_KEY, {keys[i]: time.time() for i in missing}, xx=True)
+                raw_values = pipe.execute()[0]
+
+                for i, raw in zip(missing, raw_values):
+                    if raw is None:
+                        continue
+                    embedding = np.frombuffer(raw, dtype=np.float32).tolist()
+                    results[i] = embedding
+                    self._local_put(keys[i], embedding)
+                    redis_hits += 1
+            except Exception as e:
+                logger.warning(f"Embedding cache Redis lookup failed: {e}")
+
+        with self._lock:
+            self.local_hits += local_hits
+            self.redis_hits += redis_hits
+            self.misses += len(missing) - redis_hits
+
+        return results
+
+    def put_many(self, keys: List[str], embeddings: List[List[float]], api_seconds: float = 0.0) -> None:
+        """Store freshly computed embeddings in both tiers."""
+        with self._lock:
+            self.api_seconds += api_seconds
+
+        for key, embedding in zip(keys, embeddings):
+            self._local_put(key, embedding)
+
+        try:
+            now = time.time()
+            pipe = redis_client.pipeline(transaction=False)
+            for key, embedding in zip(keys, embeddings):
+                pipe.set(self.KEY_PREFIX + key,
+                         np.asarray(embedding, dtype=np.float32).tobytes(),
+                         ex=self.ttl_seconds)
+            pipe.zadd(self.INDEX_KEY, {key: now for key in keys})
+            pipe.zcard(self.INDEX_KEY)
+            size = pipe.execute()[-1]
+
+            if size > self.redis_max_entries:
+                self._evict(size - self.redis_max_entries)
+        except Exception as e:
+            logger.warning(f"Embedding cache Redis write failed: {e}")
+
+    def _evict(self, count: int) -> None:
+        """Drop the least recently used Redis entries."""
+        evicted = redis_client.zpopmin(self.INDEX_KEY, count)
+        if evicted:
+            redis_client.delete(*[self.KEY_PREFIX + member.decode() for member, _ in evicted])
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and the estimated API time saved by cache hits."""
+        with self._lock:
+            hits = self.local_hits + self.redis_hits
+            lookups = hits + self.misses
+            avg_miss_seconds = self.api_seconds / self.misses if self.misses else 0.0
+            return {
+                "local_hits": self.local_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "local_entries": len(self._local),
+                "avg_miss_latency_seconds": avg_miss_seconds,
+                "estimated_seconds_saved": hits * avg_miss_seconds,
+            }
+
+
+# Global cache instance
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,29 @@
+import threading
+import time
+from utils.config import GCS_BUCKET_NAME
+from utils.lazy import LazyProxy
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+def _build_storage_client():
+    from google.cloud import storage
+    return storage.Client()
+
+def get_bucket():
+    """The documents bucket, created if missing; existence is checked once per process."""
+    global _bucket
+    if _bucket is None:
+        with _bucket_lock:
+            if _bucket is None:
+                bucket = storage_client.bucket(GCS_BUCKET_NAME)
+                if not bucket.exists():
+                    print(f"Creating bucket: {GCS_BUCKET_NAME}")
+                    bucket = storage_client.create_bucket(GCS_BUCKET_NAME)
+                    time.sleep(2)  # Wait for the new bucket to become usable
+                _bucket = bucket
+    return _bucket
+
+
+# Shared by all upload and listing threads instead of one client per request
+storage_client = LazyProxy(_build_storage_client, "gcs")
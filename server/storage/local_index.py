@@ -0,0 +1,793 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import quote, unquote
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import numpy as np
+from utils.config import (
+    LOCAL_INDEX_QUANTIZE,
+    LOCAL_INDEX_IVF_THRESHOLD,
+    LOCAL_INDEX_IVF_NPROBE,
+    LOCAL_INDEX_FLUSH_SECONDS,
+    LOCAL_HOT_NAMESPACES,
+    LOCAL_HOT_QUERY_THRESHOLD,
+    LOCAL_HOT_WINDOW_SECONDS,
+    LOCAL_HOT_TTL_SECONDS,
+    LOCAL_HOT_HYDRATE_ATTEMPTS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix multiply, so int8 rows are only upcast a block at a time
+_SCORE_BLOCK_ROWS = 65536
+
+
+def _normalize(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float32)
+    if values.ndim == 1:
+        values = values[None, :]
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    return values / np.maximum(norms, 1e-12)
+
+
+def _compare(value: Any, condition: Any) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq" and not value == operand:
+            return False
+        if op == "$ne" and not value != operand:
+            return False
+        if op == "$in" and value not in operand:
+            return False
+        if op == "$nin" and value in operand:
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if op == "$gt" and not value > operand:
+                return False
+            if op == "$gte" and not value >= operand:
+                return False
+            if op == "$lt" and not value < operand:
+                return False
+            if op == "$lte" and not value <= operand:
+                return False
+    return True
+
+
+def matches_filter(metadata: Optional[Dict[str, Any]], filter: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Pinecone-style metadata filter ($eq/$ne/$in/$nin/$gt/$gte/$lt/$lte, $and/$or)."""
+    if not filter:
+        return True
+    metadata = metadata or {}
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if isinstance(value, list) and not isinstance(condition, dict):
+                if condition not in value:
+                    return False
+            elif not _compare(value, condition):
+                return False
+    return True
+
+
+class _Namespace:
+    """
+    Vectors of one namespace in contiguous arrays.
+
+    Rows are unit-normalized so cosine similarity is a dot product. With
+    quantization each row is stored as int8 with a per-row scale (4x less
+    memory). Deleted rows are tombstoned and compacted away once they make
+    up a quarter of the array.
+    """
+
+    def __init__(self, dimension: int, quantize: bool):
+        self.dimension = dimension
+        self.quantize = quantize
+        self.vectors = np.zeros((0, dimension), dtype=np.int8 if quantize else np.float32)
+        self.scales = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.ids: List[Optional[str]] = []
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.rows: Dict[str, int] = {}
+        self.size = 0
+        self.dead = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.ivf_size = 0
+        # Bumped whenever rows move, so an IVF built from an older layout is discarded
+        self.epoch = 0
+        # Rows written while an IVF is being built in the background; None when no build runs
+        self.ivf_pending_rows: Optional[set] = None
+        self.dirty = False
+        self.loaded_at = time.time()
+
+    @property
+    def count(self) -> int:
+        return len(self.rows)
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.size + extra
+        if needed <= len(self.vectors) and self.vectors.flags.writeable:
+            return
+        capacity = max(needed, 2 * len(self.vectors), 64)
+        vectors = np.zeros((capacity, self.dimension), dtype=self.vectors.dtype)
+        vectors[:self.size] = self.vectors[:self.size]
+        self.vectors = vectors
+        for name, dtype in (("scales", np.float32), ("alive", bool), ("assignments", np.int32)):
+            grown = np.zeros(capacity, dtype=dtype)
+            grown[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, grown)
+
+    def _encode(self, normalized: np.ndarray) -> tuple:
+        if not self.quantize:
+            return normalized, np.ones(len(normalized), dtype=np.float32)
+        scales = np.maximum(np.abs(normalized).max(axis=1), 1e-12) / 127.0
+        return np.round(normalized / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def decode(self, row: int) -> List[float]:
+        return (self.vectors[row].astype(np.float32) * self.scales[row]).tolist()
+
+    def upsert(self, items: List[Dict[str, Any]]) -> int:
+        if not items:
+            return 0
+        encoded, scales = self._encode(_normalize([item["values"] for item in items]))
+        self._reserve(len(items))
+        for item, vector, scale in zip(items, encoded, scales):
+            vector_id = str(item["id"])
+            row = self.rows.get(vector_id)
+            if row is None:
+                row = self.size
+                self.size += 1
+                self.ids.append(vector_id)
+                self.metadata.append(None)
+                self.rows[vector_id] = row
+                self.alive[row] = True
+            self.vectors[row] = vector
+            self.scales[row] = scale
+            self.metadata[row] = dict(item.get("metadata") or {})
+            if self.centroids is not None:
+                self.assignments[row] = int(np.argmax(self.centroids @ self._float_rows(row, row + 1)[0]))
+            if self.ivf_pending_rows is not None:
+                self.ivf_pending_rows.add(row)
+        self.dirty = True
+        return len(items)
+
+    def delete(self, ids: List[str]) -> int:
+        deleted = 0
+        for vector_id in ids:
+            row = self.rows.pop(str(vector_id), None)
+            if row is None:
+                continue
+            self.alive[row] = False
+            self.ids[row] = None
+            self.metadata[row] = None
+            self.dead += 1
+            deleted += 1
+        if deleted:
+            self.dirty = True
+        if self.dead > 1024 and self.dead * 4 > self.size:
+            self.compact()
+        return deleted
+
+    def compact(self) -> None:
+        keep = np.flatnonzero(self.alive[:self.size])
+        self.vectors = np.ascontiguousarray(self.vectors[keep])
+        self.scales = self.scales[keep].copy()
+        self.assignments = self.assignments[keep].copy()
+        self.alive = np.ones(len(keep), dtype=bool)
+        self.ids = [self.ids[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        self.rows = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.size = len(keep)
+        self.dead = 0
+        self.epoch += 1
+        self.dirty = True
+
+    def _float_rows(self, start: int, end: int) -> np.ndarray:
+        block = self.vectors[start:end]
+        if self.quantize:
+            return block.astype(np.float32) * self.scales[start:end, None]
+        return block
+
+    def _scores(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine scores of queries against all rows (or the given rows), computed block by block."""
+        if rows is not None:
+            block = self.vectors[rows]
+            if self.quantize:
+                block = block.astype(np.float32) * self.scales[rows, None]
+            return queries @ block.T
+        scores = np.empty((len(queries), self.size), dtype=np.float32)
+        for start in range(0, self.size, _SCORE_BLOCK_ROWS):
+            end = min(start + _SCORE_BLOCK_ROWS, self.size)
+            scores[:, start:end] = queries @ self._float_rows(start, end).T
+        return scores
+
+    def needs_ivf(self, ivf_threshold: int) -> bool:
+        """True when the namespace is large enough for IVF and has none, or has outgrown it."""
+        return self.count >= ivf_threshold and (self.centroids is None or self.count > 2 * self.ivf_size)
+
+    def ivf_snapshot(self) -> tuple:
+        """
+        Everything an IVF build needs, taken under the index lock: the layout
+        epoch, the row count, the current arrays and a copied training sample.
+        Rows written from now on are tracked in `ivf_pending_rows`.
+        """
+        live = np.flatnonzero(self.alive[:self.size])
+        nlist = int(min(4096, max(16, np.sqrt(len(live))), len(live)))
+        rng = np.random.default_rng(0)
+        sample = np.sort(live[rng.choice(len(live), size=min(len(live), nlist * 64), replace=False)])
+        data = self.vectors[sample].astype(np.float32)
+        if self.quantize:
+            data = _normalize(data * self.scales[sample, None])
+        self.ivf_pending_rows = set()
+        return self.epoch, self.size, self.vectors, self.scales, data, nlist
+
+    @staticmethod
+    def train_ivf(data: np.ndarray, nlist: int, vectors: np.ndarray, scales: np.ndarray,
+                  size: int, quantize: bool) -> tuple:
+        """Spherical k-means into `nlist` inverted lists, then assign rows [0, size); runs without the lock."""
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+        for _ in range(10):
+            labels = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[labels == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+        assignments = np.zeros(size, dtype=np.int32)
+        for start in range(0, size, _SCORE_BLOCK_ROWS):
+            end = min(start + _SCORE_BLOCK_ROWS, size)
+            block = vectors[start:end]
+            if quantize:
+                block = block.astype(np.float32) * scales[start:end, None]
+            assignments[start:end] = np.argmax(block @ centroids.T, axis=1)
+        return centroids, assignments
+
+    def install_ivf(self, epoch: int, size: int, centroids: np.ndarray, assignments: np.ndarray) -> bool:
+        """Swap in a background-built IVF under the index lock; False if rows moved meanwhile."""
+        pending = self.ivf_pending_rows or set()
+        self.ivf_pending_rows = None
+        if epoch != self.epoch:
+            return False
+        full = np.zeros(len(self.vectors), dtype=np.int32)
+        full[:size] = assignments
+        # Rows written during the build were assigned to the old centroids (or none)
+        for row in pending | set(range(size, self.size)):
+            full[row] = int(np.argmax(centroids @ self._float_rows(row, row + 1)[0]))
+        self.centroids = centroids
+        self.assignments = full
+        self.ivf_size = self.count
+        return True
+
+    def search(self, queries: np.ndarray, top_k: int, filter: Optional[Dict[str, Any]],
+               ivf_threshold: int, nprobe: int) -> List[List[tuple]]:
+        """
+        Top-k (row, score) per query: exact for small namespaces, IVF for large
+        ones once their lists are built (exact until then).
+        """
+        if self.count == 0:
+            return [[] for _ in queries]
+
+        allowed = self.alive[:self.size].copy()
+        if filter:
+            allowed &= np.fromiter((matches_filter(m, filter) for m in self.metadata[:self.size]),
+                                   dtype=bool, count=self.size)
+
+        use_ivf = self.count >= ivf_threshold and self.centroids is not None
+        results = []
+        if not use_ivf:
+            scores = self._scores(queries)
+            scores[:, ~allowed] = -np.inf
+            for row_scores in scores:
+                results.append(self._top(row_scores, np.arange(self.size), top_k))
+            return results
+
+        probe = min(nprobe, len(self.centroids))
+        for query in queries:
+            lists = np.argpartition(-(self.centroids @ query), probe - 1)[:probe]
+            candidates = np.flatnonzero(np.isin(self.assignments[:self.size], lists) & allowed)
+            if len(candidates) < top_k:
+                # Too few candidates in the probed lists (e.g. a selective filter): fall back to exact
+                candidates = np.flatnonzero(allowed)
+            scores = self._scores(query[None, :], candidates)[0]
+            results.append(self._top(scores, candidates, top_k))
+        return results
+
+    @staticmethod
+    def _top(scores: np.ndarray, rows: np.ndarray, top_k: int) -> List[tuple]:
+        valid = np.isfinite(scores)
+        if not valid.all():
+            scores, rows = scores[valid], rows[valid]
+        if len(scores) == 0:
+            return []
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    # Persistence: vectors.npy (+ scales.npy) memory-mapped on load, meta.json for ids and metadata
+
+    def save(self, directory: str) -> None:
+        if self.dead:
+            self.compact()
+        os.makedirs(directory, exist_ok=True)
+        files = {"vectors.npy": self.vectors[:self.size], "scales.npy": self.scales[:self.size]}
+        for name, array in files.items():
+            tmp = os.path.join(directory, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(directory, name))
+        tmp = os.path.join(directory, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids[:self.size], "metadata": self.metadata[:self.size],
+                       "quantize": self.quantize, "saved_at": time.time()}, f)
+        os.replace(tmp, os.path.join(directory, "meta.json"))
+        self.dirty = False
+
+    @classmethod
+    def load(cls, directory: str, dimension: int) -> Optional["_Namespace"]:
+        try:
+            with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            # Copy-on-write maps: vectors are paged in from disk on demand
+            vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="c")
+            scales = np.load(os.path.join(directory, "scales.npy"), mmap_mode="c")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load local index namespace at {directory}: {e}")
+            return None
+        if len(vectors) != len(meta["ids"]) or vectors.shape[1:] != (dimension,):
+            logger.warning(f"Local index namespace at {directory} is inconsistent; ignoring it")
+            return None
+
+        namespace = cls(dimension, meta.get("quantize", False))
+        namespace.vectors = vectors
+        namespace.scales = scales
+        namespace.size = len(vectors)
+        namespace.alive = np.ones(namespace.size, dtype=bool)
+        namespace.assignments = np.zeros(namespace.size, dtype=np.int32)
+        namespace.ids = list(meta["ids"])
+        namespace.metadata = list(meta["metadata"])
+        namespace.rows = {vector_id: row for row, vector_id in enumerate(namespace.ids)}
+        namespace.epoch += 1
+        namespace.loaded_at = meta.get("saved_at", time.time())
+        return namespace
+
+
+class LocalVectorIndex:
+    """
+    In-process vector index with the subset of the Pinecone `Index` API the
+    app uses: `query`, `upsert`, `delete`, `fetch`, `list`,
+    `describe_namespace` and `describe_index_stats`, with namespaces and
+    metadata filters.
+
+    Each namespace keeps its vectors in a contiguous NumPy array (float32,
+    or int8 with LOCAL_INDEX_QUANTIZE) and answers queries with a batched
+    cosine matrix product; namespaces with at least LOCAL_INDEX_IVF_THRESHOLD
+    vectors switch to an IVF index probing LOCAL_INDEX_IVF_NPROBE lists, built
+    in a background thread and swapped in so queries never wait for it. With
+    a `path`, namespaces are saved as .npy files (at most every
+    LOCAL_INDEX_FLUSH_SECONDS, and on `flush`) and memory-mapped back on
+    first use, so a restart does not have to re-download anything.
+    """
+
+    def __init__(self, name: str, dimension: int = 768, path: Optional[str] = None,
+                 quantize: bool = LOCAL_INDEX_QUANTIZE,
+                 ivf_threshold: int = LOCAL_INDEX_IVF_THRESHOLD,
+                 nprobe: int = LOCAL_INDEX_IVF_NPROBE):
+        self.name = name
+        self.dimension = dimension
+        self.path = path
+        self.quantize = quantize
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+        self._ivf_building: set = set()
+        self._last_flush = time.time()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def _directory(self, namespace: str) -> str:
+        return os.path.join(self.path, quote(namespace, safe="") or "_default")
+
+    def _namespace(self, namespace: str, create: bool = False) -> Optional[_Namespace]:
+        ns = self._namespaces.get(namespace)
+        if ns is None and self.path and os.path.exists(self._directory(namespace)):
+            ns = _Namespace.load(self._directory(namespace), self.dimension)
+            if ns is not None:
+                self._namespaces[namespace] = ns
+        if ns is None and create:
+            ns = self._namespaces[namespace] = _Namespace(self.dimension, self.quantize)
+        return ns
+
+    def has_namespace(self, namespace: str) -> bool:
+        with self._lock:
+            return self._namespace(namespace) is not None
+
+    def namespace_age(self, namespace: str) -> Optional[float]:
+        """Seconds since the namespace was loaded or created, if present."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            return time.time() - ns.loaded_at if ns is not None else None
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "", **kwargs) -> Dict[str, int]:
+        with self._lock:
+            upserted = self._namespace(namespace, create=True).upsert(vectors)
+            self._maybe_flush()
+        return {"upserted_count": upserted}
+
+    def delete(self, ids: Optional[List[str]] = None, delete_all: bool = False, namespace: str = "",
+               filter: Optional[Dict[str, Any]] = None, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            if delete_all:
+                self.drop_namespace(namespace, remove_files=True)
+                return {}
+            ns = self._namespace(namespace)
+            if ns is None:
+                return {}
+            if filter:
+                ids = [ns.ids[row] for row in range(ns.size)
+                       if ns.alive[row] and matches_filter(ns.metadata[row], filter)]
+            ns.delete(ids or [])
+            self._maybe_flush()
+        return {}
+
+    def drop_namespace(self, namespace: str, remove_files: bool = False) -> None:
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+            if remove_files and self.path:
+                shutil.rmtree(self._directory(namespace), ignore_errors=True)
+
+    def query(self, vector: Optional[List[float]] = None, top_k: int = 10, namespace: str = "",
+              filter: Optional[Dict[str, Any]] = None, include_metadata: bool = False,
+              include_values: bool = False, id: Optional[str] = None, **kwargs) -> Dict[str, Any]:
+        if vector is None and id is not None:
+            fetched = self.fetch([id], namespace=namespace)["vectors"].get(id)
+            if fetched is None:
+                return {"matches": [], "namespace": namespace}
+            vector = fetched["values"]
+        return self.query_many([vector], top_k=top_k, namespace=namespace, filter=filter,
+                               include_metadata=include_metadata, include_values=include_values)[0]
+
+    def query_many(self, vectors: List[List[float]], top_k: int = 10, namespace: str = "",
+                   filter: Optional[Dict[str, Any]] = None, include_metadata: bool = False,
+                   include_values: bool = False) -> List[Dict[str, Any]]:
+        """Answer several queries against one namespace with a single matrix product."""
+        queries = _normalize(vectors)
+        with self._lock:
+            ns = self._namespace(namespace)
+            if ns is None:
+                return [{"matches": [], "namespace": namespace} for _ in vectors]
+            if ns.needs_ivf(self.ivf_threshold):
+                self._build_ivf_in_background(namespace, ns)
+            results = ns.search(queries, top_k, filter, self.ivf_threshold, self.nprobe)
+            responses = []
+            for hits in results:
+                matches = []
+                for row, score in hits:
+                    match = {"id": ns.ids[row], "score": score}
+                    if include_metadata:
+                        match["metadata"] = dict(ns.metadata[row] or {})
+                    if include_values:
+                        match["values"] = ns.decode(row)
+                    matches.append(match)
+                responses.append({"matches": matches, "namespace": namespace})
+        return responses
+
+    def _build_ivf_in_background(self, namespace: str, ns: _Namespace) -> None:
+        """Start an IVF build for a namespace unless one is running; called with the lock held."""
+        if namespace in self._ivf_building:
+            return
+        self._ivf_building.add(namespace)
+        snapshot = ns.ivf_snapshot()
+        threading.Thread(target=self._build_ivf, args=(namespace, ns, snapshot), daemon=True).start()
+
+    def _build_ivf(self, namespace: str, ns: _Namespace, snapshot: tuple) -> None:
+        # k-means over a large namespace takes seconds; queries keep running (exact or on the old lists)
+        epoch, size, vectors, scales, data, nlist = snapshot
+        start = time.time()
+        try:
+            centroids, assignments = _Namespace.train_ivf(data, nlist, vectors, scales, size, ns.quantize)
+            with self._lock:
+                if self._namespaces.get(namespace) is ns and ns.install_ivf(epoch, size, centroids, assignments):
+                    logger.info(f"Built IVF for namespace {namespace!r} of {self.name} "
+                                f"({ns.count} vectors, {nlist} lists) in {time.time() - start:.1f}s")
+                else:
+                    ns.ivf_pending_rows = None
+        except Exception as e:
+            logger.error(f"Error building IVF for namespace {namespace!r}: {e}")
+            with self._lock:
+                ns.ivf_pending_rows = None
+        finally:
+            with self._lock:
+                self._ivf_building.discard(namespace)
+
+    def fetch(self, ids: List[str], namespace: str = "", **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            ns = self._namespace(namespace)
+            vectors = {}
+            if ns is not None:
+                for vector_id in ids:
+                    row = ns.rows.get(str(vector_id))
+                    if row is not None:
+                        vectors[vector_id] = {"id": vector_id, "values": ns.decode(row),
+                                              "metadata": dict(ns.metadata[row] or {})}
+        return {"vectors": vectors, "namespace": namespace}
+
+    def list(self, namespace: str = "", prefix: str = "", limit: int = 100, **kwargs) -> Iterator[List[str]]:
+        """Pages of vector ids, like Pinecone's `Index.list`."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            ids = [vector_id for vector_id in ns.rows if vector_id.startswith(prefix)] if ns else []
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def describe_index_stats(self, **kwargs) -> Dict[str, Any]:
+        with self._lock:
+            if self.path:
+                for entry in os.listdir(self.path):
+                    name = "" if entry == "_default" else unquote(entry)
+                    self._namespace(name)
+            namespaces = {name: {"vector_count": ns.count} for name, ns in self._namespaces.items() if ns.count}
+        return {
+            "dimension": self.dimension,
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+
+    def describe_namespace(self, namespace: str, **kwargs) -> Dict[str, Any]:
+        """Vector count of one namespace, like Pinecone's `Index.describe_namespace`."""
+        with self._lock:
+            ns = self._namespace(namespace)
+            return {"name": namespace, "record_count": ns.count if ns is not None else 0}
+
+    def _maybe_flush(self) -> None:
+        if self.path and time.time() - self._last_flush >= LOCAL_INDEX_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write changed namespaces to disk."""
+        if not self.path:
+            return
+        with self._lock:
+            for name, ns in list(self._namespaces.items()):
+                if ns.dirty:
+                    if ns.count:
+                        ns.save(self._directory(name))
+                    else:
+                        shutil.rmtree(self._directory(name), ignore_errors=True)
+                        ns.dirty = False
+            self._last_flush = time.time()
+
+
+class TieredIndex:
+    """
+    Serves hot namespaces from a `LocalVectorIndex` in front of Pinecone.
+
+    Queries for a namespace that is resident locally are answered from
+    memory. Other queries go to Pinecone and are counted; a namespace queried
+    LOCAL_HOT_QUERY_THRESHOLD times within LOCAL_HOT_WINDOW_SECONDS is copied
+    into the local index in a background thread. Writes always go to Pinecone
+    and also to the local copy while it is resident, and are announced
+    through `on_change` so other worker processes `invalidate` their copy. A
+    copy that a write or invalidation overlapped is made again before it is
+    served.
+    As a backstop a local copy is re-fetched once it is LOCAL_HOT_TTL_SECONDS
+    old. At most LOCAL_HOT_NAMESPACES are resident; the least recently
+    queried one is dropped first.
+    """
+
+    def __init__(self, remote, local: LocalVectorIndex,
+                 max_namespaces: int = LOCAL_HOT_NAMESPACES,
+                 query_threshold: int = LOCAL_HOT_QUERY_THRESHOLD,
+                 window_seconds: float = LOCAL_HOT_WINDOW_SECONDS,
+                 ttl_seconds: float = LOCAL_HOT_TTL_SECONDS,
+                 hydrate_attempts: int = LOCAL_HOT_HYDRATE_ATTEMPTS,
+                 on_change: Optional[Callable[[str], None]] = None):
+        self.remote = remote
+        self.local = local
+        self.max_namespaces = max_namespaces
+        self.query_threshold = query_threshold
+        self.window_seconds = window_seconds
+        self.ttl_seconds = ttl_seconds
+        self.hydrate_attempts = hydrate_attempts
+        self._resident: "OrderedDict[str, float]" = OrderedDict()
+        self._heat: Dict[str, List[float]] = {}
+        # Namespace -> writes seen since its current copy attempt started
+        self._hydrating: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.on_change = on_change
+        self.local_queries = 0
+        self.remote_queries = 0
+        self.hydrations = 0
+        self.invalidations = 0
+
+        # Namespaces saved by a previous run are resident again until their TTL runs out
+        self._restore()
+
+    def _restore(self) -> None:
+        """
+        Reopen the local copies a previous process left in this tier. A copy
+        is only trusted while its vector count still matches Pinecone; an
+        interrupted copy or one that missed changes while no process was
+        listening is removed and hydrated again when it gets hot.
+        """
+        from storage.pinecone import namespace_vector_count
+
+        for name, summary in self.local.describe_index_stats()["namespaces"].items():
+            age = self.local.namespace_age(name)
+            try:
+                current = age is not None and age < self.ttl_seconds and \
+                    namespace_vector_count(self.remote, name) == summary["vector_count"]
+            except Exception as e:
+                logger.warning(f"Could not check saved namespace {name!r} against Pinecone: {e}")
+                current = False
+            if current:
+                self._resident[name] = time.time() - age
+            else:
+                self.local.drop_namespace(name, remove_files=True)
+
+    def __getattr__(self, name):
+        # fetch, list, describe_index_stats, ... go to Pinecone
+        return getattr(self.remote, name)
+
+    def _is_resident(self, namespace: str) -> bool:
+        with self._lock:
+            return self._check_resident(namespace)
+
+    def _check_resident(self, namespace: str) -> bool:
+        # Caller holds self._lock
+        loaded_at = self._resident.get(namespace)
+        if loaded_at is None:
+            return False
+        if time.time() - loaded_at > self.ttl_seconds:
+            del self._resident[namespace]
+            self.local.drop_namespace(namespace, remove_files=True)
+            return False
+        self._resident.move_to_end(namespace)
+        return True
+
+    def _record_write(self, namespace: str) -> bool:
+        """
+        Note a write that has reached Pinecone. Returns whether the local copy
+        must apply it too; a copy in progress is made again instead.
+        """
+        with self._lock:
+            if namespace in self._hydrating:
+                self._hydrating[namespace] += 1
+            return self._check_resident(namespace)
+
+    def query(self, **kwargs):
+        namespace = kwargs.get("namespace", "")
+        if self._is_resident(namespace):
+            self.local_queries += 1
+            return self.local.query(**kwargs)
+        self.remote_queries += 1
+        self._record_query(namespace)
+        return self.remote.query(**kwargs)
+
+    def upsert(self, vectors, namespace: str = "", **kwargs):
+        response = self.remote.upsert(vectors=vectors, namespace=namespace, **kwargs)
+        if self._record_write(namespace):
+            self.local.upsert(vectors=vectors, namespace=namespace)
+        self._announce(namespace)
+        return response
+
+    def delete(self, ids=None, delete_all: bool = False, namespace: str = "", filter=None, **kwargs):
+        response = self.remote.delete(ids=ids, delete_all=delete_all, namespace=namespace, filter=filter, **kwargs)
+        if self._record_write(namespace):
+            self.local.delete(ids=ids, delete_all=delete_all, namespace=namespace, filter=filter)
+        self._announce(namespace)
+        return response
+
+    def _announce(self, namespace: str) -> None:
+        if self.on_change is None:
+            return
+        try:
+            self.on_change(namespace)
+        except Exception as e:
+            # Other workers still drop their copy once its TTL runs out
+            logger.error(f"Error announcing change to namespace {namespace!r}: {e}")
+
+    def invalidate(self, namespace: str) -> None:
+        """Drop the local copy of a namespace that another worker changed; a copy in progress is made again."""
+        with self._lock:
+            hydrating = namespace in self._hydrating
+            if hydrating:
+                self._hydrating[namespace] += 1
+            if self._resident.pop(namespace, None) is None:
+                return
+            self.invalidations += 1
+        self.local.drop_namespace(namespace, remove_files=True)
+
+    def invalidate_all(self) -> None:
+        """Drop every local copy, e.g. when change notifications may have been missed."""
+        with self._lock:
+            namespaces = set(self._resident) | set(self._hydrating)
+        for namespace in namespaces:
+            self.invalidate(namespace)
+
+    def _record_query(self, namespace: str) -> None:
+        now = time.time()
+        with self._lock:
+            recent = [t for t in self._heat.get(namespace, []) if now - t < self.window_seconds]
+            recent.append(now)
+            self._heat[namespace] = recent
+            if len(recent) < self.query_threshold or namespace in self._hydrating:
+                return
+            self._hydrating[namespace] = 0
+            del self._heat[namespace]
+        threading.Thread(target=self._hydrate, args=(namespace,), daemon=True).start()
+
+    def _hydrate(self, namespace: str) -> None:
+        """
+        Copy a namespace from Pinecone into the local index. A write or
+        invalidation during the copy may or may not be in what was fetched,
+        so the copy is only installed if none happened; otherwise it is made
+        again, up to LOCAL_HOT_HYDRATE_ATTEMPTS times.
+        """
+        start = time.time()
+        try:
+            for _ in range(self.hydrate_attempts):
+                with self._lock:
+                    self._hydrating[namespace] = 0
+                self._copy_namespace(namespace)
+
+                with self._lock:
+                    if self._hydrating[namespace]:
+                        continue
+                    self._resident[namespace] = time.time()
+                    self.hydrations += 1
+                    while len(self._resident) > self.max_namespaces:
+                        evicted, _ = self._resident.popitem(last=False)
+                        self.local.drop_namespace(evicted, remove_files=True)
+                logger.info(f"Serving namespace {namespace!r} from memory (loaded in {time.time() - start:.1f}s)")
+                return
+            logger.info(f"Namespace {namespace!r} kept changing while being copied; serving it from Pinecone")
+            self.local.drop_namespace(namespace, remove_files=True)
+        except Exception as e:
+            logger.error(f"Error loading namespace {namespace!r} into the local index: {e}")
+            self.local.drop_namespace(namespace, remove_files=True)
+        finally:
+            with self._lock:
+                self._hydrating.pop(namespace, None)
+
+    def _copy_namespace(self, namespace: str) -> None:
+        self.local.drop_namespace(namespace, remove_files=True)
+        for ids in self.remote.list(namespace=namespace):
+            fetched = self.remote.fetch(ids=list(ids), namespace=namespace)
+            vectors = fetched.get("vectors", {}) if isinstance(fetched, dict) else fetched.vectors
+            batch = []
+            for vector_id, vector in vectors.items():
+                get = vector.get if isinstance(vector, dict) else lambda k, v=vector: getattr(v, k, None)
+                batch.append({"id": vector_id, "values": list(get("values")), "metadata": dict(get("metadata") or {})})
+            self.local.upsert(vectors=batch, namespace=namespace)
+        self.local.flush()
+
+    def flush(self) -> None:
+        self.local.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resident_namespaces": len(self._resident),
+                "hydrating": len(self._hydrating),
+                "local_queries": self.local_queries,
+                "remote_queries": self.remote_queries,
+                "hydrations": self.hydrations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,84 @@
+from typing import Any, Dict, Optional
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from storage.redis import redis_client, async_redis_client
+from utils.config import VECTOR_BACKEND
+
+logger = logging.getLogger(__name__)
+
+# Published with {"index", "namespace", "origin"} whenever a tiered index namespace is written to
+NAMESPACE_CHANGED_CHANNEL = "vector_namespace_changed"
+
+# Identifies this process, so it ignores its own announcements
+_ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def publish_namespace_changed(index_name: str, namespace: str) -> None:
+    """Tell every worker that a namespace changed in Pinecone; blocking, called from index threads."""
+    redis_client.publish(NAMESPACE_CHANGED_CHANNEL, json.dumps({
+        "index": index_name,
+        "namespace": namespace,
+        "origin": _ORIGIN,
+    }))
+
+
+class NamespaceInvalidator:
+    """
+    Keeps the local tier of `TieredIndex` instances in step with writes made
+    by other workers. A background task listens on NAMESPACE_CHANGED_CHANNEL
+    and drops the local copy of each changed namespace, so deleted or
+    re-uploaded documents are not served from a stale copy. If the
+    subscription drops, every local copy is dropped since notifications may
+    have been lost.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+
+    def register(self, index_name: str, index) -> None:
+        self._indexes[index_name] = index
+
+    def start(self) -> None:
+        if VECTOR_BACKEND == "tiered" and self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = async_redis_client.pubsub()
+            try:
+                await pubsub.subscribe(NAMESPACE_CHANGED_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    event = json.loads(message["data"])
+                    index = self._indexes.get(event.get("index"))
+                    if index is None or event.get("origin") == _ORIGIN:
+                        continue
+                    self.received += 1
+                    # Dropping a copy may remove files; keep it off the event loop
+                    await asyncio.to_thread(index.invalidate, event["namespace"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Namespace change subscription failed, resubscribing: {e}")
+                for index in list(self._indexes.values()):
+                    await asyncio.to_thread(index.invalidate_all)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+
+# Global namespace invalidator for this worker process
+namespace_invalidator = NamespaceInvalidator()
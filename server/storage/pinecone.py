@@ -1,10 +1,14 @@
-from pinecone import Pinecone
+import asyncio
+import fcntl
 import os
 from dotenv import load_dotenv
+from utils.config import VECTOR_BACKEND, LOCAL_INDEX_DIR
+from utils.lazy import LazyProxy
 
 load_dotenv()
 
 def get_pinecone_client():
+    from pinecone import Pinecone
     api_key = os.getenv("PINECONE_API_KEY")
     # Add environment parameter which is required
     environment = os.getenv("PINECONE_ENVIRONMENT", "gcp-starter")  # Default to gcp-starter if not specified
@@ -38,5 +42,118 @@ def get_pinecone_index(name, dimension=768):
     return pc.Index(name)
 
 
-pinecone_chat_index = get_pinecone_index(name="vahan-chat")
-pinecone_doc_index = get_pinecone_index(name="document-data")
\ No newline at end of file
+# Lock files of the tier slots this worker holds, kept open for the life of the process
+_tier_slots = {}
+
+def _tier_path(index_path: str) -> str:
+    """
+    Local tier directory of this worker. Workers claim numbered slots
+    (`tier-0`, `tier-1`, ...) by holding an exclusive lock on the slot's lock
+    file while they live, so two workers never share a tier. A restarted
+    worker takes over a free slot and reopens the namespaces saved there
+    instead of downloading them again.
+    """
+    if index_path in _tier_slots:
+        return _tier_slots[index_path][1]
+    os.makedirs(index_path, exist_ok=True)
+    slot = 0
+    while True:
+        lock_file = open(os.path.join(index_path, f"tier-{slot}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            slot += 1
+            continue
+        path = os.path.join(index_path, f"tier-{slot}")
+        _tier_slots[index_path] = (lock_file, path)
+        return path
+
+def get_vector_index(name, dimension=768, tiered=False):
+    """
+    The index the app talks to for `name`, depending on VECTOR_BACKEND:
+    Pinecone, the in-process local index, or (for `tiered` indexes) Pinecone
+    with hot namespaces served from the local index.
+    """
+    from storage.local_index import LocalVectorIndex, TieredIndex
+
+    local_path = os.path.join(LOCAL_INDEX_DIR, name)
+    if VECTOR_BACKEND == "local":
+        print(f"Using local vector index for '{name}' at {local_path}")
+        return LocalVectorIndex(name, dimension=dimension, path=local_path)
+    remote = get_pinecone_index(name, dimension)
+    if VECTOR_BACKEND == "tiered" and tiered:
+        from storage.namespace_events import namespace_invalidator, publish_namespace_changed
+
+        index = TieredIndex(remote, LocalVectorIndex(name, dimension=dimension, path=_tier_path(local_path)),
+                            on_change=lambda namespace: publish_namespace_changed(name, namespace))
+        namespace_invalidator.register(name, index)
+        return index
+    return remote
+
+def flush_vector_indexes():
+    """Persist local index changes (no-op for Pinecone or indexes never used)."""
+    from storage.local_index import LocalVectorIndex, TieredIndex
+
+    for proxy in (pinecone_chat_index, pinecone_doc_index):
+        if not proxy.initialized:
+            continue
+        index = proxy.resolve()
+        if isinstance(index, (LocalVectorIndex, TieredIndex)):
+            index.flush()
+
+def vector_index_stats():
+    """Local/remote query split of the tiered document index, if enabled."""
+    from storage.local_index import TieredIndex
+
+    if pinecone_doc_index.initialized and isinstance(pinecone_doc_index.resolve(), TieredIndex):
+        return pinecone_doc_index.resolve().stats()
+    return {"backend": VECTOR_BACKEND, "initialized": pinecone_doc_index.initialized}
+
+def doc_namespace(user_id) -> str:
+    """Namespace holding one user's document chunks."""
+    return str(user_id)
+
+def chat_namespace(user_id, session_id) -> str:
+    """Namespace holding the chat turns of one user's session."""
+    return f"{user_id}/{session_id}"
+
+def namespace_vector_count(index, namespace: str) -> int:
+    """
+    Vector count of one namespace. Uses the per-namespace describe call where
+    the client has it, so the cost does not grow with the number of tenants;
+    older clients fall back to the index-wide stats.
+    """
+    describe = getattr(index, "describe_namespace", None)
+    if describe is None:
+        stats = index.describe_index_stats()
+        namespaces = stats.get("namespaces", {}) if isinstance(stats, dict) else getattr(stats, "namespaces", {})
+        summary = (namespaces or {}).get(namespace, {})
+        count = summary.get("vector_count", 0) if isinstance(summary, dict) else getattr(summary, "vector_count", 0)
+        return int(count or 0)
+    try:
+        description = describe(namespace=namespace)
+    except Exception as e:
+        if getattr(e, "status", None) == 404:
+            return 0  # never written to, or already dropped
+        raise
+    count = description.get("record_count", 0) if isinstance(description, dict) else getattr(description, "record_count", 0)
+    return int(count or 0)
+
+def delete_namespace(index, namespace: str) -> None:
+    """Drop every vector in a namespace; no scan or metadata filter needed."""
+    index.delete(delete_all=True, namespace=namespace)
+
+
+async def query_index_async(index, **kwargs):
+    """Run a Pinecone query in a worker thread so the event loop is not blocked."""
+    return await asyncio.to_thread(index.query, **kwargs)
+
+async def upsert_index_async(index, **kwargs):
+    """Run a Pinecone upsert in a worker thread so the event loop is not blocked."""
+    return await asyncio.to_thread(index.upsert, **kwargs)
+
+
+# Connected on first use (or by the startup readiness checks), not at import time
+pinecone_chat_index = LazyProxy(lambda: get_vector_index(name="vahan-chat"), "vahan-chat")
+pinecone_doc_index = LazyProxy(lambda: get_vector_index(name="document-data", tiered=True), "document-data")
\ No newline at end of file
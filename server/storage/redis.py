@@ -1,6 +1,8 @@
-import redis
 import os
+from utils.lazy import LazyProxy
+
 def get_redis_client():
+    import redis
     redis_host = os.environ.get("REDIS_HOST", "redis")
     redis_port = int(os.environ.get("REDIS_PORT", 6379))
     try:
@@ -11,6 +13,31 @@ def get_redis_client():
         raise e
     return redis_client
 
+def get_async_redis_client():
+    """
+    Build a redis.asyncio client backed by a shared connection pool, for use
+    inside async handlers. The pool blocks for a free connection instead of
+    failing once the cap is reached, since pub/sub listeners hold theirs for good.
+    """
+    import redis.asyncio as aioredis
+    redis_host = os.environ.get("REDIS_HOST", "redis")
+    redis_port = int(os.environ.get("REDIS_PORT", 6379))
+    try:
+        pool = aioredis.BlockingConnectionPool(
+            host=redis_host,
+            port=redis_port,
+            username=os.environ.get("REDIS_USERNAME"),
+            password=os.environ.get("REDIS_PASSWORD"),
+            max_connections=int(os.environ.get("REDIS_MAX_CONNECTIONS", 50)),
+            timeout=float(os.environ.get("REDIS_POOL_TIMEOUT_SECONDS", 5)),
+        )
+        async_redis_client = aioredis.Redis(connection_pool=pool)
+    except Exception as e:
+        print(f"Error creating async Redis client: {str(e)}")
+        raise e
+    return async_redis_client
 
-redis_client = get_redis_client()
 
+# Built on first use so importing this module never touches the network
+redis_client = LazyProxy(get_redis_client, "redis")
+async_redis_client = LazyProxy(get_async_redis_client, "async redis")
@@ -0,0 +1,243 @@
+"""In-memory stand-ins for the Redis clients, covering the commands the services use."""
+import fnmatch
+
+
+def _bytes(value) -> bytes:
+    # redis-py returns bytes for everything it stores
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class FakeRedis:
+    """Synchronous Redis: strings, hashes, lists, sets and sorted sets, plus pipelines."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.published = []
+        self.commands = []
+        self.fail = False
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("redis is down")
+
+    # keys
+
+    def delete(self, *keys):
+        self._check()
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return key in self.data
+
+    def scan_iter(self, match="*", count=None):
+        return [key.encode() for key in list(self.data) if fnmatch.fnmatchcase(key, match)]
+
+    # strings
+
+    def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self._check()
+        self.data[key] = _bytes(value)
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    def mget(self, keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    def incr(self, key):
+        value = int(self.data.get(key, b"0")) + 1
+        self.data[key] = _bytes(value)
+        return value
+
+    # hashes
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        self._check()
+        fields = dict(mapping or {})
+        if field is not None:
+            fields[field] = value
+        hash_ = self.data.setdefault(key, {})
+        for name, item in fields.items():
+            hash_[_bytes(name)] = _bytes(item)
+        return len(fields)
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(_bytes(field))
+
+    def hgetall(self, key):
+        self._check()
+        return dict(self.data.get(key, {}))
+
+    def hincrby(self, key, field, amount=1):
+        hash_ = self.data.setdefault(key, {})
+        value = int(hash_.get(_bytes(field), b"0")) + int(amount)
+        hash_[_bytes(field)] = _bytes(value)
+        return value
+
+    def hincrbyfloat(self, key, field, amount=1.0):
+        hash_ = self.data.setdefault(key, {})
+        value = float(hash_.get(_bytes(field), b"0")) + float(amount)
+        hash_[_bytes(field)] = _bytes(value)
+        return value
+
+    # lists (index 0 is the left end)
+
+    def lpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        for value in values:
+            items.insert(0, _bytes(value))
+        return len(items)
+
+    def rpush(self, key, *values):
+        items = self.data.setdefault(key, [])
+        items.extend(_bytes(value) for value in values)
+        return len(items)
+
+    def lrange(self, key, start, end):
+        items = self.data.get(key, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def llen(self, key):
+        return len(self.data.get(key, []))
+
+    def lrem(self, key, count, value):
+        items = self.data.get(key, [])
+        order = range(len(items) - 1, -1, -1) if count < 0 else range(len(items))
+        hits = [i for i in order if items[i] == _bytes(value)][:abs(count) or None]
+        for i in sorted(hits, reverse=True):
+            del items[i]
+        return len(hits)
+
+    def blmove(self, source, destination, timeout, src_side="RIGHT", dest_side="LEFT"):
+        items = self.data.get(source, [])
+        if not items:
+            return None
+        value = items.pop() if src_side == "RIGHT" else items.pop(0)
+        target = self.data.setdefault(destination, [])
+        if dest_side == "LEFT":
+            target.insert(0, value)
+        else:
+            target.append(value)
+        return value
+
+    # sets
+
+    def sadd(self, key, *members):
+        self._check()
+        members_ = self.data.setdefault(key, set())
+        before = len(members_)
+        members_.update(_bytes(member) for member in members)
+        return len(members_) - before
+
+    def srem(self, key, *members):
+        members_ = self.data.get(key, set())
+        before = len(members_)
+        members_.difference_update(_bytes(member) for member in members)
+        return before - len(members_)
+
+    def smembers(self, key):
+        self._check()
+        return set(self.data.get(key, set()))
+
+    # sorted sets (member -> score)
+
+    def zadd(self, key, mapping, xx=False):
+        self._check()
+        scores = self.data.setdefault(key, {})
+        added = 0
+        for member, score in mapping.items():
+            member = _bytes(member)
+            if xx and member not in scores:
+                continue
+            added += member not in scores
+            scores[member] = score
+        return added
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def zpopmin(self, key, count=1):
+        scores = self.data.get(key, {})
+        lowest = sorted(scores.items(), key=lambda item: item[1])[:count]
+        for member, _ in lowest:
+            del scores[member]
+        return lowest
+
+    # pub/sub
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    # RedisTimeSeries (series key -> {timestamp: value}); other raw commands are only recorded
+
+    def execute_command(self, *args):
+        self._check()
+        self.commands.append(args)
+        if args[0] == "TS.CREATE":
+            if args[1] in self.data:
+                raise Exception("ERR TSDB: key already exists")
+            self.data[args[1]] = {}
+        elif args[0] == "TS.MADD":
+            triples = [args[i:i + 3] for i in range(1, len(args), 3)]
+            for key, timestamp, value in triples:
+                self.data.setdefault(key, {})[timestamp] = value
+            return [timestamp for _, timestamp, _ in triples]
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues commands and runs them against the FakeRedis on `execute`."""
+
+    def __init__(self, redis: FakeRedis):
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute_command(self, *args):
+        self._commands.append(("execute_command", args, {}))
+        return self
+
+    def execute(self, raise_on_error=True):
+        self._redis._check()
+        commands, self._commands = self._commands, []
+        return [getattr(self._redis, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+
+class FakeAsyncRedis:
+    """The redis.asyncio interface over a FakeRedis: the same commands, awaited."""
+
+    def __init__(self, redis: FakeRedis = None):
+        self.sync = redis or FakeRedis()
+
+    def __getattr__(self, name):
+        method = getattr(self.sync, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+    def pipeline(self, transaction=True):
+        return FakeAsyncPipeline(self.sync)
+
+
+class FakeAsyncPipeline(FakePipeline):
+    async def execute(self, raise_on_error=True):
+        return FakePipeline.execute(self, raise_on_error)
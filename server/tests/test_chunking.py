@@ -0,0 +1,198 @@
+from services.chunking import (
+    NearDuplicateFilter,
+    _units,
+    chunk_pages,
+    chunk_text,
+    estimate_tokens,
+    text_blocks,
+)
+
+
+def sentence(i: int) -> str:
+    """A 10-token sentence tagged S{i}."""
+    return f"S{i} alpha bravo charlie delta echo foxtrot golf hotel."
+
+
+def settings(chunk_tokens=40, overlap_tokens=20, dedupe_threshold=0.0):
+    return {"chunk_tokens": chunk_tokens, "overlap_tokens": overlap_tokens, "dedupe_threshold": dedupe_threshold}
+
+
+def tags(chunk: str):
+    return [word for word in chunk.split() if word[0] == "S" and word[1:].isdigit()]
+
+
+# text_blocks
+
+def test_text_blocks_detects_headings():
+    text = "\n".join([
+        "# Markdown Heading",
+        "1.2 Numbered Section",
+        "ALL CAPS TITLE",
+        "Billing And Invoices",
+        "Invoices are sent on the first day of every month by email.",
+    ])
+    blocks = text_blocks(text)
+    assert [b["type"] for b in blocks] == ["heading", "heading", "heading", "heading", "paragraph"]
+    assert blocks[0]["text"] == "Markdown Heading"
+
+
+def test_text_blocks_does_not_treat_sentences_as_headings():
+    blocks = text_blocks("This line ends with a period.\nAnd This One Is Followed By Nothing")
+    assert [b["type"] for b in blocks] == ["paragraph"]
+
+
+def test_text_blocks_joins_paragraph_lines_and_splits_on_blank_lines():
+    blocks = text_blocks("first line of text\nsecond line of text\n\nnext paragraph here")
+    assert blocks == [
+        {"type": "paragraph", "text": "first line of text second line of text"},
+        {"type": "paragraph", "text": "next paragraph here"},
+    ]
+
+
+def test_text_blocks_detects_tables():
+    text = "Plan  Price  Seats\nBasic  10  1\nPro | 30 | 5"
+    blocks = text_blocks(text)
+    assert blocks == [{"type": "table", "rows": [["Plan", "Price", "Seats"], ["Basic", "10", "1"], ["Pro", "30", "5"]]}]
+
+
+def test_text_blocks_single_column_gap_line_is_a_paragraph():
+    blocks = text_blocks("Total  42\n\nafter the gap")
+    assert blocks[0] == {"type": "paragraph", "text": "Total 42"}
+
+
+# _units
+
+def test_units_from_headings_sentences_and_tables():
+    blocks = [
+        {"type": "heading", "text": "Plans"},
+        {"type": "paragraph", "text": "First sentence here. Second sentence here."},
+        {"type": "table", "rows": [["Plan", "Price"], ["Basic", "10"]]},
+    ]
+    units = list(_units(blocks, chunk_tokens=100))
+    assert [(u["kind"], u["text"], u["sep"]) for u in units] == [
+        ("heading", "Plans", "\n\n"),
+        ("text", "First sentence here.", "\n\n"),
+        ("text", "Second sentence here.", " "),
+        ("row", "Plan | Price", "\n\n"),
+        ("row", "Basic | 10", "\n"),
+    ]
+    assert all(u["header"] == "Plan | Price" for u in units[3:])
+    assert all(u["tokens"] == estimate_tokens(u["text"]) for u in units)
+
+
+def test_units_split_overlong_sentences_on_words():
+    long_sentence = " ".join(["word"] * 100)
+    units = list(_units([{"type": "paragraph", "text": long_sentence}], chunk_tokens=32))
+    assert len(units) == 4
+    assert all(u["tokens"] <= 32 for u in units)
+    assert " ".join(u["text"] for u in units) == long_sentence
+    assert [u["sep"] for u in units] == ["\n\n", " ", " ", " "]
+
+
+# chunk_pages
+
+def test_chunks_stay_within_budget_and_cover_every_sentence():
+    text = " ".join(sentence(i) for i in range(20))
+    chunks = chunk_text(text, settings(overlap_tokens=0))
+    assert all(estimate_tokens(c) <= 40 for c in chunks)
+    assert sum((tags(c) for c in chunks), []) == [f"S{i}" for i in range(20)]
+
+
+def test_continuation_chunks_repeat_the_heading():
+    text = "Pricing Overview\n" + " ".join(sentence(i) for i in range(10))
+    chunks = chunk_text(text, settings(overlap_tokens=0))
+    assert len(chunks) > 1
+    assert all(c.startswith("Pricing Overview\n\n") for c in chunks)
+
+
+def test_overlap_carries_the_sentences_right_before_the_new_one():
+    text = "Pricing Overview\n" + " ".join(sentence(i) for i in range(10))
+    chunks = chunk_text(text, settings())
+    for previous, chunk in zip(chunks, chunks[1:]):
+        carried = tags(chunk)[:-1]
+        assert carried == tags(previous)[-len(carried):]
+        # No gap between the carried sentences and the new one
+        numbers = [int(tag[1:]) for tag in tags(chunk)]
+        assert numbers == list(range(numbers[0], numbers[0] + len(numbers)))
+
+
+def test_overlap_that_does_not_fit_is_trimmed_from_the_front_and_keeps_the_heading():
+    # A 13-token heading leaves room for one carried sentence next to the new one
+    heading = "Enterprise Pricing And Volume Discounts For Large Customer Accounts"
+    assert estimate_tokens(heading) == 13
+    text = heading + "\n" + " ".join(sentence(i) for i in range(8))
+    chunks = chunk_text(text, settings())
+    assert len(chunks) > 1
+    for chunk in chunks[1:]:
+        assert chunk.startswith(heading + "\n\n")
+        numbers = [int(tag[1:]) for tag in tags(chunk)]
+        assert len(numbers) == 2 and numbers[1] == numbers[0] + 1
+
+
+def test_heading_is_kept_when_nothing_can_be_carried():
+    heading = "Enterprise Pricing And Volume Discounts For Large Customer Accounts"
+    text = heading + "\n" + " ".join(sentence(i) for i in range(6))
+    chunks = chunk_text(text, settings(chunk_tokens=32, overlap_tokens=10))
+    assert all(c.startswith(heading + "\n\n") for c in chunks)
+    assert sum((tags(c) for c in chunks), []) == [f"S{i}" for i in range(6)]
+
+
+def test_continued_tables_repeat_the_header_row():
+    rows = [["Plan", "Price", "Seats"]] + [[f"Plan{i}", str(i), str(i)] for i in range(20)]
+    pages = [{"page": 1, "blocks": [{"type": "heading", "text": "Plans"}, {"type": "table", "rows": rows}]}]
+    chunks = list(chunk_pages(pages, settings(overlap_tokens=0)))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith("Plans\n\nPlan | Price | Seats\n")
+    body_rows = [line for c in chunks for line in c.split("\n")[3:]]
+    assert body_rows == [" | ".join(row) for row in rows[1:]]
+
+
+def test_short_page_tail_is_carried_into_the_next_page():
+    pages = [
+        {"page": 1, "text": " ".join(sentence(i) for i in range(4)) + " " + "Tail end."},
+        {"page": 2, "text": "Start of the next page."},
+    ]
+    chunks = list(chunk_pages(pages, settings(overlap_tokens=0)))
+    assert chunks[-1] == "Tail end.\n\nStart of the next page."
+
+
+def test_page_boundary_ends_a_full_enough_chunk():
+    pages = [
+        {"page": 1, "text": " ".join(sentence(i) for i in range(2))},
+        {"page": 2, "text": sentence(2)},
+    ]
+    chunks = list(chunk_pages(pages, settings(overlap_tokens=0)))
+    assert [tags(c) for c in chunks] == [["S0", "S1"], ["S2"]]
+
+
+def test_repeated_boilerplate_chunks_are_dropped():
+    boilerplate = "All prices exclude tax and may change without notice. Contact sales for volume terms."
+    pages = [
+        {"page": 1, "text": boilerplate},
+        {"page": 2, "text": sentence(1)},
+        {"page": 3, "text": boilerplate},
+        {"page": 4, "text": boilerplate.replace("sales", "Sales")},
+    ]
+    chunks = list(chunk_pages(pages, settings(overlap_tokens=0, dedupe_threshold=0.9)))
+    assert chunks == [boilerplate, sentence(1)]
+
+
+# NearDuplicateFilter
+
+def test_near_duplicate_filter_drops_exact_and_near_copies():
+    base = "the quick brown fox jumps over the lazy dog near the river bank today"
+    dedupe = NearDuplicateFilter(threshold=0.7)
+    assert not dedupe.is_duplicate(base)
+    assert dedupe.is_duplicate(base.upper() + "!")
+    assert dedupe.is_duplicate(base + " again")
+    assert not dedupe.is_duplicate("an entirely different sentence about invoices and billing cycles")
+    assert dedupe.dropped == 2
+
+
+def test_near_duplicate_filter_with_threshold_one_only_drops_exact_copies():
+    base = "the quick brown fox jumps over the lazy dog near the river bank today"
+    dedupe = NearDuplicateFilter(threshold=1.0)
+    assert not dedupe.is_duplicate(base)
+    assert not dedupe.is_duplicate(base + " again")
+    assert dedupe.is_duplicate(base)
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import storage.embedding_cache as embedding_cache_module
+from storage.embedding_cache import EmbeddingCache
+from fakes import FakeRedis
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(embedding_cache_module, "redis_client", fake)
+    return fake
+
+
+def key(text: str) -> str:
+    return EmbeddingCache.make_key(text, "model", "task")
+
+
+def test_keys_depend_on_model_task_and_text():
+    assert key("hello") == EmbeddingCache.make_key("hello", "model", "task")
+    assert key("hello") != EmbeddingCache.make_key("hello", "other-model", "task")
+    assert key("hello") != EmbeddingCache.make_key("hello", "model", "other-task")
+    assert key("hello") != key("hello!")
+
+
+def test_put_then_get_hits_the_local_tier(redis):
+    cache = EmbeddingCache(local_size=10)
+    cache.put_many([key("a")], [[0.5, 0.25]])
+    assert cache.get_many([key("a"), key("b")]) == [[0.5, 0.25], None]
+    stats = cache.stats()
+    assert (stats["local_hits"], stats["redis_hits"], stats["misses"]) == (1, 0, 1)
+
+
+def test_other_workers_hit_the_redis_tier_as_float32(redis):
+    EmbeddingCache().put_many([key("a")], [[0.1, 0.2, 0.3]])
+    assert len(redis.data["emb:" + key("a")]) == 3 * 4
+
+    other_worker = EmbeddingCache()
+    embedding = other_worker.get_many([key("a")])[0]
+    assert np.allclose(embedding, [0.1, 0.2, 0.3])
+    assert other_worker.stats()["redis_hits"] == 1
+    # Promoted to the local tier
+    assert other_worker.get_many([key("a")])[0] == embedding
+    assert other_worker.stats()["local_hits"] == 1
+
+
+def test_local_tier_evicts_least_recently_used(redis):
+    cache = EmbeddingCache(local_size=2)
+    cache.put_many([key("a"), key("b")], [[1.0], [2.0]])
+    cache.get_many([key("a")])
+    cache.put_many([key("c")], [[3.0]])
+    assert set(cache._local) == {key("a"), key("c")}
+
+
+def test_redis_tier_is_trimmed_to_its_size_oldest_first(redis):
+    cache = EmbeddingCache(redis_max_entries=2)
+    for i, text in enumerate(["a", "b", "c"]):
+        cache.put_many([key(text)], [[float(i)]])
+    assert "emb:" + key("a") not in redis.data
+    assert "emb:" + key("b") in redis.data and "emb:" + key("c") in redis.data
+    assert redis.zcard(EmbeddingCache.INDEX_KEY) == 2
+    assert redis.ttls["emb:" + key("c")] == cache.ttl_seconds
+
+
+def test_redis_failures_degrade_to_misses(redis):
+    redis.fail = True
+    cache = EmbeddingCache()
+    cache.put_many([key("a")], [[1.0]])
+    assert cache.get_many([key("a"), key("b")]) == [[1.0], None]
+    assert cache.stats()["misses"] == 1
+
+
+def test_stats_estimate_time_saved_from_miss_latency(redis):
+    cache = EmbeddingCache()
+    cache.get_many([key("a"), key("b")])
+    cache.put_many([key("a"), key("b")], [[1.0], [2.0]], api_seconds=1.0)
+    cache.get_many([key("a"), key("b")])
+    stats = cache.stats()
+    assert stats["hit_rate"] == 0.5
+    assert stats["avg_miss_latency_seconds"] == 0.5
+    assert stats["estimated_seconds_saved"] == 1.0
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+import models.hedging as hedging_module
+from models.hedging import HedgeController
+from models.region_pool import RegionRouter
+
+
+def controller(**kwargs) -> HedgeController:
+    kwargs.setdefault("enabled", True)
+    kwargs.setdefault("percentile", 90)
+    kwargs.setdefault("budget_per_minute", 2)
+    kwargs.setdefault("min_delay", 0.5)
+    kwargs.setdefault("default_delay", 3.0)
+    return HedgeController(**kwargs)
+
+
+# delay and budget
+
+
+def test_delay_defaults_until_enough_samples():
+    hedge = controller()
+    for _ in range(HedgeController.MIN_SAMPLES - 1):
+        hedge.record_latency(1.0)
+    assert hedge.hedge_delay() == 3.0
+    hedge.record_latency(1.0)
+    assert hedge.hedge_delay() == 1.0
+
+
+def test_delay_is_the_latency_percentile_with_a_floor():
+    hedge = controller()
+    for latency in range(1, 101):
+        hedge.record_latency(latency / 10)
+    assert hedge.hedge_delay() == pytest.approx(9.01)
+
+    fast = controller()
+    for _ in range(HedgeController.MIN_SAMPLES):
+        fast.record_latency(0.1)
+    assert fast.hedge_delay() == 0.5
+
+
+def test_budget_resets_every_minute(monkeypatch):
+    now = [600.0]
+    monkeypatch.setattr(hedging_module.time, "time", lambda: now[0])
+    hedge = controller()
+    assert hedge.try_acquire() and hedge.try_acquire()
+    assert not hedge.try_acquire()
+    now[0] += 60
+    assert hedge.try_acquire()
+    assert hedge.stats()["hedges_sent"] == 3
+    assert hedge.stats()["budget_exhausted"] == 1
+
+
+def test_stats_report_rates():
+    hedge = controller()
+    for _ in range(4):
+        hedge.increment("requests")
+    hedge.try_acquire()
+    hedge.try_acquire()
+    hedge.increment("hedge_wins")
+    stats = hedge.stats()
+    assert stats["hedge_rate"] == 0.5
+    assert stats["hedge_win_rate"] == 0.5
+
+
+# generate_content_async
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = pytest.importorskip("models.llm")
+    monkeypatch.setattr(llm, "llm_router", RegionRouter(["us", "eu"], explore_rate=0.0))
+    monkeypatch.setattr(llm, "hedge_controller", controller(default_delay=0.05))
+    llm.llm_router.record_success("us", 0.01)
+    llm.llm_router.record_success("eu", 2.0)
+    return llm
+
+
+def fake_regions(llm, monkeypatch, delays, failures=()):
+    calls = []
+
+    async def generate(region, prompt, generation_config):
+        calls.append(region)
+        await asyncio.sleep(delays[region])
+        if region in failures:
+            raise RuntimeError(f"{region} failed")
+        return region
+    monkeypatch.setattr(llm, "_generate_in_region", generate)
+    return calls
+
+
+def test_fast_primary_is_not_hedged(llm, monkeypatch):
+    calls = fake_regions(llm, monkeypatch, {"us": 0.0, "eu": 0.0})
+    assert asyncio.run(llm.generate_content_async("hi")) == "us"
+    assert calls == ["us"]
+    assert llm.hedge_controller.stats()["hedges_sent"] == 0
+
+
+def test_slow_primary_is_hedged_and_the_loser_is_censored(llm, monkeypatch):
+    calls = fake_regions(llm, monkeypatch, {"us": 0.5, "eu": 0.0})
+    assert asyncio.run(llm.generate_content_async("hi")) == "eu"
+    assert calls == ["us", "eu"]
+    assert llm.hedge_controller.stats()["hedge_wins"] == 1
+    # The cancelled primary ran for at least the hedge delay, slower than its estimate
+    assert llm.llm_router.stats()["us"]["ewma_latency_seconds"] > 0.01
+
+
+def test_no_hedge_without_budget(llm, monkeypatch):
+    llm.hedge_controller.budget_per_minute = 0
+    calls = fake_regions(llm, monkeypatch, {"us": 0.1, "eu": 0.0})
+    assert asyncio.run(llm.generate_content_async("hi")) == "us"
+    assert calls == ["us"]
+
+
+def test_failed_hedge_falls_back_to_the_primary(llm, monkeypatch):
+    fake_regions(llm, monkeypatch, {"us": 0.1, "eu": 0.0}, failures={"eu"})
+    assert asyncio.run(llm.generate_content_async("hi")) == "us"
+
+
+def test_both_failing_raises_the_primary_error(llm, monkeypatch):
+    fake_regions(llm, monkeypatch, {"us": 0.1, "eu": 0.0}, failures={"us", "eu"})
+    with pytest.raises(RuntimeError, match="us failed"):
+        asyncio.run(llm.generate_content_async("hi"))
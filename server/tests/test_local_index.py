@@ -0,0 +1,225 @@
+import time
+
+import numpy as np
+import pytest
+
+from storage.local_index import LocalVectorIndex, TieredIndex, matches_filter
+
+
+def index(**kwargs) -> LocalVectorIndex:
+    kwargs.setdefault("dimension", 3)
+    return LocalVectorIndex("test", **kwargs)
+
+
+def ids(response):
+    return [match["id"] for match in response["matches"]]
+
+
+# filters
+
+
+def test_filters_follow_pinecone_semantics():
+    metadata = {"type": "pdf", "page": 3, "tags": ["a", "b"]}
+    assert matches_filter(metadata, {"type": "pdf"})
+    assert matches_filter(metadata, {"tags": "a"})
+    assert matches_filter(metadata, {"page": {"$gte": 3, "$lt": 4}})
+    assert not matches_filter(metadata, {"page": {"$gt": 3}})
+    assert matches_filter(metadata, {"type": {"$in": ["pdf", "docx"]}, "page": {"$ne": 1}})
+    assert not matches_filter(metadata, {"type": {"$nin": ["pdf"]}})
+    assert matches_filter(metadata, {"$or": [{"type": "docx"}, {"page": 3}]})
+    assert not matches_filter(metadata, {"$and": [{"type": "pdf"}, {"missing": {"$gt": 0}}]})
+
+
+# LocalVectorIndex
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_query_ranks_by_cosine_similarity(quantize):
+    idx = index(quantize=quantize)
+    idx.upsert([
+        {"id": "x", "values": [1, 0, 0], "metadata": {"kind": "x"}},
+        {"id": "y", "values": [0, 1, 0]},
+        {"id": "xy", "values": [1, 1, 0]},
+    ])
+    response = idx.query(vector=[2, 0.1, 0], top_k=2, include_metadata=True, include_values=True)
+    assert ids(response) == ["x", "xy"]
+    assert response["matches"][0]["score"] == pytest.approx(1.0, abs=0.01)
+    assert response["matches"][0]["metadata"] == {"kind": "x"}
+    assert response["matches"][0]["values"] == pytest.approx([1, 0, 0], abs=0.01)
+    assert ids(idx.query(id="y", top_k=1)) == ["y"]
+
+
+def test_upsert_replaces_and_delete_removes():
+    idx = index()
+    idx.upsert([{"id": "a", "values": [1, 0, 0], "metadata": {"v": 1}},
+                {"id": "b", "values": [0, 1, 0], "metadata": {"v": 2}}])
+    idx.upsert([{"id": "a", "values": [0, 0, 1], "metadata": {"v": 3}}])
+    assert idx.describe_namespace("")["record_count"] == 2
+    assert idx.fetch(["a"])["vectors"]["a"]["metadata"] == {"v": 3}
+    assert ids(idx.query(vector=[0, 0, 1], top_k=1)) == ["a"]
+
+    idx.delete(filter={"v": 2})
+    assert ids(idx.query(vector=[0, 1, 0], top_k=5)) == ["a"]
+    idx.delete(ids=["a"])
+    assert idx.query(vector=[0, 1, 0])["matches"] == []
+
+
+def test_queries_apply_the_filter_and_namespace():
+    idx = index()
+    idx.upsert([{"id": "a", "values": [1, 0, 0], "metadata": {"user": "u1"}},
+                {"id": "b", "values": [1, 0.1, 0], "metadata": {"user": "u2"}}], namespace="docs")
+    assert ids(idx.query(vector=[1, 0, 0], top_k=5, namespace="docs", filter={"user": "u2"})) == ["b"]
+    assert idx.query(vector=[1, 0, 0], namespace="other")["matches"] == []
+    assert list(idx.list(namespace="docs", prefix="a")) == [["a"]]
+    assert idx.describe_index_stats()["namespaces"] == {"docs": {"vector_count": 2}}
+
+
+def test_flushed_namespaces_are_reopened_from_disk(tmp_path):
+    idx = index(path=str(tmp_path), quantize=True)
+    idx.upsert([{"id": "a", "values": [1, 0, 0], "metadata": {"n": 1}},
+                {"id": "b", "values": [0, 1, 0]}], namespace="user/1")
+    idx.delete(ids=["b"], namespace="user/1")
+    idx.flush()
+
+    reopened = index(path=str(tmp_path))
+    assert reopened.describe_index_stats()["namespaces"] == {"user/1": {"vector_count": 1}}
+    response = reopened.query(vector=[1, 0, 0], namespace="user/1", include_metadata=True)
+    assert ids(response) == ["a"] and response["matches"][0]["metadata"] == {"n": 1}
+
+    # Emptied namespaces are removed from disk
+    reopened.delete(delete_all=True, namespace="user/1")
+    assert not index(path=str(tmp_path)).has_namespace("user/1")
+
+
+def test_large_namespaces_switch_to_ivf_with_good_recall():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(20, 16))
+    points = centers[rng.integers(0, 20, 2000)] + 0.1 * rng.normal(size=(2000, 16))
+    idx = index(dimension=16, ivf_threshold=500, nprobe=4)
+    idx.upsert([{"id": str(i), "values": point.tolist()} for i, point in enumerate(points)])
+
+    queries = (centers[rng.integers(0, 20, 50)] + 0.1 * rng.normal(size=(50, 16))).tolist()
+    exact = [ids(response)[0] for response in idx.query_many(queries, top_k=1)]
+    deadline = time.time() + 10
+    while idx._namespaces[""].centroids is None and time.time() < deadline:
+        time.sleep(0.01)
+    assert idx._namespaces[""].centroids is not None
+
+    approximate = [ids(response)[0] for response in idx.query_many(queries, top_k=1)]
+    recall = np.mean([a == b for a, b in zip(exact, approximate)])
+    assert recall >= 0.9
+
+
+# TieredIndex
+
+
+class RacingRemote(LocalVectorIndex):
+    """A Pinecone stand-in that runs the next queued action each time a namespace is listed for a copy."""
+
+    def __init__(self):
+        super().__init__("remote", dimension=3)
+        self.during_list = []
+
+    def list(self, **kwargs):
+        pages = list(super().list(**kwargs))
+        if self.during_list:
+            self.during_list.pop(0)()
+        return iter(pages)
+
+
+def tiered(remote, local=None, **kwargs) -> TieredIndex:
+    pytest.importorskip("storage.pinecone")
+    kwargs.setdefault("query_threshold", 2)
+    return TieredIndex(remote, local or index(), **kwargs)
+
+
+def wait_resident(tier, namespace):
+    deadline = time.time() + 5
+    while not tier._is_resident(namespace) and time.time() < deadline:
+        time.sleep(0.01)
+    return tier._is_resident(namespace)
+
+
+def test_hot_namespaces_are_served_locally_and_kept_in_sync():
+    remote = RacingRemote()
+    remote.upsert([{"id": "a", "values": [1, 0, 0]}], namespace="ns")
+    changed = []
+    tier = tiered(remote, on_change=changed.append)
+
+    tier.query(vector=[1, 0, 0], namespace="ns")
+    tier.query(vector=[1, 0, 0], namespace="ns")
+    assert wait_resident(tier, "ns")
+
+    tier.upsert([{"id": "b", "values": [0, 1, 0]}], namespace="ns")
+    assert ids(tier.query(vector=[0, 1, 0], top_k=1, namespace="ns")) == ["b"]
+    assert changed == ["ns"]
+    stats = tier.stats()
+    assert (stats["remote_queries"], stats["local_queries"], stats["hydrations"]) == (2, 1, 1)
+
+
+def test_a_write_during_the_copy_makes_it_again():
+    remote = RacingRemote()
+    remote.upsert([{"id": "a", "values": [1, 0, 0]}], namespace="ns")
+    tier = tiered(remote)
+    remote.during_list.append(lambda: tier.upsert([{"id": "b", "values": [0, 1, 0]}], namespace="ns"))
+
+    tier._hydrate("ns")
+    assert tier._is_resident("ns")
+    assert sorted(ids(tier.query(vector=[1, 1, 0], top_k=5, namespace="ns"))) == ["a", "b"]
+
+
+def test_a_namespace_that_keeps_changing_is_not_copied():
+    remote = RacingRemote()
+    remote.upsert([{"id": "a", "values": [1, 0, 0]}], namespace="ns")
+    tier = tiered(remote, hydrate_attempts=2)
+    remote.during_list = [lambda: tier.invalidate("ns"),
+                          lambda: tier.delete(ids=["a"], namespace="ns")]
+
+    tier._hydrate("ns")
+    assert not tier._is_resident("ns")
+    assert not tier.local.has_namespace("ns")
+    assert tier.stats()["hydrating"] == 0
+
+
+def test_invalidate_and_ttl_drop_the_local_copy():
+    remote = RacingRemote()
+    remote.upsert([{"id": "a", "values": [1, 0, 0]}], namespace="ns")
+    tier = tiered(remote)
+    tier._hydrate("ns")
+    tier.invalidate("ns")
+    assert not tier._is_resident("ns") and not tier.local.has_namespace("ns")
+    assert tier.stats()["invalidations"] == 1
+
+    expiring = tiered(remote, ttl_seconds=0)
+    expiring._hydrate("ns")
+    time.sleep(0.01)
+    assert not expiring._is_resident("ns")
+
+
+def test_least_recently_queried_namespace_is_dropped_first():
+    remote = RacingRemote()
+    for namespace in ("a", "b", "c"):
+        remote.upsert([{"id": namespace, "values": [1, 0, 0]}], namespace=namespace)
+    tier = tiered(remote, max_namespaces=2)
+    tier._hydrate("a")
+    tier._hydrate("b")
+    tier.query(vector=[1, 0, 0], namespace="a")
+    tier._hydrate("c")
+    assert [tier._is_resident(namespace) for namespace in ("a", "b", "c")] == [True, False, True]
+
+
+def test_saved_copies_are_reused_only_while_they_match_pinecone(tmp_path):
+    remote = RacingRemote()
+    remote.upsert([{"id": "a", "values": [1, 0, 0]}], namespace="same")
+    remote.upsert([{"id": "a", "values": [1, 0, 0]}], namespace="changed")
+    tier = tiered(remote, index(path=str(tmp_path)))
+    tier._hydrate("same")
+    tier._hydrate("changed")
+    tier.flush()
+
+    # Written while no worker had the tier open
+    remote.upsert([{"id": "b", "values": [0, 1, 0]}], namespace="changed")
+    restarted = tiered(remote, index(path=str(tmp_path)))
+    assert restarted._is_resident("same")
+    assert not restarted._is_resident("changed")
+    assert not restarted.local.has_namespace("changed")
@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import pytest
+
+import middlewares.metrics_writer as metrics_writer_module
+from middlewares.metrics_writer import MetricsWriter, compaction_key, series_key
+from fakes import FakeAsyncRedis
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeAsyncRedis()
+    monkeypatch.setattr(metrics_writer_module, "async_redis_client", fake)
+    return fake.sync
+
+
+# buffering
+
+
+def test_full_buffer_drops_new_entries():
+    writer = MetricsWriter(buffer_size=2)
+    assert writer.add_point("latency_seconds", 1.0, 1000)
+    assert writer.add_session_metrics("s1", {"latency": 1.0})
+    assert not writer.add_point("latency_seconds", 2.0, 2000)
+    assert not writer.add_session_metrics("s1", {"latency": 2.0})
+    assert writer.stats()["dropped"] == 2
+    assert writer.stats()["buffered"] == 2
+
+
+def test_same_millisecond_samples_get_their_own_timestamp():
+    writer = MetricsWriter()
+    for value in (1.0, 2.0, 3.0):
+        writer.add_point("latency_seconds", value, 1000)
+    writer.add_point("context_relevance", 0.5, 1000)
+    assert writer._points == [
+        ("latency_seconds", 1000, 1.0),
+        ("latency_seconds", 1001, 2.0),
+        ("latency_seconds", 1002, 3.0),
+        ("context_relevance", 1000, 0.5),
+    ]
+
+
+def test_timestamp_shift_is_capped(monkeypatch):
+    monkeypatch.setattr(metrics_writer_module, "METRICS_MAX_TIMESTAMP_SHIFT_MS", 2)
+    writer = MetricsWriter()
+    accepted = [writer.add_point("latency_seconds", 1.0, 1000) for _ in range(5)]
+    assert accepted == [True, True, True, False, False]
+    assert writer.stats()["shift_dropped"] == 2
+    # Once the clock catches up samples are accepted again
+    assert writer.add_point("latency_seconds", 1.0, 1003)
+
+
+def test_numpy_scalars_are_stored_as_floats():
+    np = pytest.importorskip("numpy")
+    writer = MetricsWriter()
+    writer.add_point("context_relevance", np.float32(0.25), 1000)
+    assert type(writer._points[0][2]) is float
+
+
+# flushing
+
+
+def test_flush_writes_points_and_session_records_in_one_pipeline(redis, monkeypatch):
+    monkeypatch.setattr(metrics_writer_module, "METRICS_MADD_BATCH", 2)
+    writer = MetricsWriter()
+    for i in range(3):
+        writer.add_point("latency_seconds", float(i), 1000 + i)
+    writer.add_session_metrics("s1", {"turn": 1})
+    writer.add_session_metrics("s1", {"turn": 2})
+    asyncio.run(writer.flush())
+
+    madds = [command for command in redis.commands if command[0] == "TS.MADD"]
+    assert len(madds) == 2
+    assert redis.data[series_key("latency_seconds")] == {1000: 0.0, 1001: 1.0, 1002: 2.0}
+    assert [json.loads(r) for r in redis.lrange("response_metrics:s1", 0, -1)] == [{"turn": 2}, {"turn": 1}]
+    assert redis.ttls["response_metrics:s1"] == metrics_writer_module.SESSION_METRICS_TTL_SECONDS
+    stats = writer.stats()
+    assert (stats["points_written"], stats["records_written"], stats["buffered"]) == (3, 2, 0)
+
+
+def test_series_and_compactions_are_created_once(redis):
+    writer = MetricsWriter()
+    writer.add_point("custom_metric", 1.0, 1000)
+    asyncio.run(writer.flush())
+    writer.add_point("custom_metric", 2.0, 2000)
+    asyncio.run(writer.flush())
+
+    creates = [command[1] for command in redis.commands if command[0] == "TS.CREATE"]
+    assert creates.count(series_key("custom_metric")) == 1
+    for bucket_seconds in metrics_writer_module.METRICS_COMPACTIONS:
+        assert compaction_key("custom_metric", "max", bucket_seconds) in creates
+    # A worker starting later finds the series and keeps the duplicate policy
+    asyncio.run(MetricsWriter().ensure_series(["custom_metric"]))
+    alters = [command for command in redis.commands if command[0] == "TS.ALTER"]
+    assert alters == [("TS.ALTER", series_key("custom_metric"), "DUPLICATE_POLICY", "LAST")]
+
+
+def test_failed_flush_drops_the_batch(redis):
+    writer = MetricsWriter()
+    writer._created.add("latency_seconds")
+    writer.add_point("latency_seconds", 1.0, 1000)
+    redis.fail = True
+    asyncio.run(writer.flush())
+    stats = writer.stats()
+    assert (stats["errors"], stats["dropped"], stats["buffered"]) == (1, 1, 0)
@@ -0,0 +1,134 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import middlewares.quantiles as quantiles_module
+from middlewares.quantiles import LogHistogram, QuantileStore, WindowedQuantiles, slot_width
+from fakes import FakeAsyncRedis
+
+
+def sketch_of(values, **kwargs) -> LogHistogram:
+    sketch = LogHistogram(**kwargs)
+    for value in values:
+        sketch.add(float(value))
+    return sketch
+
+
+# LogHistogram
+
+
+@pytest.mark.parametrize("q", [0.5, 0.9, 0.95, 0.99])
+def test_quantiles_are_within_the_relative_accuracy(q):
+    values = np.random.default_rng(0).lognormal(0, 1.5, 20000)
+    sketch = sketch_of(values, relative_accuracy=0.01)
+    expected = np.sort(values)[int(q * (len(values) - 1))]
+    assert sketch.quantile(q) == pytest.approx(expected, rel=0.01)
+
+
+def test_summary_of_an_empty_and_a_small_sketch():
+    assert LogHistogram().summary() == {"count": 0, "avg": None, "p50": None, "p95": None, "p99": None}
+    summary = sketch_of([1, 2, 3]).summary()
+    assert summary["count"] == 3 and summary["avg"] == 2.0
+    assert summary["p50"] == pytest.approx(2.0, rel=0.01)
+
+
+def test_zero_and_negative_values_count_in_the_zero_bucket():
+    sketch = sketch_of([0, -0.5, 0, 1])
+    assert sketch.zero_count == 3
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(1.0, rel=0.01)
+
+
+def test_merging_equals_sketching_everything_at_once():
+    values = np.random.default_rng(1).exponential(2.0, 5000)
+    merged = sketch_of(values[:2000])
+    merged.merge(sketch_of(values[2000:]))
+    whole = sketch_of(values)
+    assert merged.buckets == whole.buckets
+    assert merged.count == whole.count and merged.sum == pytest.approx(whole.sum)
+
+
+def test_redis_fields_round_trip():
+    sketch = sketch_of([0, 0.5, 1.5, 1.5, 40])
+    fields = {name.encode(): str(value).encode() for name, value in sketch.to_fields().items()}
+    fields[b"s"] = str(sketch.sum).encode()
+    restored = LogHistogram.from_fields(fields)
+    assert restored.buckets == sketch.buckets
+    assert (restored.count, restored.zero_count, restored.sum) == (5, 1, 43.5)
+
+
+def test_collapsing_only_coarsens_the_lowest_quantiles():
+    values = np.geomspace(1e-6, 1e3, 1000)
+    sketch = sketch_of(values, max_buckets=100)
+    assert len(sketch.buckets) == 100
+    assert sketch.count == 1000
+    assert sketch.quantile(0.99) == pytest.approx(np.sort(values)[989], rel=0.01)
+    assert sketch.quantile(0.01) > values[9] * 1.1
+
+
+# WindowedQuantiles
+
+
+def test_windows_cover_only_recent_slots():
+    series = WindowedQuantiles("latency", slot_seconds=10, horizon_seconds=60)
+    series.add(5.0, now=1000)
+    series.add(1.0, now=1055)
+    assert series.window(10, now=1055).count == 1
+    assert series.window(60, now=1055).count == 2
+    # The slot of t=1000 is reused once the ring wraps around
+    series.add(2.0, now=1070)
+    assert series.window(60, now=1070).count == 2
+    assert series.lifetime.count == 3
+
+
+def test_pending_samples_are_taken_once_per_slot():
+    series = WindowedQuantiles("latency", slot_seconds=10, horizon_seconds=60)
+    series.add(1.0, now=1000)
+    series.add(2.0, now=1005)
+    series.add(3.0, now=1010)
+    pending = series.take_pending()
+    assert {slot: sketch.count for slot, sketch in pending.items()} == {100: 2, 101: 1}
+    assert series.take_pending() == {}
+
+
+def test_slot_width_keeps_windows_within_the_point_limit():
+    assert slot_width(60) == 10
+    assert slot_width(3000) == 10
+    assert slot_width(3001) == 60
+    assert slot_width(86400) == 300
+    assert slot_width(7 * 86400) == 3600
+
+
+# QuantileStore
+
+
+def test_flushed_sketches_from_every_worker_add_up_in_redis(monkeypatch):
+    redis = FakeAsyncRedis()
+    monkeypatch.setattr(quantiles_module, "async_redis_client", redis)
+    workers = [QuantileStore(windows={"1m": 60}), QuantileStore(windows={"1m": 60})]
+    for i, store in enumerate(workers):
+        for value in range(1, 51):
+            store.record("latency_seconds", value + 50 * i)
+        asyncio.run(store.flush())
+
+    windows = asyncio.run(workers[0].fleet_windows(["latency_seconds"]))
+    summary = windows["latency_seconds"]["1m"]
+    assert summary["count"] == 100
+    assert summary["avg"] == pytest.approx(50.5)
+    assert summary["p50"] == pytest.approx(50, rel=0.02)
+    assert "local" not in summary
+
+
+def test_fleet_windows_fall_back_to_local_samples(monkeypatch):
+    redis = FakeAsyncRedis()
+    redis.sync.fail = True
+    monkeypatch.setattr(quantiles_module, "async_redis_client", redis)
+    store = QuantileStore(windows={"1m": 60})
+    store.record("latency_seconds", 2.0)
+    asyncio.run(store.flush())
+    # Kept for the next flush
+    assert store.series("latency_seconds")._pending
+
+    summary = asyncio.run(store.fleet_windows(["latency_seconds"]))["latency_seconds"]["1m"]
+    assert summary["count"] == 1 and summary["local"]
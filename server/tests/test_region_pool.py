@@ -0,0 +1,126 @@
+import pytest
+
+import models.region_pool as region_pool_module
+from models.region_pool import RegionRouter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(region_pool_module.time, "time", clock.time)
+    return clock
+
+
+def router(**kwargs) -> RegionRouter:
+    kwargs.setdefault("explore_rate", 0.0)
+    return RegionRouter(["us", "eu", "asia"], **kwargs)
+
+
+# ranking
+
+
+def test_regions_are_deduplicated_in_order():
+    assert RegionRouter(["us", "eu", "us"]).regions == ["us", "eu"]
+
+
+def test_fastest_region_is_picked_and_unknown_regions_go_last(clock):
+    r = router()
+    r.record_success("eu", 2.0)
+    r.record_success("us", 1.0)
+    ranked = r.ranked()
+    assert ranked[:2] == ["us", "eu"] and ranked[2] == "asia"
+    assert r.pick() == "us"
+    assert r.pick(exclude=["us"]) == "eu"
+
+
+def test_latency_is_smoothed(clock):
+    r = router(alpha=0.5)
+    r.record_success("us", 1.0)
+    r.record_success("us", 3.0)
+    assert r.stats()["us"]["ewma_latency_seconds"] == 2.0
+
+
+def test_explore_picks_a_slower_region(clock, monkeypatch):
+    r = router(explore_rate=0.5)
+    r.record_success("us", 1.0)
+    r.record_success("eu", 2.0)
+    r.record_success("asia", 3.0)
+    monkeypatch.setattr(region_pool_module.random, "random", lambda: 0.1)
+    assert r.pick() in ("eu", "asia")
+    monkeypatch.setattr(region_pool_module.random, "random", lambda: 0.9)
+    assert r.pick() == "us"
+
+
+def test_censored_latency_only_moves_the_estimate_up(clock):
+    r = router(alpha=0.5)
+    r.record_success("us", 2.0)
+    r.record_censored("us", 1.0)
+    assert r.stats()["us"]["ewma_latency_seconds"] == 2.0
+    r.record_censored("us", 4.0)
+    assert r.stats()["us"]["ewma_latency_seconds"] == 3.0
+
+
+# ejection
+
+
+def test_consecutive_failures_eject_with_doubling_backoff(clock):
+    r = router(eject_after_errors=2, eject_error_rate=1.0, eject_seconds=10, max_eject_seconds=25)
+    r.record_success("us", 1.0)
+    r.record_success("eu", 2.0)
+
+    r.record_failure("us")
+    assert r.pick() == "us"
+    r.record_failure("us")
+    assert r.stats()["us"]["ejected"] and r.stats()["us"]["ejected_for_seconds"] == 10
+    assert r.pick() == "eu"
+
+    clock.now += 10
+    assert r.pick() == "us"
+    r.record_failure("us")
+    r.record_failure("us")
+    assert r.stats()["us"]["ejected_for_seconds"] == 20
+
+    clock.now += 20
+    r.record_failure("us")
+    r.record_failure("us")
+    # Capped at max_eject_seconds
+    assert r.stats()["us"]["ejected_for_seconds"] == 25
+    assert r.stats()["us"]["ejections"] == 3
+
+
+def test_success_resets_the_backoff(clock):
+    r = router(eject_after_errors=1, eject_seconds=10)
+    r.record_failure("us")
+    clock.now += 10
+    r.record_success("us", 1.0)
+    r.record_failure("us")
+    assert r.stats()["us"]["ejected_for_seconds"] == 10
+
+
+def test_error_rate_ejects_intermittent_failures(clock):
+    r = router(alpha=0.2, eject_after_errors=10, eject_error_rate=0.4)
+    r.record_failure("us")
+    r.record_success("us", 1.0)
+    r.record_failure("us")
+    assert not r.stats()["us"]["ejected"]
+    r.record_failure("us")
+    assert r.stats()["us"]["ejected"]
+
+
+def test_everything_ejected_falls_back_to_the_first_to_return(clock):
+    r = router(eject_after_errors=1, eject_seconds=10)
+    r.record_failure("eu")
+    clock.now += 5
+    r.record_failure("us")
+    r.record_failure("asia")
+    assert r.ranked() == ["eu", "us", "asia"]
+    assert r.pick() == "eu"
+    assert r.pick(exclude=["eu"]) == "us"
@@ -0,0 +1,103 @@
+import pytest
+
+import services.semantic_cache as semantic_cache_module
+from services.semantic_cache import SemanticCache
+
+
+@pytest.fixture
+def now(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache_module.time, "time", lambda: now[0])
+    return now
+
+
+def cache(**kwargs) -> SemanticCache:
+    kwargs.setdefault("threshold", 0.9)
+    kwargs.setdefault("max_entries", 100)
+    kwargs.setdefault("max_per_user", 10)
+    kwargs.setdefault("ttl_seconds", 60)
+    return SemanticCache(**kwargs)
+
+
+# lookup
+
+
+def test_close_queries_hit_and_distant_ones_miss(now):
+    c = cache()
+    c.store("u1", 1, [1.0, 0.0], "answer", 2.0)
+    # Scale does not matter, only direction
+    assert c.lookup("u1", 1, [10.0, 1.0]) == "answer"
+    assert c.lookup("u1", 1, [1.0, 1.0]) is None
+    assert c.lookup("u1", 1, [0.0, 1.0]) is None
+
+
+def test_the_closest_entry_wins(now):
+    c = cache(threshold=0.5)
+    c.store("u1", 1, [1.0, 0.0], "x", 1.0)
+    c.store("u1", 1, [0.0, 1.0], "y", 1.0)
+    assert c.lookup("u1", 1, [0.2, 1.0]) == "y"
+
+
+def test_entries_are_per_user_and_kb_version(now):
+    c = cache()
+    c.store("u1", 1, [1.0, 0.0], "answer", 1.0)
+    assert c.lookup("u2", 1, [1.0, 0.0]) is None
+    assert c.lookup("u1", 2, [1.0, 0.0]) is None
+    # Entries from an older version are dropped when seen
+    assert c.stats()["entries"] == 0
+
+
+def test_entries_expire(now):
+    c = cache(ttl_seconds=60)
+    c.store("u1", 1, [1.0, 0.0], "answer", 1.0)
+    now[0] += 59
+    assert c.lookup("u1", 1, [1.0, 0.0]) == "answer"
+    now[0] += 1
+    assert c.lookup("u1", 1, [1.0, 0.0]) is None
+
+
+# eviction
+
+
+def test_per_user_limit_evicts_that_users_least_recently_used(now):
+    c = cache(max_per_user=2)
+    c.store("u1", 1, [1.0, 0.0, 0.0], "x", 1.0)
+    c.store("u1", 1, [0.0, 1.0, 0.0], "y", 1.0)
+    c.store("u2", 1, [1.0, 0.0, 0.0], "other", 1.0)
+    c.lookup("u1", 1, [1.0, 0.0, 0.0])
+    c.store("u1", 1, [0.0, 0.0, 1.0], "z", 1.0)
+    assert c.lookup("u1", 1, [1.0, 0.0, 0.0]) == "x"
+    assert c.lookup("u1", 1, [0.0, 1.0, 0.0]) is None
+    assert c.lookup("u2", 1, [1.0, 0.0, 0.0]) == "other"
+
+
+def test_global_limit_evicts_the_least_recently_used(now):
+    c = cache(max_entries=2)
+    c.store("u1", 1, [1.0, 0.0], "x", 1.0)
+    c.store("u2", 1, [1.0, 0.0], "y", 1.0)
+    c.lookup("u1", 1, [1.0, 0.0])
+    c.store("u3", 1, [1.0, 0.0], "z", 1.0)
+    assert c.lookup("u2", 1, [1.0, 0.0]) is None
+    assert c.lookup("u1", 1, [1.0, 0.0]) == "x"
+    assert c.stats()["entries"] == 2
+
+
+def test_invalidate_drops_only_that_user(now):
+    c = cache()
+    c.store("u1", 1, [1.0, 0.0], "x", 1.0)
+    c.store("u2", 1, [1.0, 0.0], "y", 1.0)
+    c.invalidate("u1")
+    assert c.lookup("u1", 1, [1.0, 0.0]) is None
+    assert c.lookup("u2", 1, [1.0, 0.0]) == "y"
+
+
+def test_stats_count_hits_and_seconds_saved(now):
+    c = cache()
+    c.store("u1", 1, [1.0, 0.0], "x", 2.5)
+    c.lookup("u1", 1, [1.0, 0.0])
+    c.lookup("u1", 1, [1.0, 0.0])
+    c.lookup("u1", 1, [0.0, 1.0])
+    c.lookup("u1", 1, [0.0, 1.0])
+    stats = c.stats()
+    assert (stats["lookups"], stats["hits"], stats["hit_rate"]) == (4, 2, 0.5)
+    assert stats["seconds_saved"] == 5.0
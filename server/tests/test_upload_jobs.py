@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from fakes import FakeRedis, FakeAsyncRedis
+
+upload_jobs = pytest.importorskip("services.upload_jobs")
+
+
+@pytest.fixture
+def redis(monkeypatch, tmp_path):
+    fake = FakeRedis()
+    monkeypatch.setattr(upload_jobs, "redis_client", fake)
+    monkeypatch.setattr(upload_jobs, "async_redis_client", FakeAsyncRedis(fake))
+    monkeypatch.setattr(upload_jobs, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    return fake
+
+
+def job(redis, job_id):
+    return upload_jobs._decode(redis.hgetall(upload_jobs.job_key(job_id)))
+
+
+def queued_job(redis, completed_stage="") -> str:
+    job_id = asyncio.run(upload_jobs.create_job("u1", "notes.pdf"))
+    asyncio.run(upload_jobs.enqueue_job(job_id))
+    redis.hset(upload_jobs.job_key(job_id), "completed_stage", completed_stage)
+    return job_id
+
+
+def recording_worker(calls, fail_stage=None) -> "upload_jobs.UploadJobWorker":
+    worker = upload_jobs.UploadJobWorker(num_workers=1, lease_seconds=60)
+    for stage in upload_jobs.STAGES:
+        def run(job_id, job, stage=stage):
+            calls.append(stage)
+            if stage == fail_stage:
+                raise RuntimeError(f"{stage} broke")
+        setattr(worker, f"_stage_{stage}", run)
+    return worker
+
+
+# creating jobs
+
+
+def test_enqueue_after_streaming_to_gcs_skips_the_store_stage(redis):
+    job_id = asyncio.run(upload_jobs.create_job("u1", "notes.pdf"))
+    assert job(redis, job_id)["status"] == "receiving"
+    assert os.path.isdir(upload_jobs.job_dir(job_id))
+
+    asyncio.run(upload_jobs.enqueue_job(job_id, {
+        "sha256": "abc", "size": 10, "seconds": 0.5, "public_url": "https://storage/notes.pdf",
+    }))
+    state = job(redis, job_id)
+    assert (state["status"], state["completed_stage"], state["sha256"]) == ("queued", "store", "abc")
+    assert redis.lrange(upload_jobs.QUEUE_KEY, 0, -1) == [job_id.encode()]
+
+
+def test_discard_marks_the_job_failed_and_removes_the_spool(redis):
+    job_id = asyncio.run(upload_jobs.create_job("u1", "notes.pdf"))
+    asyncio.run(upload_jobs.discard_job(job_id, "client went away"))
+    state = job(redis, job_id)
+    assert (state["status"], state["error"]) == ("failed", "client went away")
+    assert not os.path.exists(upload_jobs.job_dir(job_id))
+    assert redis.llen(upload_jobs.QUEUE_KEY) == 0
+
+
+# processing
+
+
+def test_all_stages_run_and_the_job_finishes(redis):
+    calls = []
+    job_id = queued_job(redis)
+    asyncio.run(recording_worker(calls)._process(job_id))
+    assert calls == upload_jobs.STAGES
+    state = asyncio.run(upload_jobs.get_job_status(job_id))
+    assert (state["status"], state["stage"]) == ("done", "done")
+    assert {"store_seconds", "ingest_seconds", "total_seconds"} <= set(state["timings"])
+    assert not os.path.exists(upload_jobs.job_dir(job_id))
+
+
+@pytest.mark.parametrize("completed_stage, remaining", [
+    ("store", ["ingest"]),
+    ("ingest", []),
+    # Stages recorded before parse, chunk and embed were pipelined into ingest
+    ("chunk", ["ingest"]),
+    ("embed", []),
+])
+def test_jobs_resume_after_the_completed_stage(redis, completed_stage, remaining):
+    calls = []
+    job_id = queued_job(redis, completed_stage)
+    asyncio.run(recording_worker(calls)._process(job_id))
+    assert calls == remaining
+    assert job(redis, job_id)["status"] == "done"
+
+
+def test_a_failing_stage_fails_the_job(redis):
+    calls = []
+    job_id = queued_job(redis)
+    asyncio.run(recording_worker(calls, fail_stage="store")._process(job_id))
+    state = job(redis, job_id)
+    assert (state["status"], state["stage"], state["error"]) == ("failed", "store", "store broke")
+    assert calls == ["store"]
+
+
+def test_finished_jobs_are_not_run_again(redis):
+    calls = []
+    job_id = queued_job(redis)
+    redis.hset(upload_jobs.job_key(job_id), "status", "failed")
+    asyncio.run(recording_worker(calls)._process(job_id))
+    assert calls == []
+
+
+def test_shutdown_waits_for_the_running_stage_before_requeueing(redis):
+    job_id = queued_job(redis)
+    started, finished = threading.Event(), threading.Event()
+    worker = upload_jobs.UploadJobWorker(num_workers=1, lease_seconds=60)
+
+    def slow_store(job_id, job):
+        started.set()
+        time.sleep(0.2)
+        finished.set()
+    worker._stage_store = slow_store
+
+    async def run():
+        task = asyncio.create_task(worker._run())
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    asyncio.run(run())
+
+    assert finished.is_set()
+    assert job(redis, job_id)["completed_stage"] == "store"
+    assert redis.lrange(upload_jobs.QUEUE_KEY, 0, -1) == [job_id.encode()]
+    assert redis.llen(upload_jobs.PROCESSING_KEY) == 0
+
+
+# recovery
+
+
+def test_only_jobs_with_a_stale_heartbeat_are_recovered(redis):
+    stale, live = queued_job(redis), queued_job(redis)
+    redis.delete(upload_jobs.QUEUE_KEY)
+    redis.lpush(upload_jobs.PROCESSING_KEY, stale, live)
+    redis.hset(upload_jobs.job_key(stale), "heartbeat", time.time() - 120)
+
+    worker = upload_jobs.UploadJobWorker(num_workers=1, lease_seconds=60)
+    assert asyncio.run(worker.recover_abandoned_jobs()) == 1
+    assert redis.lrange(upload_jobs.QUEUE_KEY, 0, -1) == [stale.encode()]
+    assert redis.lrange(upload_jobs.PROCESSING_KEY, 0, -1) == [live.encode()]
+    assert asyncio.run(worker.recover_abandoned_jobs()) == 0
@@ -1,3 +1,5 @@
+import os
+
 REGIONS = ["me-central1",
            "me-central2",
            "me-west1",
@@ -35,4 +37,123 @@ DOCAI_LOCATIONS = {
     "asia": "asia-documentai.googleapis.com",
     "us-west1": "us-west1-documentai.googleapis.com",
     "us-east1": "us-east1-documentai.googleapis.com",
-}
\ No newline at end of file
+}
+
+# Document ingestion pipeline
+EMBED_BATCH_SIZE = 100        # texts per embed_content call (API maximum is 100)
+EMBED_MAX_CONCURRENCY = 4     # embedding batches in flight at once
+UPSERT_BATCH_SIZE = 100       # vectors per Pinecone upsert request
+UPSERT_MAX_RETRIES = 3        # attempts per upsert batch before giving up
+DELETE_BATCH_SIZE = 1000      # vector ids per Pinecone delete request
+
+# Embedding cache
+EMBEDDING_CACHE_LOCAL_SIZE = 4096                   # entries kept in the in-process LRU
+EMBEDDING_CACHE_TTL_SECONDS = 60 * 60 * 24 * 7      # Redis entries expire after 7 days
+EMBEDDING_CACHE_REDIS_MAX_ENTRIES = 200000          # oldest Redis entries are evicted beyond this
+
+# Verified JWTs are cached per worker; a token replaced at login is dropped everywhere via pub/sub,
+# and the TTL bounds how long a revocation can go unnoticed if a notification is missed
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "30"))
+
+# Password hashing (bcrypt) runs in a bounded thread pool so it never blocks the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = 256     # logins/signups waiting for a hash beyond this are rejected with 503
+
+# Background response evaluation
+EVALUATION_SAMPLE_RATE = float(os.getenv("EVALUATION_SAMPLE_RATE", "1.0"))  # share of turns that get relevance scoring
+EVALUATION_WORKERS = 2          # background evaluation tasks
+EVALUATION_BATCH_SIZE = 16      # jobs scored together with one embedding call
+EVALUATION_QUEUE_SIZE = 1000    # jobs waiting beyond this are dropped
+
+# Latency/relevance quantiles: fixed-size log-bucketed sketches in time slots, merged across workers in Redis
+SKETCH_RELATIVE_ACCURACY = 0.01     # quantiles are within 1% of the true value
+SKETCH_MAX_BUCKETS = 2048           # lowest buckets are collapsed beyond this, bounding memory per sketch
+SKETCH_SLOT_SECONDS = 10            # local slot width; also the finest Redis slot width
+SKETCH_SLOT_WIDTHS = (10, 60, 300, 3600)    # Redis keeps a sketch per slot at each width (= /metrics bucket sizes)
+SKETCH_WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+SKETCH_FLUSH_SECONDS = 10           # how often each worker merges its new samples into Redis
+
+# Evaluator metrics are buffered in memory and written to Redis in batches by a background task
+METRICS_FLUSH_SECONDS = 1.0
+METRICS_BUFFER_SIZE = 10000         # points/records waiting beyond this are dropped
+METRICS_MADD_BATCH = 1000           # samples per TS.MADD command
+METRICS_MAX_TIMESTAMP_SHIFT_MS = 100  # same-millisecond samples are moved at most this far ahead of the clock
+METRICS_RETENTION_MS = 60 * 60 * 24 * 30 * 1000     # raw time series kept for 30 days
+SESSION_METRICS_TTL_SECONDS = 60 * 60 * 24 * 30
+
+# GET /metrics time series: buckets come from SKETCH_SLOT_WIDTHS, chosen so a window has at most METRICS_MAX_POINTS
+METRICS_DEFAULT_WINDOW_SECONDS = 60 * 60 * 24
+METRICS_MAX_WINDOW_SECONDS = 60 * 60 * 24 * 7
+METRICS_MAX_POINTS = 300
+METRICS_COMPACTIONS = {60: 60 * 60 * 24 * 30, 3600: 60 * 60 * 24 * 365}   # bucket seconds -> retention seconds
+METRICS_CACHE_SECONDS = 2.0         # concurrent and repeated polls share one result for this long
+
+# Per-source retrieval timeouts in seconds; a source that misses its deadline contributes no context
+RETRIEVAL_TIMEOUTS = {
+    "documents": 3.0,
+    "chat_history": 2.0,
+    "recent_history": 1.0,
+}
+
+# Hedged generation requests
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))    # hedge once the primary is slower than this
+LLM_HEDGE_BUDGET_PER_MINUTE = int(os.getenv("LLM_HEDGE_BUDGET_PER_MINUTE", "30"))
+LLM_HEDGE_MIN_DELAY_SECONDS = 0.5       # never hedge earlier than this
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = 8.0   # delay used until enough latency samples exist
+
+# Semantic answer cache
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # min cosine similarity for a hit
+SEMANTIC_CACHE_MAX_ENTRIES = 5000       # answers kept per worker
+SEMANTIC_CACHE_MAX_PER_USER = 200       # answers kept per user
+SEMANTIC_CACHE_TTL_SECONDS = 60 * 60    # cached answers expire after an hour
+
+# Upload job pipeline
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "uploads")   # job files and intermediate stage outputs
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))        # upload jobs processed concurrently per process
+UPLOAD_JOB_LEASE_SECONDS = 120      # a job without a heartbeat for this long is considered abandoned
+UPLOAD_JOB_TTL_SECONDS = 60 * 60 * 24 * 7
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024           # uploads are read and teed in 1 MiB chunks
+UPLOAD_QUEUE_CHUNKS = 4                         # chunks buffered per writer before the reader waits
+UPLOAD_GCS_CHUNK_BYTES = 8 * 1024 * 1024        # resumable upload request size (multiple of 256 KiB)
+UPLOAD_GCS_TIMEOUT_SECONDS = 60                 # per resumable upload request
+GCS_BUCKET_NAME = os.getenv("GCS_BUCKET_NAME", "documents-vahan")
+
+# Document parsing
+PDF_MIN_TEXT_CHARS = 20     # PDF pages with less native text than this are treated as scanned and OCR'd
+DOCAI_SHARD_PAGES = 15      # scanned pages per Document AI request (online OCR page limit)
+DOCAI_MAX_CONCURRENCY = int(os.getenv("DOCAI_MAX_CONCURRENCY", "4"))   # shards OCR'd at once per document
+DOCAI_SHARD_RETRIES = 3     # attempts per shard before the document fails
+PARSE_CACHE_TTL_SECONDS = 60 * 60 * 24 * 30     # parsed text is cached by file hash for 30 days
+
+# Chunking defaults; tenants can override size, overlap and dedupe (see services/chunking.py)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "300"))                  # target chunk size in (estimated) tokens
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))   # trailing sentences repeated in the next chunk
+CHUNK_DEDUPE_THRESHOLD = float(os.getenv("CHUNK_DEDUPE_THRESHOLD", "0.9"))  # shingle Jaccard for near-duplicates; 0 disables
+CHUNK_MIN_TOKENS = 32
+CHUNK_MAX_TOKENS = 2000     # embedding-001 accepts up to 2048 input tokens
+
+# Vector store backend: "pinecone", "local" (in-process index only, e.g. tests or air-gapped runs)
+# or "tiered" (hot tenants' document namespaces served from the local index in front of Pinecone)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "vector_data")     # memory-mapped namespace files
+LOCAL_INDEX_QUANTIZE = os.getenv("LOCAL_INDEX_QUANTIZE", "false").lower() == "true"  # int8 rows, 4x smaller
+LOCAL_INDEX_IVF_THRESHOLD = 20000   # namespaces with this many vectors use IVF instead of exact search
+LOCAL_INDEX_IVF_NPROBE = 16         # inverted lists scanned per IVF query
+LOCAL_INDEX_FLUSH_SECONDS = 30      # changed namespaces are written to disk at most this often
+LOCAL_HOT_NAMESPACES = 64           # namespaces kept resident by the tiered backend
+LOCAL_HOT_QUERY_THRESHOLD = 20      # queries within the window before a namespace is loaded locally
+LOCAL_HOT_WINDOW_SECONDS = 300
+LOCAL_HOT_TTL_SECONDS = 300         # local copies are re-fetched after this, to pick up other workers' writes
+LOCAL_HOT_HYDRATE_ATTEMPTS = 3      # copies redone because of writes during the copy before giving up
+
+# Startup: connection checks and warm-up run in the background after the server starts listening
+STARTUP_CHECK_TIMEOUT_SECONDS = float(os.getenv("STARTUP_CHECK_TIMEOUT_SECONDS", "10"))  # per check attempt
+STARTUP_RETRY_SECONDS = 5           # failed checks are retried this often until they pass
+
+# Production serving (serve.py); the dev server in main.py stays single-process with reload
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SERVER_GRACEFUL_TIMEOUT_SECONDS = int(os.getenv("SERVER_GRACEFUL_TIMEOUT_SECONDS", "30"))  # drain before exit
+WS_SESSION_TTL_SECONDS = 60         # session -> worker routes expire unless the owning worker refreshes them
+
@@ -0,0 +1,40 @@
+from typing import Any, Callable
+import threading
+
+
+class LazyProxy:
+    """
+    Stand-in for a module-level client that is built on first use.
+
+    Attribute access builds the real object (once, thread-safely) and
+    forwards to it, so `client.get(...)` works as before while importing the
+    module stays free of network calls. `resolve()` builds it explicitly,
+    e.g. from a startup warm-up with a timeout.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: str):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_target", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    @property
+    def initialized(self) -> bool:
+        return self._target is not None
+
+    def resolve(self) -> Any:
+        target = self._target
+        if target is None:
+            with self._lock:
+                target = self._target
+                if target is None:
+                    target = self._factory()
+                    object.__setattr__(self, "_target", target)
+        return target
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __repr__(self) -> str:
+        state = repr(self._target) if self._target is not None else "not initialized"
+        return f"<LazyProxy {self._name}: {state}>"